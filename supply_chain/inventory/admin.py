@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Product, Warehouse, Inventory, SalesHistory, DemandForecast
+from .models import (
+    Product, Warehouse, Inventory, InventoryShard, SalesHistory, DemandForecast, ForecastModelVersion,
+    ProductStockSummary, WarehouseStockSummary
+)
+from django.db.models import Sum
 
 class InventoryInline(admin.TabularInline):
     model = Inventory
@@ -14,13 +18,35 @@ class ProductAdmin(admin.ModelAdmin):
 class WarehouseAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'type', 'address', 'is_active')
     search_fields = ('code', 'name', 'address')
-    list_filter = ('type', 'is_active')
+    list_filter = ('type', 'is_active', 'country_code')
 
 
+class InventoryShardInline(admin.TabularInline):
+    model = InventoryShard
+    extra = 0
+    can_delete = False
+    readonly_fields = ('shard', 'quantity_on_hand', 'quantity_allocated')
+
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ('product', 'warehouse', 'quantity_on_hand', 'quantity_allocated', 'reorder_point')
+    list_display = ('product', 'warehouse', 'total_on_hand', 'total_allocated', 'reorder_point', 'shard_count')
     search_fields = ('product__SKU', 'product__name', 'warehouse__code')
-    list_filter = ('warehouse',)
+    list_filter = ('warehouse', 'is_low_stock', 'is_excess_stock')
+    inlines = [InventoryShardInline]
+
+    def get_queryset(self, request):
+        # Sharded rows hold part of their stock in shard rows
+        return super().get_queryset(request).annotate(
+            shard_on_hand=Sum('shards__quantity_on_hand'),
+            shard_allocated=Sum('shards__quantity_allocated')
+        )
+
+    @admin.display(description='Quantity on hand')
+    def total_on_hand(self, obj):
+        return obj.quantity_on_hand + (obj.shard_on_hand or 0)
+
+    @admin.display(description='Quantity allocated')
+    def total_allocated(self, obj):
+        return obj.quantity_allocated + (obj.shard_allocated or 0)
 
 class SalesHistoryAdmin(admin.ModelAdmin):
     list_display = ('product', 'warehouse', 'date', 'quantity_sold', 'revenue')
@@ -34,8 +60,24 @@ class DemandForecastAdmin(admin.ModelAdmin):
     list_filter = ('warehouse', 'period', 'algorithm_used')
     date_hierarchy = 'forecast_date'
 
+class ForecastModelVersionAdmin(admin.ModelAdmin):
+    list_display = ('product', 'warehouse', 'algorithm', 'version', 'trained_at', 'data_end', 'is_active')
+    search_fields = ('product__SKU', 'warehouse__code')
+    list_filter = ('algorithm', 'is_active')
+
+class ProductStockSummaryAdmin(admin.ModelAdmin):
+    list_display = ('product', 'quantity_on_hand', 'quantity_allocated', 'low_stock_count', 'excess_stock_count', 'updated_at')
+    search_fields = ('product__SKU', 'product__name')
+
+class WarehouseStockSummaryAdmin(admin.ModelAdmin):
+    list_display = ('warehouse', 'quantity_on_hand', 'quantity_allocated', 'low_stock_count', 'excess_stock_count', 'updated_at')
+    search_fields = ('warehouse__code', 'warehouse__name')
+
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Warehouse, WarehouseAdmin)
 admin.site.register(Inventory, InventoryAdmin)
 admin.site.register(SalesHistory, SalesHistoryAdmin)
-admin.site.register(DemandForecast, DemandForecastAdmin)
\ No newline at end of file
+admin.site.register(DemandForecast, DemandForecastAdmin)
+admin.site.register(ForecastModelVersion, ForecastModelVersionAdmin)
+admin.site.register(ProductStockSummary, ProductStockSummaryAdmin)
+admin.site.register(WarehouseStockSummary, WarehouseStockSummaryAdmin)
\ No newline at end of file
@@ -0,0 +1,69 @@
+import json
+import tempfile
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from inventory.utils.benchmarking import (
+    DEFAULT_METHODS, ForecastBenchmark, compare_reports, generate_synthetic_sales
+)
+
+class Command(BaseCommand):
+    help = 'Benchmark forecasting methods on synthetic sales history in a throwaway database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--series', type=int, default=20, help='Number of synthetic product series')
+        parser.add_argument('--days', type=int, default=730, help='Days of history per series')
+        parser.add_argument('--horizon', type=int, default=30, help='Forecast horizon scored against held-out days')
+        parser.add_argument('--seasonality', type=float, default=0.3, help='Strength of the weekly and yearly pattern')
+        parser.add_argument('--intermittency', type=float, default=0.0, help='Share of days without sales')
+        parser.add_argument('--methods', default=','.join(DEFAULT_METHODS), help='Comma-separated forecasting methods')
+        parser.add_argument('--n-jobs', type=int, default=-1, help='Threads per model fit')
+        parser.add_argument('--cross-validate', action='store_true', help='Include 5-fold CV in fit time')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this path instead of stdout')
+        parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    
+    def handle(self, *args, **options):
+        config = {
+            'series': options['series'],
+            'days': options['days'],
+            'seasonality': options['seasonality'],
+            'intermittency': options['intermittency'],
+            'seed': options['seed'],
+        }
+        benchmark = ForecastBenchmark(
+            methods=[m.strip() for m in options['methods'].split(',') if m.strip()],
+            horizon=options['horizon'],
+            n_jobs=options['n_jobs'],
+            cross_validate=options['cross_validate']
+        )
+        
+        # Synthetic data and models never touch the real database or MODEL_ROOT
+        original_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as model_root, override_settings(MODEL_ROOT=model_root):
+                self.stderr.write(f"Generating {config['series']} series x {config['days']} days...")
+                actuals = generate_synthetic_sales(
+                    num_series=config['series'],
+                    history_days=config['days'],
+                    horizon=options['horizon'],
+                    seasonality=config['seasonality'],
+                    intermittency=config['intermittency'],
+                    seed=config['seed']
+                )
+                report = benchmark.run(actuals, config)
+        finally:
+            connection.creation.destroy_test_db(original_name, verbosity=0)
+        
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                report['comparison'] = compare_reports(report, json.load(f))
+        
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Benchmark report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
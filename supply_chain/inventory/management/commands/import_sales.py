@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from contextlib import nullcontext
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import Product, Warehouse, SalesHistory
+from inventory.utils.sales_ingest import (
+    SalesIngestor, csv_chunks, parquet_chunks, frame_records, deferred_indexes
+)
+
+READERS = {'csv': csv_chunks, 'parquet': parquet_chunks}
+
+class Command(BaseCommand):
+    help = 'Import sales history from a CSV or Parquet file in bounded-memory chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or Parquet file to import')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Rows read from the file at a time')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows per upsert (default: SALES_INGEST_BATCH_SIZE)')
+        parser.add_argument('--sku-column', default='sku',
+                            help='Column holding product SKUs, used when there is no product_id column')
+        parser.add_argument('--warehouse-column', default='warehouse_code',
+                            help='Column holding warehouse codes, used when there is no warehouse_id column')
+        parser.add_argument('--checkpoint',
+                            help='JSON file recording how many rows have been imported')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows already imported according to the checkpoint')
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help='Drop the secondary sales history indexes during the load and rebuild them after')
+        parser.add_argument('--show-errors', type=int, default=20,
+                            help='Number of row errors to print')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f"Cannot tell the format of {path}; pass --format")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError("--resume needs --checkpoint")
+
+        skip_rows = self.load_checkpoint(options['checkpoint'], path) if options['resume'] else 0
+        if skip_rows:
+            self.stderr.write(f"Resuming after row {skip_rows}")
+
+        # Codes are resolved from memory, loaded once for the whole file
+        resolvers = (
+            ('product_id', options['sku_column'], dict(Product.objects.values_list('SKU', 'id')), 'SKU'),
+            ('warehouse_id', options['warehouse_column'], dict(Warehouse.objects.values_list('code', 'id')), 'warehouse code'),
+        )
+        ingestor = SalesIngestor(batch_size=options['batch_size'], first_index=skip_rows)
+
+        started = time.monotonic()
+        deferral = deferred_indexes(SalesHistory) if options['defer_indexes'] else nullcontext([])
+        try:
+            with deferral as indexes:
+                if indexes:
+                    self.stderr.write(f"Deferred {len(indexes)} index(es): {', '.join(index.name for index in indexes)}")
+                for frame in READERS[file_format](path, options['chunk_size'], skip_rows):
+                    # Only the file's own columns are resolved; id columns win over code columns
+                    chunk_resolvers = [
+                        resolver for resolver in resolvers
+                        if resolver[0] not in frame.columns and resolver[1] in frame.columns
+                    ]
+                    report = ingestor.ingest(frame_records(frame, chunk_resolvers))
+                    # Every row read so far is committed, so a rerun can start after it
+                    self.save_checkpoint(options['checkpoint'], path, report)
+                    self.stderr.write(self.progress(report, skip_rows, started))
+                if indexes:
+                    self.stderr.write("Rebuilding deferred indexes...")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = ingestor.report()
+        for error in report['errors'][:options['show_errors']]:
+            self.stderr.write(f"Row {error['index']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.progress(report, skip_rows, started)} in {time.monotonic() - started:.1f}s"
+        ))
+
+    @staticmethod
+    def progress(report, skip_rows, started):
+        rows = report['received'] - skip_rows
+        rate = rows / max(time.monotonic() - started, 1e-9)
+        return (f"{rows} rows ({rate:.0f} rows/s): {report['upserted']} upserted, "
+                f"{report['error_count']} errors")
+
+    @staticmethod
+    def load_checkpoint(checkpoint, path):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as f:
+            state = json.load(f)
+        if state.get('path') != path:
+            raise CommandError(f"Checkpoint {checkpoint} belongs to {state.get('path')}")
+        return state['rows']
+
+    @staticmethod
+    def save_checkpoint(checkpoint, path, report):
+        if not checkpoint:
+            return
+        # Written aside and renamed, so an interrupted write never leaves a torn checkpoint
+        temporary = f"{checkpoint}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'path': path, 'rows': report['received']}, f)
+        os.replace(temporary, checkpoint)
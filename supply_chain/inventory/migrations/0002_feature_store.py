@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesFeature',
+            fields=[
+                ('sales', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='inventory.saleshistory')),
+                ('lag_1', models.FloatField(blank=True, null=True)),
+                ('lag_7', models.FloatField(blank=True, null=True)),
+                ('lag_14', models.FloatField(blank=True, null=True)),
+                ('lag_30', models.FloatField(blank=True, null=True)),
+                ('rolling_7_mean', models.FloatField(blank=True, null=True)),
+                ('rolling_30_mean', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeriesFeatureState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('tail', models.JSONField(default=list)),
+                ('rolling_sums', models.JSONField(default=dict)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.warehouse')),
+            ],
+            options={
+                'unique_together': {('product', 'warehouse')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_feature_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warehouse',
+            name='country_code',
+            field=models.CharField(default='US', help_text='ISO country code for the holiday calendar', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='warehouse',
+            name='region_code',
+            field=models.CharField(blank=True, help_text='State/province code for regional holidays', max_length=10),
+        ),
+    ]
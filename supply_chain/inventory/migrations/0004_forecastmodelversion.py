@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_warehouse_holiday_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('algorithm', models.CharField(max_length=100)),
+                ('version', models.PositiveIntegerField()),
+                ('path', models.CharField(max_length=500)),
+                ('trained_at', models.DateTimeField(auto_now_add=True)),
+                ('data_start', models.DateField(blank=True, null=True)),
+                ('data_end', models.DateField(blank=True, null=True)),
+                ('training_rows', models.PositiveIntegerField(default=0)),
+                ('metrics', models.JSONField(blank=True, null=True)),
+                ('feature_schema', models.JSONField(default=list)),
+                ('size_bytes', models.PositiveBigIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.warehouse')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'warehouse', 'algorithm', 'is_active'], name='inventory_f_product_e5fb11_idx')],
+                'unique_together': {('product', 'warehouse', 'algorithm', 'version')},
+            },
+        ),
+    ]
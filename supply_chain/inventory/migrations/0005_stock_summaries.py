@@ -0,0 +1,87 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def backfill_stock_summaries(apps, schema_editor):
+    Inventory = apps.get_model('inventory', 'Inventory')
+    Inventory.objects.filter(quantity_on_hand__lt=F('reorder_point')).update(is_low_stock=True)
+    Inventory.objects.filter(quantity_on_hand__gt=F('safety_stock') * 3).update(is_excess_stock=True)
+
+    for model_name, key in (('ProductStockSummary', 'product_id'), ('WarehouseStockSummary', 'warehouse_id')):
+        model = apps.get_model('inventory', model_name)
+        rows = Inventory.objects.values(key).annotate(
+            total_on_hand=Sum('quantity_on_hand'),
+            total_allocated=Sum('quantity_allocated'),
+            total_on_order=Sum('quantity_on_order'),
+            locations=Count('id'),
+            low=Count('id', filter=Q(is_low_stock=True)),
+            excess=Count('id', filter=Q(is_excess_stock=True))
+        )
+        model.objects.bulk_create([
+            model(
+                quantity_on_hand=row['total_on_hand'] or 0,
+                quantity_allocated=row['total_allocated'] or 0,
+                quantity_on_order=row['total_on_order'] or 0,
+                location_count=row['locations'],
+                low_stock_count=row['low'],
+                excess_stock_count=row['excess'],
+                **{key: row[key]}
+            )
+            for row in rows
+        ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_forecastmodelversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStockSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='inventory.product')),
+                ('quantity_on_hand', models.IntegerField(default=0)),
+                ('quantity_allocated', models.IntegerField(default=0)),
+                ('quantity_on_order', models.IntegerField(default=0)),
+                ('location_count', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('excess_stock_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product stock summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='WarehouseStockSummary',
+            fields=[
+                ('warehouse', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='inventory.warehouse')),
+                ('quantity_on_hand', models.IntegerField(default=0)),
+                ('quantity_allocated', models.IntegerField(default=0)),
+                ('quantity_on_order', models.IntegerField(default=0)),
+                ('location_count', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('excess_stock_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Warehouse stock summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='is_excess_stock',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='is_low_stock',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_stock_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Spread stock over this many shard rows for hot SKUs (1 = unsharded)'),
+        ),
+        migrations.CreateModel(
+            name='InventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity_on_hand', models.PositiveIntegerField(default=0)),
+                ('quantity_allocated', models.PositiveIntegerField(default=0)),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='inventory.inventory')),
+            ],
+            options={
+                'unique_together': {('inventory', 'shard')},
+            },
+        ),
+    ]
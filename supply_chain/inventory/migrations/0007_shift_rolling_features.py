@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def mark_features_stale(apps, schema_editor):
+    # Stored rolling means included each row's own quantity; rebuild them on next read
+    SeriesFeatureState = apps.get_model('inventory', 'SeriesFeatureState')
+    SeriesFeatureState.objects.update(is_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_inventory_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_features_stale, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,18 @@ from django.db import models
 # from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
-from django.db import transaction
+from django.db.models import Sum, F, ExpressionWrapper, DecimalField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from functools import lru_cache
+
+@lru_cache(maxsize=4096)
+def parse_dimensions_volume(dimensions):
+    """Volume in cubic meters of an "LxWxH" string in cm (0 if unparseable)"""
+    try:
+        length, width, height = (float(d) for d in dimensions.lower().split('x'))
+    except (AttributeError, ValueError):
+        return 0
+    return length * width * height / 1_000_000
 
 class Product(models.Model):
     SKU = models.CharField(max_length=50, unique=True)
@@ -26,31 +36,35 @@ class Product(models.Model):
         """Get current stock level for this product"""
         if warehouse:
             inventory = Inventory.objects.filter(product=self, warehouse=warehouse).first()
-            return inventory.quantity_on_hand if inventory else 0
-        return Inventory.objects.filter(product=self).aggregate(total=Sum('quantity_on_hand'))['total'] or 0
+            return inventory.total_on_hand() if inventory else 0
+        # Maintained total instead of summing every warehouse row (as of the last summary refresh)
+        total = ProductStockSummary.objects.filter(product=self).values_list('quantity_on_hand', flat=True).first()
+        return total or 0
     
     def calculate_lead_time(self):
         """Calculate average lead time across all warehouses"""
+        # Weighted by stock including what sharded rows hold in their shards
+        on_hand = F('quantity_on_hand') + shard_stock()
         avg_lead_time = Inventory.objects.filter(product=self).aggregate(
             avg_lead_time=ExpressionWrapper(
-                Sum(F('lead_time_days') * F('quantity_on_hand')) / Sum('quantity_on_hand'),
+                Sum(F('lead_time_days') * on_hand) / Sum(on_hand),
                 output_field=DecimalField()
             )
         )['avg_lead_time']
         return avg_lead_time or 7  # default to 7 days
     
+    def dimensions_volume(self):
+        """Package volume in cubic meters, from the LxWxH (cm) dimensions string"""
+        # Parsed once per distinct dimensions string
+        return parse_dimensions_volume(self.dimensions)
+    
     def allocate_inventory(self, warehouse, quantity):
         """Allocate inventory for an order"""
-        with transaction.atomic():
-            inventory = Inventory.objects.select_for_update().get(
-                product=self, warehouse=warehouse
-            )
-            if inventory.quantity_on_hand >= quantity:
-                inventory.quantity_on_hand -= quantity
-                inventory.quantity_allocated += quantity
-                inventory.save()
-                return True
-            return False
+        from .utils.reservations import StockReservation
+        
+        # One conditional UPDATE rather than a locked fetch and a full-row save
+        warehouse_id = warehouse.pk if isinstance(warehouse, Warehouse) else warehouse
+        return StockReservation.reserve(self.pk, warehouse_id, quantity)
 
 class Warehouse(models.Model):
     WAREHOUSE_TYPES = (
@@ -66,6 +80,8 @@ class Warehouse(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     capacity = models.PositiveIntegerField(help_text="Total storage capacity in cubic meters")
+    country_code = models.CharField(max_length=2, default='US', help_text="ISO country code for the holiday calendar")
+    region_code = models.CharField(max_length=10, blank=True, help_text="State/province code for regional holidays")
     # operational_hours = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
 
@@ -84,6 +100,9 @@ class Inventory(models.Model):
     safety_stock = models.PositiveIntegerField(default=0)
     reorder_point = models.PositiveIntegerField(default=0)
     economic_order_quantity = models.PositiveIntegerField(null=True, blank=True)
+    is_low_stock = models.BooleanField(default=False, db_index=True)  # on hand below reorder point
+    is_excess_stock = models.BooleanField(default=False, db_index=True)  # on hand above 3x safety stock
+    shard_count = models.PositiveSmallIntegerField(default=1, help_text="Spread stock over this many shard rows for hot SKUs (1 = unsharded)")
     last_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -92,6 +111,114 @@ class Inventory(models.Model):
 
     def __str__(self):
         return f"{self.product.SKU} at {self.warehouse.code}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Levels as loaded, so saves can update the stock summaries by difference
+        if not instance.get_deferred_fields() & set(STOCK_LEVEL_FIELDS):
+            instance._stock_snapshot = instance.stock_levels()
+        return instance
+    
+    def stock_levels(self):
+        """Values this row contributes to the stock summaries"""
+        return tuple(int(getattr(self, field)) for field in STOCK_LEVEL_FIELDS)
+    
+    def total_on_hand(self):
+        """On hand including stock held in shard rows"""
+        if self.shard_count > 1 and self.pk:
+            return self.quantity_on_hand + (self.shards.aggregate(total=Sum('quantity_on_hand'))['total'] or 0)
+        return self.quantity_on_hand
+    
+    def refresh_stock_flags(self):
+        on_hand = self.total_on_hand()
+        self.is_low_stock = on_hand < self.reorder_point
+        self.is_excess_stock = on_hand > self.safety_stock * 3
+    
+    def save(self, *args, **kwargs):
+        self.refresh_stock_flags()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'is_low_stock', 'is_excess_stock'}
+        super().save(*args, **kwargs)
+
+class InventoryShard(models.Model):
+    """
+    Slice of a hot Inventory row's stock. The row's totals are its own
+    quantities plus those of its shards, so allocations can update any
+    shard instead of queueing on the one row.
+    """
+    inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    quantity_on_hand = models.PositiveIntegerField(default=0)
+    quantity_allocated = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('inventory', 'shard')
+
+    def __str__(self):
+        return f"Shard {self.shard} of inventory {self.inventory_id}"
+
+def shard_stock(field='quantity_on_hand'):
+    """Expression for the part of an Inventory row's field held in its shards (0 when unsharded)"""
+    return Coalesce(
+        Subquery(
+            InventoryShard.objects.filter(inventory=OuterRef('pk'))
+            .values('inventory').annotate(total=Sum(field)).values('total')
+        ),
+        0
+    )
+
+STOCK_LEVEL_FIELDS = (
+    'quantity_on_hand', 'quantity_allocated', 'quantity_on_order', 'is_low_stock', 'is_excess_stock'
+)
+
+class ProductStockSummary(models.Model):
+    """Stock of one product summed over its warehouses, refreshed from Inventory shortly after it changes"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stock_summary')
+    quantity_on_hand = models.IntegerField(default=0)
+    quantity_allocated = models.IntegerField(default=0)
+    quantity_on_order = models.IntegerField(default=0)
+    location_count = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    excess_stock_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Product stock summaries"
+
+    def __str__(self):
+        return f"Stock summary for {self.product_id}"
+
+class WarehouseStockSummary(models.Model):
+    """Stock held at one warehouse summed over its products, refreshed from Inventory shortly after it changes"""
+    warehouse = models.OneToOneField(Warehouse, on_delete=models.CASCADE, primary_key=True, related_name='stock_summary')
+    quantity_on_hand = models.IntegerField(default=0)
+    quantity_allocated = models.IntegerField(default=0)
+    quantity_on_order = models.IntegerField(default=0)
+    location_count = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    excess_stock_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Warehouse stock summaries"
+
+    def __str__(self):
+        return f"Stock summary for {self.warehouse_id}"
+
+class StockSummaryChange(models.Model):
+    """
+    Outbox of Inventory changes not yet reflected in the stock summaries.
+    Writers only append rows, so they never wait on a shared summary row;
+    StockSummary.apply_changes drains them. Plain ids, so changes to deleted
+    products or warehouses are still drained.
+    """
+    product_id = models.IntegerField()
+    warehouse_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Stock change for {self.product_id} at {self.warehouse_id}"
 
 class SalesHistory(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -110,6 +237,35 @@ class SalesHistory(models.Model):
     def __str__(self):
         return f"{self.product.SKU} sales on {self.date}"
 
+class SeriesFeatureState(models.Model):
+    """Tail of a product/warehouse sales series, used to extend lag and rolling features one row at a time"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    last_date = models.DateField(null=True, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    tail = models.JSONField(default=list)  # most recent quantities, oldest first
+    rolling_sums = models.JSONField(default=dict)  # {window: sum of the last `window` quantities}
+    is_stale = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('product', 'warehouse')
+
+    def __str__(self):
+        return f"Feature state for {self.product_id} at {self.warehouse_id}"
+
+class SalesFeature(models.Model):
+    sales = models.OneToOneField(SalesHistory, on_delete=models.CASCADE, primary_key=True, related_name='features')
+    lag_1 = models.FloatField(null=True, blank=True)
+    lag_7 = models.FloatField(null=True, blank=True)
+    lag_14 = models.FloatField(null=True, blank=True)
+    lag_30 = models.FloatField(null=True, blank=True)
+    rolling_7_mean = models.FloatField(null=True, blank=True)
+    rolling_30_mean = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Features for sales {self.sales_id}"
+
 class DemandForecast(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
@@ -132,4 +288,26 @@ class DemandForecast(models.Model):
         verbose_name_plural = "Demand Forecasts"
 
     def __str__(self):
-        return f"{self.product.SKU} forecast for {self.forecast_start} to {self.forecast_end}"
\ No newline at end of file
+        return f"{self.product.SKU} forecast for {self.forecast_start} to {self.forecast_end}"
+
+class ForecastModelVersion(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    algorithm = models.CharField(max_length=100)
+    version = models.PositiveIntegerField()
+    path = models.CharField(max_length=500)
+    trained_at = models.DateTimeField(auto_now_add=True)
+    data_start = models.DateField(null=True, blank=True)
+    data_end = models.DateField(null=True, blank=True)
+    training_rows = models.PositiveIntegerField(default=0)
+    metrics = models.JSONField(null=True, blank=True)
+    feature_schema = models.JSONField(default=list)  # ordered feature columns the model expects
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        unique_together = ('product', 'warehouse', 'algorithm', 'version')
+        indexes = [models.Index(fields=['product', 'warehouse', 'algorithm', 'is_active'])]
+
+    def __str__(self):
+        return f"{self.algorithm} v{self.version} for {self.product_id} at {self.warehouse_id}"
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from inventory.models import Inventory, SalesHistory, Warehouse
+from inventory.utils.calendars import clear_warehouse_regions
+from inventory.utils.feature_store import FeatureStore
+from inventory.utils.stock_summary import StockSummary
+
+
+@receiver(post_save, sender=SalesHistory)
+def update_sales_features(sender, instance, created, raw=False, **kwargs):
+    """Keep stored lag/rolling features in step with new sales"""
+    if raw:
+        return
+    FeatureStore.record_sale(instance, created)
+
+
+@receiver(post_delete, sender=SalesHistory)
+def invalidate_sales_features(sender, instance, **kwargs):
+    FeatureStore.mark_stale(instance.product_id, instance.warehouse_id)
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_warehouse_regions(sender, **kwargs):
+    """A warehouse's country or region may have changed its holiday calendar"""
+    clear_warehouse_regions()
+
+
+@receiver(post_save, sender=Inventory)
+def update_stock_summaries(sender, instance, created, raw=False, **kwargs):
+    """Queue the product and warehouse stock summaries for a refresh"""
+    if raw:
+        return
+    StockSummary.record_save(instance, created)
+
+
+@receiver(post_delete, sender=Inventory)
+def remove_from_stock_summaries(sender, instance, **kwargs):
+    StockSummary.record_delete(instance)
@@ -1,25 +1,88 @@
-from celery import shared_task
-from django.db.models import F, Sum, ExpressionWrapper
-from inventory.models import Inventory, DemandForecast, SalesHistory,  Product, Warehouse
+from celery import shared_task, group, chord
+from django.conf import settings
+from inventory.models import Inventory, DemandForecast, Product, Warehouse
 from inventory.utils.forecasting import DemandForecaster
-from datetime import date, timedelta
-from django.db.models.fields import DecimalField
+from inventory.utils.batch_forecasting import BatchDemandForecaster
+from inventory.utils.forecast_executor import ForecastExecutor, forecast_series_chunk, summarize_chunk_reports
+from inventory.utils.retraining import RetrainingPolicy, evaluate_forecast_accuracy
+from inventory.utils.fast_forecasting import TieredForecaster
+from inventory.utils.optimizers import InventoryOptimizer
+from inventory.utils.planning import ForecastInventoryPlanner
+from inventory.utils.sharding import InventorySharding
+from inventory.utils.stock_summary import StockSummary
 import logging
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def generate_daily_forecasts():
-    """Generate daily demand forecasts for all products"""
+def generate_forecast_chunk(chunk_index, series, method='random_forest', periods=30, n_jobs=1):
+    """Celery subtask: forecast one chunk of (product_id, warehouse_id) pairs"""
+    return forecast_series_chunk(chunk_index, series, method, periods, n_jobs)
+
+@shared_task
+def summarize_forecast_chunks(reports):
+    """Aggregate per-chunk forecast reports"""
+    summary = summarize_chunk_reports(sorted(reports, key=lambda r: r['chunk']))
+    logger.info(
+        f"Generated forecasts for {summary['succeeded']} of {summary['series']} series "
+        f"({summary['failed']} failed)"
+    )
+    return summary
+
+@shared_task
+def generate_daily_forecasts(mode=None, inline=False):
+    """
+    Generate daily demand forecasts for all products.
+    'batch' mode trains pooled models over every series in one pass;
+    'parallel' fits one model per series, spread over Celery chunks (or a
+    local process pool when inline=True); 'series' fits them one by one;
+    'tiered' forecasts low-volume series with cheap statistical methods in
+    one batch and sends only the high-volume ones down the 'parallel' path.
+    """
+    mode = mode or getattr(settings, 'FORECAST_MODE', 'batch')
+    method = getattr(settings, 'FORECAST_METHOD', 'random_forest')
+    
+    if mode == 'batch':
+        forecaster = BatchDemandForecaster(
+            pool_by=getattr(settings, 'FORECAST_POOL_BY', 'global')
+        )
+        series_count = forecaster.run(periods=30)
+        return f"Generated pooled forecasts for {series_count} product-warehouse combinations"
+    
     products = Inventory.objects.values_list(
         'product_id', 'warehouse_id'
     ).distinct()
     
+    if mode == 'tiered':
+        products = list(products)
+        head = set(TieredForecaster().run(periods=30, series=products))
+        products = [pair for pair in products if pair in head]
+        mode = 'parallel'
+    
+    if mode == 'parallel':
+        executor = ForecastExecutor()
+        if inline:
+            return executor.run(list(products), method=method, periods=30)
+        
+        # Each Celery worker process runs one chunk at a time, so models are
+        # pinned to FORECAST_MODEL_N_JOBS threads to avoid oversubscription
+        n_jobs = getattr(settings, 'FORECAST_MODEL_N_JOBS', 1)
+        chunks = executor.make_chunks(products)
+        if not chunks:
+            return "No product-warehouse combinations left for the heavy models"
+        chord(
+            group(
+                generate_forecast_chunk.s(index, chunk, method, 30, n_jobs)
+                for index, chunk in enumerate(chunks)
+            )
+        )(summarize_forecast_chunks.s())
+        return f"Dispatched forecasts for {len(products)} product-warehouse combinations in {len(chunks)} chunks"
+    
     for product_id, warehouse_id in products:
         try:
             forecaster = DemandForecaster(product_id, warehouse_id)
             forecast = forecaster.generate_forecast(
-                method='random_forest',
+                method=method,
                 periods=30
             )
             logger.info(
@@ -30,49 +93,55 @@ def generate_daily_forecasts():
                 f"Failed to generate forecast for product {product_id} at warehouse {warehouse_id}: {str(e)}"
             )
     
-    return f"Generated forecasts for {products.count()} product-warehouse combinations"
+    return f"Generated forecasts for {len(products)} product-warehouse combinations"
 
 @shared_task
-def update_reorder_points():
-    """Update reorder points based on recent demand"""
-    # Get products that need reorder point updates
-    inventories = Inventory.objects.filter(
-        last_count_date__lte=date.today() - timedelta(days=7)
-    ).select_related('product')
-    
-    updated_count = 0
-    
-    for inventory in inventories:
-        try:
-            # Get recent sales data (last 3 months)
-            sales_data = SalesHistory.objects.filter(
-                product=inventory.product,
-                warehouse=inventory.warehouse,
-                date__gte=date.today() - timedelta(days=90)
-            ).aggregate(
-                avg_daily_sales=ExpressionWrapper(
-                    Sum('quantity_sold') / 90,
-                    output_field=DecimalField()
-                )
-            )
-            
-            avg_daily_sales = sales_data['avg_daily_sales'] or 0
-            
-            # Calculate new reorder point (lead time demand + safety stock)
-            lead_time_demand = avg_daily_sales * inventory.lead_time_days
-            safety_stock = avg_daily_sales * 7  # 1 week safety stock
-            new_reorder_point = round(lead_time_demand + safety_stock)
-            
-            if new_reorder_point != inventory.reorder_point:
-                inventory.reorder_point = new_reorder_point
-                inventory.safety_stock = round(safety_stock)
-                inventory.last_count_date = date.today()
-                inventory.save()
-                updated_count += 1
-                
-        except Exception as e:
-            logger.error(
-                f"Failed to update reorder point for inventory {inventory.id}: {str(e)}"
-            )
-    
-    return f"Updated reorder points for {updated_count} inventory items"
\ No newline at end of file
+def retrain_stale_models(budget_seconds=None, dry_run=False):
+    """Score elapsed forecasts, then retrain the series whose models degraded most"""
+    evaluated = evaluate_forecast_accuracy()
+    report = RetrainingPolicy(budget_seconds=budget_seconds).run(dry_run=dry_run)
+    report['forecasts_evaluated'] = evaluated
+    logger.info(
+        f"Retrained {report['retrained']} of {report['candidates']} candidate models "
+        f"in {report['seconds']}s ({report['failed']} failed)"
+    )
+    return report
+
+@shared_task
+def plan_inventory_levels(dry_run=False):
+    """Set reorder points, safety stock and EOQ from the latest demand forecasts"""
+    summary = ForecastInventoryPlanner().plan(dry_run=dry_run)
+    logger.info(
+        f"Planned {summary['planned']} inventory items from forecasts "
+        f"({summary['updated']} changed{', dry run' if dry_run else ''})"
+    )
+    return summary
+
+@shared_task
+def update_reorder_points(dry_run=False, batch_size=2000):
+    """
+    Update reorder points based on recent demand.
+    Rows with a recent forecast are skipped: plan_inventory_levels owns them.
+    """
+    summary = InventoryOptimizer.update_reorder_points(dry_run=dry_run, batch_size=batch_size)
+    if dry_run:
+        return f"Would update reorder points for {summary['updated']} of {summary['evaluated']} inventory items"
+    return f"Updated reorder points for {summary['updated']} inventory items"
+
+@shared_task
+def rebalance_inventory_shards():
+    """Fold the shards of hot inventory rows and spread their stock evenly again"""
+    rebalanced = InventorySharding.rebalance()
+    return f"Rebalanced {rebalanced} sharded inventory items"
+
+@shared_task
+def apply_stock_summary_changes(limit=50000):
+    """Bring stock summaries up to date with queued Inventory changes; run every minute by beat"""
+    total = 0
+    while True:
+        applied = StockSummary.apply_changes(limit=limit)
+        total += applied
+        # A short batch means the queue was drained; new changes wait for the next run
+        if applied < limit:
+            break
+    return f"Applied {total} stock summary changes"
@@ -1,3 +1,865 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from inventory.models import (
+    Product, Warehouse, Inventory, InventoryShard, SalesHistory, ProductStockSummary, WarehouseStockSummary, StockSummaryChange,
+    DemandForecast, ForecastModelVersion, SalesFeature, SeriesFeatureState
+)
+from inventory.utils.batch_forecasting import BatchDemandForecaster
+from inventory.utils.benchmarking import ForecastBenchmark, compare_reports, forecast_errors, generate_synthetic_sales
+from inventory.utils.feature_store import FeatureStore, FEATURE_COLUMNS
+from inventory.utils.fast_forecasting import (
+    TieredForecaster, classify_series, CROSTON, HEAVY, SEASONAL_NAIVE, SMOOTHING
+)
+from inventory.utils.model_registry import ModelRegistry
+from inventory.utils.optimizers import InventoryOptimizer
+from inventory.utils.planning import ForecastInventoryPlanner
+from inventory.utils.recursive_forecasting import RecursiveForecaster
+from inventory.utils.reservations import StockReservation
+from inventory.utils.retraining import RetrainingPolicy, evaluate_forecast_accuracy
+from inventory.utils.sharding import InventorySharding
+from inventory.views import SalesBulkAPIView
+from inventory.utils.stock_summary import SUMMARY_FIELDS, StockSummary
 
-# Create your tests here.
+
+def create_product(sku):
+    return Product.objects.create(
+        SKU=sku, name=sku, category='General', unit_cost=1, selling_price=2, weight=1, dimensions='1x1x1'
+    )
+
+
+def create_warehouse(code, latitude=0, longitude=0):
+    return Warehouse.objects.create(
+        code=code, name=code, type='local', address='', latitude=latitude, longitude=longitude, capacity=1000
+    )
+
+
+def create_sales(product, warehouse, quantities, end_date=None):
+    """One sales row per day up to end_date (yesterday by default); zero days get no row"""
+    end_date = end_date or date.today() - timedelta(days=1)
+    start_date = end_date - timedelta(days=len(quantities) - 1)
+    SalesHistory.objects.bulk_create([
+        SalesHistory(
+            product=product, warehouse=warehouse, date=start_date + timedelta(days=day),
+            quantity_sold=quantity, revenue=quantity * 2
+        )
+        for day, quantity in enumerate(quantities) if quantity
+    ])
+
+
+class StockSummaryAssertions:
+    """Drain the summary outbox and compare every summary with Inventory"""
+    def assertSummariesConsistent(self):
+        StockSummary.apply_changes()
+        self.assertFalse(StockSummaryChange.objects.exists())
+        for model, key in ((ProductStockSummary, 'product_id'), (WarehouseStockSummary, 'warehouse_id')):
+            expected = StockSummary.summary_rows(key)
+            stored = {
+                row[0]: list(row[1:])
+                for row in model.objects.values_list(key, *SUMMARY_FIELDS)
+            }
+            for pk, totals in expected.items():
+                self.assertEqual(stored.get(pk), totals, f"{model.__name__} {pk}")
+            # Products or warehouses without stock keep a zero summary
+            for pk in set(stored) - set(expected):
+                self.assertEqual(stored[pk], [0] * len(SUMMARY_FIELDS), f"{model.__name__} {pk}")
+
+
+class StockSummaryTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.products = [create_product(f'SKU-{i}') for i in range(2)]
+        self.warehouses = [create_warehouse(f'WH-{i}') for i in range(2)]
+        for product in self.products:
+            for warehouse in self.warehouses:
+                Inventory.objects.create(
+                    product=product, warehouse=warehouse, quantity_on_hand=20, reorder_point=10, safety_stock=5
+                )
+
+    def test_saves_only_queue_changes(self):
+        StockSummary.apply_changes()
+        inventory = Inventory.objects.get(product=self.products[0], warehouse=self.warehouses[0])
+        inventory.quantity_on_hand = 4
+        inventory.save()
+
+        self.assertEqual(StockSummaryChange.objects.count(), 1)
+        self.assertEqual(ProductStockSummary.objects.get(product=self.products[0]).quantity_on_hand, 40)
+        self.assertSummariesConsistent()
+        summary = ProductStockSummary.objects.get(product=self.products[0])
+        self.assertEqual((summary.quantity_on_hand, summary.low_stock_count), (24, 1))
+
+    def test_unchanged_save_is_not_queued(self):
+        StockSummary.apply_changes()
+        inventory = Inventory.objects.get(product=self.products[0], warehouse=self.warehouses[0])
+        inventory.lead_time_days = 3
+        inventory.save()
+        self.assertFalse(StockSummaryChange.objects.exists())
+
+    def test_deletes_and_cascades(self):
+        Inventory.objects.get(product=self.products[0], warehouse=self.warehouses[0]).delete()
+        self.assertSummariesConsistent()
+        self.assertEqual(WarehouseStockSummary.objects.get(warehouse=self.warehouses[0]).location_count, 1)
+
+        # Changes queued for a deleted product are still drained
+        self.products[1].delete()
+        self.assertSummariesConsistent()
+        self.assertFalse(ProductStockSummary.objects.filter(product_id=self.products[1].pk).exists())
+
+
+class StockReservationTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.product = create_product('SKU-1')
+        self.warehouses = [create_warehouse(f'WH-{i}') for i in range(2)]
+        self.stock = [
+            Inventory.objects.create(
+                product=self.product, warehouse=warehouse, quantity_on_hand=20, reorder_point=10, safety_stock=5
+            )
+            for warehouse in self.warehouses
+        ]
+
+    def levels(self, inventory):
+        return Inventory.objects.values_list(
+            'quantity_on_hand', 'quantity_allocated', 'is_low_stock', 'is_excess_stock'
+        ).get(pk=inventory.pk)
+
+    def test_reserve_moves_stock_and_flags(self):
+        self.assertEqual(self.levels(self.stock[0]), (20, 0, False, True))
+        self.assertTrue(StockReservation.reserve(self.product.id, self.warehouses[0].id, 11))
+        self.assertEqual(self.levels(self.stock[0]), (9, 11, True, False))
+        self.assertSummariesConsistent()
+
+        self.assertTrue(StockReservation.release(self.product.id, self.warehouses[0].id, 7))
+        self.assertEqual(self.levels(self.stock[0]), (16, 4, False, True))
+        self.assertTrue(StockReservation.commit(self.product.id, self.warehouses[0].id, 4))
+        self.assertEqual(self.levels(self.stock[0]), (16, 0, False, True))
+        self.assertSummariesConsistent()
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.assertFalse(StockReservation.reserve(self.product.id, self.warehouses[0].id, 21))
+        self.assertFalse(StockReservation.release(self.product.id, self.warehouses[0].id, 1))
+        self.assertEqual(self.levels(self.stock[0]), (20, 0, False, True))
+        self.assertSummariesConsistent()
+
+    def test_non_positive_quantity_is_rejected(self):
+        for quantity in (0, -5):
+            with self.assertRaises(ValueError):
+                StockReservation.reserve(self.product.id, self.warehouses[0].id, quantity)
+        # A negative line must not offset another line of the same row
+        with self.assertRaises(ValueError):
+            StockReservation.reserve_lines([
+                (self.product.id, self.warehouses[0].id, 30), (self.product.id, self.warehouses[0].id, -15)
+            ])
+        self.assertEqual(self.levels(self.stock[0]), (20, 0, False, True))
+
+    def test_lines_are_moved_all_or_nothing(self):
+        lines = [
+            (self.product.id, self.warehouses[0].id, 5),
+            (self.product.id, self.warehouses[1].id, 15),
+            (self.product.id, self.warehouses[1].id, 6),
+        ]
+        self.assertFalse(StockReservation.reserve_lines(lines))
+        self.assertEqual([self.levels(inventory)[:2] for inventory in self.stock], [(20, 0), (20, 0)])
+        self.assertSummariesConsistent()
+
+        self.assertTrue(StockReservation.reserve_lines(lines[:2]))
+        self.assertEqual([self.levels(inventory)[:2] for inventory in self.stock], [(15, 5), (5, 15)])
+        self.assertSummariesConsistent()
+
+
+class InventoryShardingTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.product = create_product('SKU-1')
+        self.warehouse = create_warehouse('WH-1')
+        self.inventory = Inventory.objects.create(
+            product=self.product, warehouse=self.warehouse, quantity_on_hand=10, reorder_point=4, safety_stock=3
+        )
+        InventorySharding.shard_inventory(self.inventory.id, 3)
+
+    def tearDown(self):
+        InventorySharding.clear_sharded_pairs()
+
+    def shard_levels(self):
+        return list(InventoryShard.objects.filter(inventory=self.inventory).order_by('shard').values_list(
+            'quantity_on_hand', 'quantity_allocated'
+        ))
+
+    def reserve(self, quantity):
+        return StockReservation.reserve(self.product.id, self.warehouse.id, quantity)
+
+    def test_sharding_spreads_stock(self):
+        self.assertEqual(self.shard_levels(), [(4, 0), (3, 0), (3, 0)])
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity_on_hand, self.inventory.total_on_hand()), (0, 10))
+        self.assertTrue(InventorySharding.is_sharded(self.product.id, self.warehouse.id))
+        self.assertSummariesConsistent()
+
+    def test_reserve_from_one_shard_then_fall_back(self):
+        self.assertTrue(self.reserve(3))
+        self.assertEqual(sum(on_hand for on_hand, _ in self.shard_levels()), 7)
+        self.assertSummariesConsistent()
+
+        # No single shard holds 6 any more, so the locked path takes from several
+        self.assertTrue(self.reserve(6))
+        self.assertFalse(self.reserve(2))
+        self.assertSummariesConsistent()
+        # Flags of sharded rows are settled by the summary drain
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.total_on_hand(), 1)
+        self.assertTrue(self.inventory.is_low_stock)
+        summary = ProductStockSummary.objects.get(product=self.product)
+        self.assertEqual((summary.quantity_on_hand, summary.quantity_allocated, summary.low_stock_count), (1, 9, 1))
+
+    def test_row_sharded_elsewhere_uses_shards(self):
+        # Another process shards the row after this one last looked
+        Inventory.objects.filter(id=self.inventory.id).update(shard_count=1)
+        InventorySharding.clear_sharded_pairs()
+        self.assertFalse(InventorySharding.is_sharded(self.product.id, self.warehouse.id))
+        Inventory.objects.filter(id=self.inventory.id).update(shard_count=3)
+
+        self.assertTrue(self.reserve(5))
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).total_on_hand(), 5)
+        self.assertSummariesConsistent()
+
+    def test_lines_across_sharded_rows(self):
+        other = create_product('SKU-2')
+        inventory = Inventory.objects.create(
+            product=other, warehouse=self.warehouse, quantity_on_hand=6, reorder_point=4, safety_stock=3
+        )
+        InventorySharding.shard_inventory(inventory.id, 2)
+        lines = [(self.product.id, self.warehouse.id, 2), (other.id, self.warehouse.id, 3)]
+
+        self.assertFalse(StockReservation.reserve_lines(lines + [(other.id, self.warehouse.id, 4)]))
+        self.assertEqual([row.total_on_hand() for row in Inventory.objects.order_by('id')], [10, 6])
+        self.assertSummariesConsistent()
+
+        self.assertTrue(StockReservation.reserve_lines(lines))
+        self.assertEqual([row.total_on_hand() for row in Inventory.objects.order_by('id')], [8, 3])
+        self.assertEqual(
+            sum(InventoryShard.objects.filter(inventory__product=other).values_list('quantity_allocated', flat=True)), 3
+        )
+        self.assertSummariesConsistent()
+
+    def test_fold_takes_only_what_is_needed(self):
+        inventory = Inventory.objects.get(pk=self.inventory.pk)
+        InventorySharding.fold_locked([inventory], {inventory.id: 5})
+        self.assertEqual(inventory.quantity_on_hand, 5)
+        self.assertEqual(self.shard_levels(), [(0, 0), (2, 0), (3, 0)])
+        inventory.refresh_from_db()
+        self.assertEqual((inventory.quantity_on_hand, inventory.total_on_hand()), (5, 10))
+
+        InventorySharding.fold_locked([inventory], {inventory.id: 50})
+        self.assertEqual(inventory.quantity_on_hand, 10)
+        self.assertEqual(self.shard_levels(), [(0, 0), (0, 0), (0, 0)])
+
+    def test_rebalance_and_unshard(self):
+        self.assertTrue(self.reserve(2))
+        InventorySharding.rebalance()
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity_allocated, 2)
+        self.assertEqual(self.shard_levels(), [(3, 0), (3, 0), (2, 0)])
+        self.assertSummariesConsistent()
+
+        InventorySharding.shard_inventory(self.inventory.id, 1)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity_on_hand, self.inventory.quantity_allocated), (8, 2))
+        self.assertFalse(InventoryShard.objects.filter(inventory=self.inventory).exists())
+        self.assertFalse(InventorySharding.is_sharded(self.product.id, self.warehouse.id))
+        self.assertTrue(self.reserve(6))
+        self.assertTrue(Inventory.objects.get(pk=self.inventory.pk).is_low_stock)
+        self.assertSummariesConsistent()
+
+
+class InventoryOptimizerTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.products = [create_product(f'SKU-{i}') for i in range(2)]
+        self.warehouses = [create_warehouse(f'WH-{i}') for i in range(2)]
+        self.stock = Inventory.objects.create(
+            product=self.products[0], warehouse=self.warehouses[0], quantity_on_hand=20, reorder_point=10, safety_stock=5
+        )
+        # Mean 10 a day with a standard deviation of 2
+        create_sales(self.products[0], self.warehouses[0], [8, 12] * 45)
+        create_sales(self.products[1], self.warehouses[0], [8, 12] * 45)
+        today = date.today()
+        DemandForecast.objects.create(
+            product=self.products[1], warehouse=self.warehouses[0], forecast_date=today, period='daily',
+            forecast_start=today, forecast_end=today, forecast_values={str(today): 10.0}, algorithm_used='prophet'
+        )
+
+    def levels(self, product, warehouse):
+        return Inventory.objects.values_list(
+            'reorder_point', 'safety_stock', 'economic_order_quantity', 'is_low_stock'
+        ).get(product=product, warehouse=warehouse)
+
+    def test_levels_from_sales_statistics(self):
+        summary = InventoryOptimizer.optimize_inventory_levels(service_level=0.95)
+
+        self.assertEqual(summary, {'created': 3, 'evaluated': 4, 'updated': 1})
+        # 1.645 x 2 x sqrt(7) safety stock on 7 days of lead time demand; EOQ sqrt(2 x 3650 x 50 / 0.25)
+        self.assertEqual(self.levels(self.products[0], self.warehouses[0]), (79, 9, 1209, True))
+        # Forecast-planned rows and rows without sales keep their levels
+        self.assertEqual(self.levels(self.products[1], self.warehouses[0]), (10, 5, None, True))
+        self.assertEqual(self.levels(self.products[0], self.warehouses[1]), (10, 5, None, True))
+        self.assertSummariesConsistent()
+
+        self.assertEqual(InventoryOptimizer.optimize_inventory_levels(service_level=0.95)['updated'], 0)
+
+
+class ReorderPointTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1')
+        today = date.today()
+        self.stock = {}
+        for name, counted_days_ago in (('SELLING', 10), ('COUNTED', 1), ('FORECAST', 10), ('IDLE', 10)):
+            product = create_product(name)
+            self.stock[name] = Inventory.objects.create(
+                product=product, warehouse=self.warehouse, quantity_on_hand=100, reorder_point=10,
+                safety_stock=5, last_count_date=today - timedelta(days=counted_days_ago)
+            )
+            if name != 'IDLE':
+                create_sales(product, self.warehouse, [9] * 90)
+        DemandForecast.objects.create(
+            product=self.stock['FORECAST'].product, warehouse=self.warehouse, forecast_date=today, period='daily',
+            forecast_start=today, forecast_end=today, forecast_values={str(today): 9.0}, algorithm_used='prophet'
+        )
+
+    def levels(self):
+        return {
+            name: Inventory.objects.values_list('reorder_point', 'safety_stock', 'is_low_stock').get(pk=inventory.pk)
+            for name, inventory in self.stock.items()
+        }
+
+    def test_dry_run_then_update(self):
+        before = self.levels()
+        self.assertEqual(
+            InventoryOptimizer.update_reorder_points(dry_run=True), {'evaluated': 2, 'updated': 2, 'dry_run': True}
+        )
+        self.assertEqual(self.levels(), before)
+
+        InventoryOptimizer.update_reorder_points()
+        # 9 a day over 7 days of lead time plus a week of safety stock
+        self.assertEqual(self.levels(), {
+            'SELLING': (126, 63, True), 'COUNTED': (10, 5, False), 'FORECAST': (10, 5, False), 'IDLE': (0, 0, False)
+        })
+        self.assertEqual(Inventory.objects.get(pk=self.stock['SELLING'].pk).last_count_date, date.today())
+        self.assertSummariesConsistent()
+
+
+class ForecastPlannerTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1')
+        self.today = date.today()
+        self.stock = {}
+        # An 80% interval of 10 +- 1.2816 x 2, i.e. a daily standard deviation of 2
+        interval = {'level': 0.8, 'lower': 10 - 1.2816 * 2, 'upper': 10 + 1.2816 * 2}
+        for name, lead_time, first_day, values, daily_interval, forecast_age in (
+            ('INTERVAL', 7, 0, [10] * 14, interval, 0),
+            ('SALES_SPREAD', 7, 0, [10] * 14, None, 0),
+            ('STARTED_EARLIER', 7, -3, [5] * 3 + [20] * 14, None, 2),
+            ('LONG_LEAD', 20, 0, [10] * 14, interval, 0),
+            ('OLD_FORECAST', 7, 0, [10] * 14, None, 10),
+            ('NO_FORECAST', 7, 0, None, None, 0),
+        ):
+            product = create_product(name)
+            self.stock[name] = Inventory.objects.create(
+                product=product, warehouse=self.warehouse, quantity_on_hand=100, reorder_point=10,
+                safety_stock=5, lead_time_days=lead_time
+            )
+            if values is None:
+                continue
+            dates = [str(self.today + timedelta(days=first_day + day)) for day in range(len(values))]
+            DemandForecast.objects.create(
+                product=product, warehouse=self.warehouse, period='daily',
+                forecast_date=self.today - timedelta(days=forecast_age),
+                forecast_start=dates[0], forecast_end=dates[-1], forecast_values=dict(zip(dates, values)),
+                confidence_interval={
+                    'level': daily_interval['level'],
+                    'lower': dict.fromkeys(dates, daily_interval['lower']),
+                    'upper': dict.fromkeys(dates, daily_interval['upper']),
+                } if daily_interval else None,
+                algorithm_used='random_forest'
+            )
+        create_sales(self.stock['SALES_SPREAD'].product, self.warehouse, [8, 12] * 45)
+
+    def levels(self):
+        return {
+            name: Inventory.objects.values_list(
+                'reorder_point', 'safety_stock', 'economic_order_quantity'
+            ).get(pk=inventory.pk)
+            for name, inventory in self.stock.items()
+        }
+
+    def test_plan_from_forecasts(self):
+        planner = ForecastInventoryPlanner(service_level=0.95)
+        before = self.levels()
+        self.assertEqual(planner.plan(dry_run=True), {'planned': 4, 'updated': 4, 'with_intervals': 2, 'dry_run': True})
+        self.assertEqual(self.levels(), before)
+
+        planner.plan()
+        self.assertEqual(self.levels(), {
+            # 70 over the lead time + ceil(1.645 x 2 x sqrt(7)); the same spread from sales history
+            'INTERVAL': (79, 9, 1209),
+            'SALES_SPREAD': (79, 9, 1209),
+            # Days before today are ignored; no interval and no sales means no safety stock
+            'STARTED_EARLIER': (140, 0, 1709),
+            # Beyond the horizon the lead time runs on at the forecast's mean
+            'LONG_LEAD': (215, 15, 1209),
+            'OLD_FORECAST': (10, 5, None),
+            'NO_FORECAST': (10, 5, None),
+        })
+        self.assertSummariesConsistent()
+
+
+class FeatureStoreTests(TestCase):
+    def setUp(self):
+        self.product = create_product('SKU-1')
+        self.warehouse = create_warehouse('WH-1')
+        self.start = date(2024, 1, 1)
+        # Saved one by one, so every row goes through the incremental path
+        for day in range(45):
+            self.sell(day, 3 + (day * 7) % 11)
+
+    def sell(self, day, quantity):
+        return SalesHistory.objects.create(
+            product=self.product, warehouse=self.warehouse, date=self.start + timedelta(days=day),
+            quantity_sold=quantity, revenue=quantity * 2
+        )
+
+    def stored(self):
+        features = {
+            row[0]: row[1:] for row in SalesFeature.objects.values_list('sales__date', *FEATURE_COLUMNS)
+        }
+        state = SeriesFeatureState.objects.values(
+            'last_date', 'row_count', 'tail', 'rolling_sums', 'is_stale'
+        ).get(product=self.product, warehouse=self.warehouse)
+        return features, state
+
+    def assertMatchesRebuild(self):
+        incremental = self.stored()
+        FeatureStore.rebuild(self.product.id, self.warehouse.id)
+        rebuilt = self.stored()
+        self.assertEqual(incremental[0].keys(), rebuilt[0].keys())
+        for sale_date, values in rebuilt[0].items():
+            for column, value, expected in zip(FEATURE_COLUMNS, incremental[0][sale_date], values):
+                if expected is None:
+                    self.assertIsNone(value, f"{column} on {sale_date}")
+                else:
+                    self.assertAlmostEqual(value, expected, msg=f"{column} on {sale_date}")
+        self.assertEqual(incremental[1], rebuilt[1])
+
+    def test_appends_match_rebuild(self):
+        features, state = self.stored()
+        self.assertEqual((state['row_count'], state['is_stale']), (45, False))
+        self.assertEqual(features[self.start + timedelta(days=30)][FEATURE_COLUMNS.index('lag_30')], 3)
+        self.assertMatchesRebuild()
+
+    def test_latest_day_correction_matches_rebuild(self):
+        sale = SalesHistory.objects.get(date=self.start + timedelta(days=44))
+        sale.quantity_sold = 50
+        sale.save()
+        self.assertFalse(SeriesFeatureState.objects.get().is_stale)
+        self.sell(45, 1)
+        self.assertMatchesRebuild()
+
+    def test_back_dated_row_marks_the_series_stale(self):
+        SalesHistory.objects.filter(date=self.start + timedelta(days=10)).delete()
+        FeatureStore.ensure_fresh(self.product.id, self.warehouse.id)
+        self.assertFalse(SeriesFeatureState.objects.get().is_stale)
+
+        self.sell(10, 100)
+        self.assertTrue(SeriesFeatureState.objects.get().is_stale)
+        # Later appends wait for the rebuild rather than extending stale features
+        self.sell(45, 1)
+        self.assertTrue(SeriesFeatureState.objects.get().is_stale)
+
+        frame = FeatureStore.feature_frame(
+            self.product.id, self.warehouse.id, self.start + timedelta(days=11), self.start + timedelta(days=11)
+        )
+        self.assertEqual(frame['lag_1'].tolist(), [100])
+        features, state = self.stored()
+        self.assertEqual((state['row_count'], state['is_stale']), (46, False))
+        self.assertEqual(len(features), 46)
+        self.assertMatchesRebuild()
+
+
+@override_settings(MODEL_ROOT=tempfile.mkdtemp())
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        self.product = create_product('SKU-1')
+        self.warehouse = create_warehouse('WH-1')
+        self.registry = ModelRegistry(keep_versions=2)
+
+    def register(self, model, registry=None, days=10):
+        training_df = pd.DataFrame(
+            {'quantity_sold': range(days)}, index=pd.date_range('2024-01-01', periods=days, name='date')
+        )
+        return (registry or self.registry).register(
+            self.product.id, self.warehouse.id, 'random_forest', model,
+            training_df=training_df, metrics={'mae': 1.0}, feature_schema=['lag_1']
+        )
+
+    def test_versions_are_numbered_and_pruned(self):
+        versions = [self.register({'weights': [number]}, days=10 + number) for number in range(1, 5)]
+
+        self.assertEqual([version.version for version in versions], [1, 2, 3, 4])
+        kept = ForecastModelVersion.objects.order_by('version')
+        self.assertEqual([(version.version, version.is_active) for version in kept], [(3, False), (4, True)])
+        self.assertEqual([os.path.exists(version.path) for version in versions], [False, False, True, True])
+
+        latest = self.registry.latest(self.product.id, self.warehouse.id, 'random_forest')
+        self.assertEqual(latest.pk, versions[-1].pk)
+        self.assertEqual((latest.data_start, latest.data_end, latest.training_rows), (
+            date(2024, 1, 1), date(2024, 1, 14), 14
+        ))
+        self.assertEqual(latest.feature_schema, ['lag_1'])
+
+    def test_loads_are_cached_within_budget(self):
+        model = {'weights': [1, 2, 3]}
+        version = self.register(model)
+        # Registering keeps the fitted object; another process reads it from disk
+        self.assertIs(self.registry.load(version), model)
+        fresh = ModelRegistry()
+        loaded = fresh.load(version)
+        self.assertEqual(loaded, model)
+        self.assertIs(fresh.load(version), loaded)
+
+        # A budget below one model still holds the newest
+        small = ModelRegistry(memory_budget_mb=0, keep_versions=5)
+        first, second = self.register({'weights': [1]}, small), self.register({'weights': [2]}, small)
+        self.assertEqual(list(small._models), [second.pk])
+        self.assertEqual(small.load(first), {'weights': [1]})
+        self.assertEqual(list(small._models), [first.pk])
+
+
+class RetrainingTests(TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1')
+        self.yesterday = date.today() - timedelta(days=1)
+        self.products = {}
+        # (recent daily sales, days since the model's data ends, seconds its fit took)
+        for name, daily, untrained_days, fit_seconds in (
+            ('FRESH', 10, 0, 10), ('NEW_ROWS', 10, 35, 10), ('DRIFTED', 20, 0, 10), ('WORSE', 10, 0, 100)
+        ):
+            product = self.products[name] = create_product(name)
+            create_sales(product, self.warehouse, [daily] * 40)
+            ForecastModelVersion.objects.create(
+                product=product, warehouse=self.warehouse, algorithm='random_forest', version=1, path='',
+                data_end=self.yesterday - timedelta(days=untrained_days),
+                metrics={'demand_mean': 10.0, 'avg_mae': 1.0, 'fit_seconds': fit_seconds}
+            )
+
+        # WORSE has been forecasting 3 units off against a cross-validated error of 1
+        start = date.today() - timedelta(days=5)
+        DemandForecast.objects.create(
+            product=self.products['WORSE'], warehouse=self.warehouse, forecast_date=start, period='daily',
+            forecast_start=start, forecast_end=start + timedelta(days=9), algorithm_used='random_forest',
+            forecast_values={str(start + timedelta(days=day)): 13.0 for day in range(10)}
+        )
+
+    def policy(self, budget_seconds):
+        return RetrainingPolicy(
+            budget_seconds=budget_seconds, min_new_rows=30, drift_threshold=0.25,
+            error_ratio_threshold=1.25, max_age_days=90
+        )
+
+    def planned(self, budget_seconds):
+        return [
+            Product.objects.get(pk=signal['version'].product_id).SKU
+            for signal in self.policy(budget_seconds).plan()
+        ]
+
+    def test_accuracy_of_elapsed_days(self):
+        self.assertEqual(evaluate_forecast_accuracy(), 1)
+        metrics = DemandForecast.objects.get().accuracy_metrics
+        self.assertEqual((metrics['mae'], metrics['mape'], metrics['days_evaluated']), (3.0, 0.3, 5))
+
+    def test_plan_by_priority_within_budget(self):
+        evaluate_forecast_accuracy()
+        signals = {
+            Product.objects.get(pk=signal['version'].product_id).SKU: signal
+            for signal in self.policy(50).series_signals()
+        }
+        self.assertEqual(signals['NEW_ROWS']['new_rows'], 35)
+        self.assertEqual(signals['DRIFTED']['drift'], 1.0)
+        self.assertEqual(signals['WORSE']['error_ratio'], 3.0)
+
+        self.assertEqual(self.planned(200), ['WORSE', 'DRIFTED', 'NEW_ROWS'])
+        # The costly refit is skipped, cheaper ones still fit
+        self.assertEqual(self.planned(50), ['DRIFTED', 'NEW_ROWS'])
+
+        report = self.policy(50).run(dry_run=True)
+        self.assertEqual((report['candidates'], report['retrained']), (2, 0))
+
+
+class ColumnModel:
+    """Predicts one feature column plus a constant"""
+    def __init__(self, column, offset=0):
+        self.column = column
+        self.offset = offset
+
+    def predict(self, X):
+        return X[:, self.column] + self.offset
+
+
+class RecursiveForecastTests(SimpleTestCase):
+    COLUMNS = ['lag_1', 'lag_7', 'rolling_7_mean', 'day_of_week']
+
+    def setUp(self):
+        self.engine = RecursiveForecaster(self.COLUMNS)
+        self.history = np.arange(1, 31, dtype=float)[np.newaxis]
+        self.base_features = np.zeros((1, 5, len(self.COLUMNS)))
+
+    def test_predictions_feed_the_next_days(self):
+        lag_1 = self.engine.forecast(ColumnModel(0, offset=1), self.base_features, self.history)
+        self.assertEqual(lag_1.tolist(), [[31, 32, 33, 34, 35]])
+
+        lag_7 = self.engine.forecast(ColumnModel(1), self.base_features, self.history)
+        self.assertEqual(lag_7.tolist(), [[24, 25, 26, 27, 28]])
+
+        # Means of the seven days before each one, predictions included
+        rolling = self.engine.forecast(ColumnModel(2), self.base_features, self.history)
+        known = list(range(24, 31))
+        for step in range(5):
+            self.assertAlmostEqual(rolling[0, step], np.mean(known[-7:]))
+            known.append(rolling[0, step])
+
+    def test_intervals_grow_with_the_horizon(self):
+        model = ColumnModel(0)
+        predictions, lower, upper = self.engine.forecast(model, self.base_features, self.history, interval=0.8)
+        self.assertIsNone(lower)
+        self.assertIsNone(upper)
+
+        residuals = RecursiveForecaster.residual_matrix([[0.0]])
+        predictions, lower, upper = self.engine.forecast(
+            model, self.base_features, self.history, interval=0.8, residuals=residuals
+        )
+        np.testing.assert_array_equal(lower, predictions)
+        np.testing.assert_array_equal(upper, predictions)
+
+        residuals = RecursiveForecaster.residual_matrix([[-2.0, -1.0, 1.0, 2.0]])
+        predictions, lower, upper = self.engine.forecast(
+            model, self.base_features, self.history, interval=0.8, residuals=residuals, paths=200
+        )
+        self.assertTrue((lower <= predictions).all() and (predictions <= upper).all())
+        width = (upper - lower)[0]
+        self.assertGreater(width[-1], width[0])
+
+
+class BatchForecastTests(TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1')
+        self.weekly = create_product('WEEKLY')
+        self.flat = create_product('FLAT')
+        Product.objects.filter(pk=self.flat.pk).update(category='Bulk')
+        create_sales(self.weekly, self.warehouse, [5 + day % 7 for day in range(60)])
+        create_sales(self.flat, self.warehouse, [20] * 60)
+
+    def test_features_stay_within_each_series(self):
+        forecaster = BatchDemandForecaster(lookback_days=90, n_jobs=1)
+        features = forecaster.build_features(forecaster.load_history())
+        weekly = features[features['product_id'] == self.weekly.id]
+        flat = features[features['product_id'] == self.flat.id]
+
+        self.assertEqual(weekly['lag_1'].iloc[1:].tolist(), weekly['quantity_sold'].iloc[:-1].tolist())
+        self.assertEqual(weekly['lag_7'].iloc[7:].tolist(), weekly['quantity_sold'].iloc[7:].tolist())
+        # Nothing carries over from the previous series
+        self.assertEqual((flat['lag_1'].iloc[0], flat['rolling_7_mean'].iloc[0]), (0, 0))
+        self.assertEqual(set(flat['rolling_7_mean'].iloc[7:]), {20})
+        self.assertEqual(weekly['rolling_7_mean'].iloc[10], np.mean(weekly['quantity_sold'].iloc[3:10]))
+
+    def test_run_saves_one_forecast_per_series(self):
+        forecaster = BatchDemandForecaster(lookback_days=90, pool_by='category', n_jobs=1)
+        self.assertEqual(forecaster.run(periods=7), 2)
+
+        self.assertEqual(set(forecaster.models), {'General', 'Bulk'})
+        for product in (self.weekly, self.flat):
+            forecast = DemandForecast.objects.get(product=product, warehouse=self.warehouse)
+            self.assertEqual(forecast.algorithm_used, 'random_forest_pooled')
+            self.assertEqual((forecast.forecast_start, len(forecast.forecast_values)), (date.today(), 7))
+            for day, value in forecast.forecast_values.items():
+                interval = forecast.confidence_interval
+                self.assertLessEqual(interval['lower'][day], value)
+                self.assertLessEqual(value, interval['upper'][day])
+        flat = DemandForecast.objects.get(product=self.flat)
+        self.assertEqual(set(flat.forecast_values.values()), {20.0})
+
+
+class TieredForecastTests(TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1')
+        self.products = {name: create_product(name) for name in ('INTERMITTENT', 'STEADY', 'BUSY', 'NEW')}
+        create_sales(self.products['INTERMITTENT'], self.warehouse, [3 if day % 4 == 0 else 0 for day in range(60)])
+        create_sales(self.products['STEADY'], self.warehouse, [1 + day % 2 for day in range(60)])
+        create_sales(self.products['BUSY'], self.warehouse, [20] * 60)
+        create_sales(self.products['NEW'], self.warehouse, [2] * 5)
+        self.forecaster = TieredForecaster(lookback_days=60, max_daily_demand=5)
+
+    def key(self, name):
+        return (self.products[name].id, self.warehouse.id)
+
+    def test_tier_selection(self):
+        series, demand, starts, _ = self.forecaster.load_demand()
+        tiers = dict(zip(series, classify_series(demand, starts, max_daily_demand=5)))
+        self.assertEqual(
+            {name: tiers[self.key(name)] for name in self.products},
+            {'INTERMITTENT': CROSTON, 'STEADY': SMOOTHING, 'BUSY': HEAVY, 'NEW': SEASONAL_NAIVE}
+        )
+
+    def test_run_saves_the_tail_and_overwrites_today(self):
+        today = date.today()
+        DemandForecast.objects.create(
+            product=self.products['STEADY'], warehouse=self.warehouse, forecast_date=today, period='daily',
+            forecast_start=today, forecast_end=today, forecast_values={str(today): 9.0},
+            confidence_interval={'level': 0.8, 'lower': {str(today): 1.0}, 'upper': {str(today): 20.0}},
+            algorithm_used='prophet', accuracy_metrics={'mae': 4.0}
+        )
+
+        head = self.forecaster.run(periods=7)
+
+        self.assertEqual(head, [self.key('BUSY')])
+        self.assertFalse(DemandForecast.objects.filter(product=self.products['BUSY']).exists())
+        forecast = DemandForecast.objects.get(product=self.products['STEADY'])
+        self.assertEqual(forecast.algorithm_used, SMOOTHING)
+        self.assertEqual((forecast.forecast_start, len(forecast.forecast_values)), (today, 7))
+        self.assertIsNone(forecast.confidence_interval)
+        self.assertIsNone(forecast.accuracy_metrics)
+        croston = DemandForecast.objects.get(product=self.products['INTERMITTENT'])
+        self.assertEqual(len(set(croston.forecast_values.values())), 1)
+        # The last week repeated: five selling days of 2
+        self.assertEqual(sum(DemandForecast.objects.get(product=self.products['NEW']).forecast_values.values()), 10)
+
+
+@override_settings(MODEL_ROOT=tempfile.mkdtemp())
+class ForecastBenchmarkTests(TestCase):
+    def test_synthetic_history_holds_out_the_horizon(self):
+        actuals = generate_synthetic_sales(num_series=3, history_days=60, horizon=7, intermittency=0.5)
+
+        self.assertEqual(len(actuals), 3)
+        yesterday = date.today() - timedelta(days=1)
+        for (product_id, warehouse_id), days in actuals.items():
+            self.assertEqual(sorted(days), [str(yesterday + timedelta(days=day)) for day in range(1, 8)])
+            sales = SalesHistory.objects.filter(product_id=product_id, warehouse_id=warehouse_id)
+            self.assertEqual(sales.count(), 60)
+            self.assertEqual(max(sales.values_list('date', flat=True)), yesterday)
+        zero_days = SalesHistory.objects.filter(quantity_sold=0).count()
+        self.assertTrue(40 < zero_days < 140, zero_days)
+
+    def test_errors_and_report_comparison(self):
+        errors, percentages = forecast_errors({'2024-01-01': 4, '2024-01-02': 1, '2024-01-03': 9}, {
+            '2024-01-01': 2, '2024-01-02': 0
+        })
+        self.assertEqual((errors.tolist(), percentages.tolist()), ([2.0, 1.0], [1.0]))
+
+        actuals = generate_synthetic_sales(num_series=2, history_days=60, horizon=7)
+        report = ForecastBenchmark(methods=['tiered', 'gradient_boost'], horizon=7, n_jobs=1).run(
+            actuals, config={'series': 2}
+        )
+        self.assertEqual(list(report['methods']), ['tiered', 'gradient_boost'])
+        for metrics in report['methods'].values():
+            self.assertEqual((metrics['series'], metrics['failed']), (2, 0))
+            self.assertIsNotNone(metrics['mae'])
+        self.assertEqual(report['methods']['tiered']['fit_seconds'], 0)
+        self.assertEqual(report['config']['series'], 2)
+
+        baseline = json.loads(json.dumps(report))
+        baseline['methods']['gradient_boost']['mae'] *= 2
+        del baseline['methods']['tiered']
+        comparison = compare_reports(report, baseline)
+        self.assertEqual(list(comparison), ['gradient_boost'])
+        self.assertEqual((comparison['gradient_boost']['wall_seconds'], comparison['gradient_boost']['mae']), (1.0, 0.5))
+
+
+class ImportSalesCommandTests(TestCase):
+    def setUp(self):
+        self.product = create_product('SKU-1')
+        self.warehouse = create_warehouse('WH-1')
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.json')
+
+    def write(self, file_format):
+        frame = pd.DataFrame({
+            'sku': ['SKU-1'] * 4 + ['SKU-X'] + ['SKU-1'] * 5,
+            'warehouse_code': ['WH-1'] * 10,
+            'date': [f'2024-01-{day:02d}' for day in range(1, 11)],
+            'quantity_sold': list(range(1, 11)),
+        })
+        path = os.path.join(self.directory, f'sales.{file_format}')
+        if file_format == 'csv':
+            frame.to_csv(path, index=False)
+        else:
+            frame.to_parquet(path, index=False, row_group_size=4)
+        return path
+
+    def import_sales(self, path, *args):
+        output = io.StringIO()
+        call_command(
+            'import_sales', path, '--chunk-size', '3', '--checkpoint', self.checkpoint, *args,
+            stdout=output, stderr=output
+        )
+        return output.getvalue()
+
+    def imported_days(self):
+        return sorted(SalesHistory.objects.values_list('date__day', flat=True))
+
+    def checkpoint_rows(self):
+        with open(self.checkpoint) as f:
+            return json.load(f)['rows']
+
+    def assertResumes(self, file_format):
+        path = self.write(file_format)
+        # A run that stopped after its second chunk of three rows
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'path': path, 'rows': 6}, f)
+
+        output = self.import_sales(path, '--resume')
+
+        self.assertIn('Resuming after row 6', output)
+        self.assertEqual(self.imported_days(), [7, 8, 9, 10])
+        self.assertEqual(SalesHistory.objects.get(date__day=7).quantity_sold, 7)
+        self.assertEqual(self.checkpoint_rows(), 10)
+
+        # A finished import resumes to nothing
+        output = self.import_sales(path, '--resume')
+        self.assertIn('Imported 0 rows', output)
+        self.assertEqual(SalesHistory.objects.count(), 4)
+
+    def test_csv_resumes_from_checkpoint(self):
+        self.assertResumes('csv')
+
+    def test_parquet_resumes_from_checkpoint(self):
+        self.assertResumes('parquet')
+
+    def test_full_import_reports_unknown_codes(self):
+        path = self.write('csv')
+        output = self.import_sales(path)
+        self.assertEqual(self.imported_days(), [1, 2, 3, 4, 6, 7, 8, 9, 10])
+        self.assertIn('Row 4:', output)
+        self.assertIn('unknown SKU SKU-X', output)
+        self.assertEqual(self.checkpoint_rows(), 10)
+
+        with self.assertRaises(CommandError):
+            self.import_sales(self.write('parquet'), '--resume')
+
+
+class SalesBulkAPITests(TestCase):
+    def setUp(self):
+        self.product = create_product('SKU-1')
+        self.warehouse = create_warehouse('WH-1')
+
+    def test_broken_csv_reports_rows_stored_before_the_break(self):
+        lines = [b'product_id,warehouse_id,date,quantity_sold']
+        lines += [f'{self.product.id},{self.warehouse.id},2024-01-0{day},5'.encode() for day in range(1, 4)]
+        lines += [b'\xff\xfe,broken', f'{self.product.id},{self.warehouse.id},2024-01-09,5'.encode()]
+
+        request = RequestFactory().post('/api/sales/bulk/', b'\n'.join(lines), content_type='text/csv')
+        response = SalesBulkAPIView.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+        body = json.loads(response.content)
+        self.assertEqual((body['status'], body['received'], body['upserted']), ('error', 3, 3))
+        self.assertIn('utf-8', body['error'])
+        self.assertEqual(SalesHistory.objects.count(), 3)
@@ -6,5 +6,6 @@ urlpatterns = [
     path('product/<int:product_id>/warehouse/<int:warehouse_id>/forecast/', 
          views.ProductForecastView.as_view(), name='product_forecast'),
     path('api/sales/', views.SalesDataAPIView.as_view(), name='sales_data_api'),
+    path('api/sales/bulk/', views.SalesBulkAPIView.as_view(), name='sales_bulk_api'),
     path('optimize/', views.InventoryOptimizationView.as_view(), name='inventory_optimization'),
 ]
\ No newline at end of file
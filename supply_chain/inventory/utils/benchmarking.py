@@ -0,0 +1,179 @@
+import logging
+import os
+import platform
+import resource
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from ..models import Product, Warehouse, Inventory, SalesHistory, DemandForecast
+from .forecasting import DemandForecaster
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHODS = ['random_forest', 'gradient_boost', 'prophet']
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def generate_synthetic_sales(num_series=20, history_days=730, horizon=30, seasonality=0.3,
+                             intermittency=0.0, seed=42, batch_size=5000):
+    """
+    Create one warehouse and num_series products with daily sales ending yesterday.
+    seasonality scales the weekly and yearly pattern, intermittency is the
+    share of days without sales. Returns {(product_id, warehouse_id): {date: actual}}
+    for the horizon days that follow, which are never written.
+    """
+    rng = np.random.default_rng(seed)
+    end_date = datetime.now().date() - timedelta(days=1)
+    start_date = end_date - timedelta(days=history_days - 1)
+    num_days = history_days + horizon
+
+    warehouse, _ = Warehouse.objects.get_or_create(
+        code='BENCH-WH',
+        defaults={
+            'name': 'Benchmark Warehouse',
+            'type': 'regional',
+            'address': 'Synthetic',
+            'latitude': 40.0,
+            'longitude': -100.0,
+            'capacity': 100000
+        }
+    )
+
+    products = Product.objects.bulk_create([
+        Product(
+            SKU=f"BENCH-{seed}-{i:05d}",
+            name=f"Benchmark Product {i}",
+            category=['Electronics', 'Clothing', 'Home', 'Grocery'][i % 4],
+            unit_cost=10,
+            selling_price=20,
+            weight=1,
+            dimensions='10x10x10'
+        )
+        for i in range(num_series)
+    ])
+    Inventory.objects.bulk_create([
+        Inventory(product=product, warehouse=warehouse, quantity_on_hand=100)
+        for product in products
+    ])
+
+    # Demand rate per series and day: level x weekly x yearly pattern
+    days = np.arange(num_days)
+    dates = [start_date + timedelta(days=int(day)) for day in days]
+    weekday = np.array([date.weekday() for date in dates])
+    levels = rng.lognormal(mean=1.5, sigma=1.0, size=(num_series, 1))
+    weekly = 1 + seasonality * np.where(weekday >= 5, 0.5, -0.2)
+    yearly = 1 + seasonality * np.sin(2 * np.pi * days / 365.25)
+    demand = rng.poisson(levels * weekly * yearly)
+    demand[rng.random(demand.shape) < intermittency] = 0
+
+    sales = []
+    actuals = {}
+    for product, series in zip(products, demand):
+        key = (product.id, warehouse.id)
+        actuals[key] = {str(dates[day]): int(series[day]) for day in range(history_days, num_days)}
+        for day in range(history_days):
+            sales.append(SalesHistory(
+                product=product,
+                warehouse=warehouse,
+                date=dates[day],
+                quantity_sold=int(series[day]),
+                revenue=int(series[day]) * 20
+            ))
+    SalesHistory.objects.bulk_create(sales, batch_size=batch_size)
+
+    return actuals
+
+def forecast_errors(forecast_values, actuals):
+    """Absolute errors and percentage errors on the dates both cover"""
+    common = [date for date in forecast_values if date in actuals]
+    predicted = np.array([float(forecast_values[date]) for date in common])
+    actual = np.array([actuals[date] for date in common], dtype=float)
+    errors = np.abs(predicted - actual)
+    nonzero = actual > 0
+    return errors, errors[nonzero] / actual[nonzero]
+
+class ForecastBenchmark:
+    """Run forecasting methods end to end through DemandForecaster and time them"""
+    def __init__(self, methods=None, horizon=30, n_jobs=-1, cross_validate=False):
+        self.methods = methods or DEFAULT_METHODS
+        self.horizon = horizon
+        self.n_jobs = n_jobs
+        self.cross_validate = cross_validate
+
+    def run_method(self, method, actuals):
+        """Fit then forecast every series with one method"""
+        fit_seconds = 0.0
+        predict_seconds = 0.0
+        absolute_errors = []
+        percentage_errors = []
+        failed = 0
+
+        started = time.monotonic()
+        for product_id, warehouse_id in actuals:
+            forecaster = DemandForecaster(product_id, warehouse_id, n_jobs=self.n_jobs)
+            try:
+                # Statistical tiers have nothing to fit ahead of the forecast
+                if method != 'tiered':
+                    fit_started = time.monotonic()
+                    forecaster.train_model(method, cross_validate=self.cross_validate)
+                    fit_seconds += time.monotonic() - fit_started
+
+                predict_started = time.monotonic()
+                forecast = forecaster.generate_forecast(method=method, periods=self.horizon)
+                predict_seconds += time.monotonic() - predict_started
+            except Exception as e:
+                failed += 1
+                logger.error(f"Benchmark {method} failed for product {product_id}: {str(e)}")
+                continue
+
+            errors, percentages = forecast_errors(forecast.forecast_values, actuals[(product_id, warehouse_id)])
+            absolute_errors.append(errors)
+            percentage_errors.append(percentages)
+
+        absolute_errors = np.concatenate(absolute_errors) if absolute_errors else np.array([])
+        percentage_errors = np.concatenate(percentage_errors) if percentage_errors else np.array([])
+        return {
+            'series': len(actuals),
+            'failed': failed,
+            'wall_seconds': round(time.monotonic() - started, 3),
+            'fit_seconds': round(fit_seconds, 3),
+            'predict_seconds': round(predict_seconds, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'mae': round(float(absolute_errors.mean()), 4) if len(absolute_errors) else None,
+            'mape': round(float(percentage_errors.mean()), 4) if len(percentage_errors) else None,
+        }
+
+    def run(self, actuals, config=None):
+        """Machine-readable report for every method"""
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'config': dict(config or {}, horizon=self.horizon, methods=self.methods, n_jobs=self.n_jobs),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'methods': {},
+        }
+        for method in self.methods:
+            # Forecasts from an earlier method would otherwise be updated in place
+            DemandForecast.objects.filter(product_id__in=[key[0] for key in actuals]).delete()
+            report['methods'][method] = self.run_method(method, actuals)
+            logger.info(f"Benchmarked {method}: {report['methods'][method]}")
+        return report
+
+def compare_reports(current, baseline):
+    """Per-method ratios current/baseline for the timing and error metrics"""
+    comparison = {}
+    for method, metrics in current['methods'].items():
+        previous = baseline.get('methods', {}).get(method)
+        if not previous:
+            continue
+        comparison[method] = {
+            metric: round(metrics[metric] / previous[metric], 3)
+            for metric in ('wall_seconds', 'fit_seconds', 'predict_seconds', 'peak_rss_mb', 'mae', 'mape')
+            if metrics.get(metric) is not None and previous.get(metric)
+        }
+    return comparison
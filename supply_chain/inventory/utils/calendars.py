@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from functools import lru_cache
+import holidays
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from ..models import Warehouse
+
+logger = logging.getLogger(__name__)
+
+# warehouse id -> (country_code, region_code), shared by every forecaster in the process
+_regions = {}
+_regions_loaded_at = 0.0
+_regions_lock = threading.Lock()
+
+def default_country_code():
+    return getattr(settings, 'HOLIDAY_COUNTRY_CODE', 'US')
+
+def clear_warehouse_regions():
+    """Forget cached warehouse calendars (a warehouse's country or region changed)"""
+    global _regions_loaded_at
+    with _regions_lock:
+        _regions.clear()
+        _regions_loaded_at = 0.0
+
+def warehouse_regions(warehouse_ids):
+    """
+    {warehouse_id: (country_code, region_code)} for the given ids. Looked up
+    once per process, and again after HOLIDAY_REGION_CACHE_SECONDS so edits
+    made by other processes are picked up; unknown ids get the default calendar.
+    """
+    global _regions_loaded_at
+    ttl = getattr(settings, 'HOLIDAY_REGION_CACHE_SECONDS', 300)
+    with _regions_lock:
+        if time.monotonic() - _regions_loaded_at > ttl:
+            _regions.clear()
+            _regions_loaded_at = time.monotonic()
+        missing = [int(warehouse_id) for warehouse_id in warehouse_ids if int(warehouse_id) not in _regions]
+        if missing:
+            found = {
+                warehouse_id: (country_code, region_code or '')
+                for warehouse_id, country_code, region_code in Warehouse.objects.filter(
+                    id__in=missing
+                ).values_list('id', 'country_code', 'region_code')
+            }
+            for warehouse_id in missing:
+                _regions[warehouse_id] = found.get(warehouse_id, (default_country_code(), ''))
+        return {warehouse_id: _regions[int(warehouse_id)] for warehouse_id in warehouse_ids}
+
+@lru_cache(maxsize=None)
+def _year_holidays(country_code, region_code, year):
+    try:
+        calendar = holidays.country_holidays(country_code, subdiv=region_code or None, years=year)
+    except NotImplementedError:
+        logger.warning(f"No holiday calendar for {country_code}/{region_code or '-'}; treating {year} as holiday-free")
+        return np.array([], dtype='datetime64[D]')
+    return np.array(sorted(calendar.keys()), dtype='datetime64[D]')
+
+@lru_cache(maxsize=256)
+def holiday_calendar(country_code, region_code, first_year, last_year):
+    """Sorted datetime64[D] array of holidays over [first_year, last_year], built once per process"""
+    return np.concatenate([
+        _year_holidays(country_code, region_code, year)
+        for year in range(first_year, last_year + 1)
+    ])
+
+def holiday_flags(dates, country_code=None, region_code=None):
+    """0/1 array marking which dates are holidays"""
+    days = pd.DatetimeIndex(dates).values.astype('datetime64[D]')
+    if len(days) == 0:
+        return np.zeros(0, dtype=int)
+    
+    years = days.astype('datetime64[Y]').astype(int) + 1970
+    calendar = holiday_calendar(
+        country_code or default_country_code(), region_code or '',
+        int(years.min()), int(years.max())
+    )
+    return np.isin(days, calendar).astype(int)
+
+def warehouse_holiday_flags(dates, warehouse_ids):
+    """Holiday flags using each row's warehouse calendar; warehouse_ids may be a single id or one per date"""
+    warehouse_ids = np.broadcast_to(np.asarray(warehouse_ids), (len(dates),))
+    regions = warehouse_regions(np.unique(warehouse_ids).tolist())
+    
+    by_region = {}
+    for warehouse_id, region in regions.items():
+        by_region.setdefault(region, []).append(warehouse_id)
+    
+    # One vectorized lookup per distinct calendar
+    dates = pd.DatetimeIndex(dates)
+    flags = np.zeros(len(dates), dtype=int)
+    for (country_code, region_code), region_warehouses in by_region.items():
+        mask = np.isin(warehouse_ids, region_warehouses)
+        flags[mask] = holiday_flags(dates[mask], country_code, region_code)
+    return flags
@@ -0,0 +1,231 @@
+import logging
+import time
+import warnings
+from datetime import datetime, timedelta
+import numpy as np
+from django.conf import settings
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from ..models import SalesHistory, DemandForecast
+
+logger = logging.getLogger(__name__)
+
+# Syntetos-Boylan cut-off on the average demand interval
+INTERMITTENT_ADI = 1.32
+SEASON_LENGTH = 7
+# Days of history the fast path looks at, up to yesterday (the last complete day)
+LOOKBACK_DAYS = 365
+
+HEAVY = 'heavy'
+CROSTON = 'croston_sba'
+SMOOTHING = 'exponential_smoothing'
+SEASONAL_NAIVE = 'seasonal_naive'
+
+def croston_sba(demand, starts, alpha=0.1):
+    """
+    Syntetos-Boylan corrected Croston rate for each row of a (n_series, days) demand matrix.
+    starts holds the column where each series begins; earlier columns are ignored.
+    """
+    demand = np.asarray(demand, dtype=float)
+    num_series, num_days = demand.shape
+    observed = np.arange(num_days)[np.newaxis, :] >= starts[:, np.newaxis]
+    demand = np.where(observed, demand, 0.0)
+    nonzero = demand > 0
+    demand_days = nonzero.sum(axis=1)
+
+    # Start from the series averages rather than the first observation
+    with np.errstate(divide='ignore', invalid='ignore'):
+        size = np.where(demand_days > 0, demand.sum(axis=1) / demand_days, 0.0)
+        interval = np.where(demand_days > 0, (num_days - starts) / demand_days, 1.0)
+    since_demand = np.ones(num_series)
+
+    for day in range(num_days):
+        hit = nonzero[:, day]
+        size = np.where(hit, size + alpha * (demand[:, day] - size), size)
+        interval = np.where(hit, interval + alpha * (since_demand - interval), interval)
+        since_demand = np.where(hit, 1.0, since_demand + observed[:, day])
+
+    return (1 - alpha / 2) * size / np.maximum(interval, 1.0)
+
+def seasonal_naive(demand, periods, season=SEASON_LENGTH):
+    """Repeat the last season of each row over the horizon"""
+    demand = np.asarray(demand, dtype=float)
+    last_season = demand[:, -season:]
+    repeats = -(-periods // season)
+    return np.tile(last_season, repeats)[:, :periods]
+
+def exponential_smoothing(values, periods, season=SEASON_LENGTH):
+    """Holt-Winters with additive weekly seasonality; seasonal naive when it can't be fitted"""
+    if len(values) < 2 * season:
+        return seasonal_naive(values[np.newaxis], periods, season)[0]
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            fit = ExponentialSmoothing(
+                values, trend=None, seasonal='add', seasonal_periods=season,
+                initialization_method='estimated'
+            ).fit()
+        return np.asarray(fit.forecast(periods))
+    except Exception:
+        return seasonal_naive(values[np.newaxis], periods, season)[0]
+
+def demand_window(lookback_days=LOOKBACK_DAYS):
+    """(first, last) day of the history the fast path reads; forecasts start the day after"""
+    end_date = datetime.now().date() - timedelta(days=1)
+    return end_date - timedelta(days=lookback_days), end_date
+
+def series_demand(dates, quantities, start_date, end_date):
+    """(1, days) demand row and (1,) start column of one series, laid out like TieredForecaster.load_demand"""
+    num_days = (end_date - start_date).days + 1
+    demand = np.zeros((1, num_days))
+    starts = np.full(1, num_days, dtype=int)
+    for sale_date, quantity in zip(dates, quantities):
+        day = (sale_date - start_date).days
+        if 0 <= day < num_days:
+            demand[0, day] += quantity
+            starts[0] = min(starts[0], day)
+    return demand, starts
+
+def classify_series(demand, starts, max_daily_demand=None, intermittent_adi=INTERMITTENT_ADI):
+    """
+    Tier per series:
+    - seasonal naive below two seasons of history (or with none in the window)
+    - Croston for intermittent demand (average demand interval >= intermittent_adi)
+    - heavy models for regular series selling max_daily_demand a day or more
+    - exponential smoothing for the remaining regular, low-volume series
+    A regular series sells on most days, so it averages at least about
+    1 / intermittent_adi units a day; max_daily_demand has to sit well above
+    that for the smoothing tier to cover anything.
+    """
+    if max_daily_demand is None:
+        max_daily_demand = getattr(settings, 'FORECAST_FAST_PATH_MAX_DAILY_DEMAND', 5.0)
+    demand = np.asarray(demand, dtype=float)
+    num_days = demand.shape[1]
+    observed_days = np.maximum(num_days - starts, 1)
+    observed = np.arange(num_days)[np.newaxis, :] >= starts[:, np.newaxis]
+    demand = np.where(observed, demand, 0.0)
+
+    mean_daily = demand.sum(axis=1) / observed_days
+    demand_days = (demand > 0).sum(axis=1)
+    adi = observed_days / np.maximum(demand_days, 1)
+
+    tiers = np.full(len(demand), SMOOTHING, dtype=object)
+    tiers[mean_daily >= max_daily_demand] = HEAVY
+    tiers[adi >= intermittent_adi] = CROSTON
+    tiers[observed_days < 2 * SEASON_LENGTH] = SEASONAL_NAIVE
+    return tiers
+
+def fast_forecast(demand, starts, tiers, periods=30):
+    """(n_series, periods) forecasts for the non-heavy tiers; heavy rows are left at zero"""
+    demand = np.asarray(demand, dtype=float)
+    predictions = np.zeros((len(demand), periods))
+
+    intermittent = np.flatnonzero(tiers == CROSTON)
+    if len(intermittent):
+        rates = croston_sba(demand[intermittent], starts[intermittent])
+        predictions[intermittent] = rates[:, np.newaxis]
+
+    naive = np.flatnonzero(tiers == SEASONAL_NAIVE)
+    if len(naive):
+        predictions[naive] = seasonal_naive(demand[naive], periods)
+
+    for row in np.flatnonzero(tiers == SMOOTHING):
+        predictions[row] = exponential_smoothing(demand[row, starts[row]:], periods)
+
+    return np.maximum(predictions, 0)
+
+class TieredForecaster:
+    """
+    Forecast the long tail of low-volume and intermittent series with cheap
+    statistical methods in one batch, and hand the high-volume head back to
+    the heavy per-series models.
+    """
+    def __init__(self, lookback_days=LOOKBACK_DAYS, max_daily_demand=None, chunk_size=20000):
+        self.lookback_days = lookback_days
+        self.max_daily_demand = max_daily_demand
+        self.chunk_size = chunk_size
+
+    def load_demand(self, series=None):
+        """
+        Dense (n_series, days) daily demand matrix; days without a sales row
+        count as zero. Series passed in get a row even without sales in the window.
+        """
+        start_date, end_date = demand_window(self.lookback_days)
+        num_days = self.lookback_days + 1
+
+        rows = SalesHistory.objects.filter(
+            date__gte=start_date,
+            date__lte=end_date
+        ).order_by('product_id', 'warehouse_id').values_list(
+            'product_id', 'warehouse_id', 'date', 'quantity_sold'
+        ).iterator(chunk_size=self.chunk_size)
+
+        series_index = {pair: row for row, pair in enumerate(dict.fromkeys(series or []))}
+        cells = []
+        for product_id, warehouse_id, sale_date, quantity in rows:
+            row = series_index.setdefault((product_id, warehouse_id), len(series_index))
+            cells.append((row, (sale_date - start_date).days, quantity))
+
+        demand = np.zeros((len(series_index), num_days), dtype=np.float32)
+        starts = np.full(len(series_index), num_days, dtype=int)
+        if cells:
+            cells = np.array(cells)
+            demand[cells[:, 0], cells[:, 1]] = cells[:, 2]
+            np.minimum.at(starts, cells[:, 0], cells[:, 1])
+
+        return list(series_index), demand, starts, end_date
+
+    def save_forecasts(self, series, tiers, predictions, end_date, batch_size=1000):
+        """Upsert one DemandForecast per fast-path series"""
+        forecast_date = datetime.now().date()
+        dates = [str(end_date + timedelta(days=day + 1)) for day in range(predictions.shape[1])]
+        forecasts = [
+            DemandForecast(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                forecast_date=forecast_date,
+                period='daily',
+                forecast_start=dates[0],
+                forecast_end=dates[-1],
+                forecast_values=dict(zip(dates, np.round(values, 2).tolist())),
+                # No interval from the cheap tiers; planning falls back to the variance of recent sales
+                confidence_interval=None,
+                algorithm_used=tier,
+                accuracy_metrics=None
+            )
+            for (product_id, warehouse_id), tier, values in zip(series, tiers, predictions)
+            if tier != HEAVY
+        ]
+
+        DemandForecast.objects.bulk_create(
+            forecasts,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['product', 'warehouse', 'forecast_date', 'period'],
+            update_fields=[
+                'forecast_start', 'forecast_end', 'forecast_values', 'confidence_interval',
+                'algorithm_used', 'accuracy_metrics'
+            ]
+        )
+        return len(forecasts)
+
+    def run(self, periods=30, series=None):
+        """
+        Forecast and save the long tail; returns the head series left for the
+        heavy models. series (product_id, warehouse_id) pairs without recent
+        sales are forecast too, rather than falling between both paths.
+        """
+        started = time.monotonic()
+        series, demand, starts, end_date = self.load_demand(series)
+        if not series:
+            return []
+
+        tiers = classify_series(demand, starts, self.max_daily_demand)
+        predictions = fast_forecast(demand, starts, tiers, periods)
+        saved = self.save_forecasts(series, tiers, predictions, end_date)
+
+        head = [pair for pair, tier in zip(series, tiers) if tier == HEAVY]
+        logger.info(
+            f"Fast-path forecasts for {saved} series in {time.monotonic() - started:.1f}s "
+            f"({int((tiers == CROSTON).sum())} intermittent); {len(head)} series left for heavy models"
+        )
+        return head
@@ -0,0 +1,98 @@
+import glob
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from django.conf import settings
+
+try:
+    import pyarrow  # noqa: F401
+    DISK_FORMAT = 'parquet'
+except ImportError:
+    DISK_FORMAT = 'pickle'
+
+logger = logging.getLogger(__name__)
+
+class FeatureFrameCache:
+    """
+    Prepared feature frames cached per process in an LRU, backed by files
+    under MODEL_ROOT/features that every worker can reuse.
+    Keys are (product_id, warehouse_id, lookback_days, start_date, last_sales_date, row_count),
+    so a frame is only reused while its window and sales data are unchanged.
+    """
+    def __init__(self, max_entries=None, cache_dir=None):
+        self.max_entries = max_entries or getattr(settings, 'FEATURE_CACHE_SIZE', 256)
+        self.cache_dir = cache_dir or os.path.join(settings.MODEL_ROOT, 'features')
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _series_prefix(self, key):
+        product_id, warehouse_id, lookback_days = key[:3]
+        return os.path.join(self.cache_dir, f"features_{product_id}_{warehouse_id}_{lookback_days}_")
+    
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        extension = 'parquet' if DISK_FORMAT == 'parquet' else 'pkl'
+        return f"{self._series_prefix(key)}{digest}.{extension}"
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key].copy()
+        
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_parquet(path) if DISK_FORMAT == 'parquet' else pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable feature cache file {path}: {str(e)}")
+            return None
+        
+        self._remember(key, df)
+        return df.copy()
+    
+    def set(self, key, df):
+        self._remember(key, df.copy())
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        
+        # Older versions of this series' frame are now stale
+        for stale_path in glob.glob(f"{self._series_prefix(key)}*"):
+            if stale_path != path:
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+        
+        # Write then rename so readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        if DISK_FORMAT == 'parquet':
+            df.to_parquet(temp_path)
+        else:
+            df.to_pickle(temp_path)
+        os.replace(temp_path, path)
+    
+    def _remember(self, key, df):
+        with self._lock:
+            self._frames[key] = df
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+_feature_cache = None
+
+def get_feature_cache():
+    """Per-process feature frame cache"""
+    global _feature_cache
+    if _feature_cache is None:
+        _feature_cache = FeatureFrameCache()
+    return _feature_cache
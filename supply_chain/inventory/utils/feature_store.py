@@ -0,0 +1,193 @@
+import logging
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Max, Count
+from ..models import SalesHistory, SalesFeature, SeriesFeatureState
+
+logger = logging.getLogger(__name__)
+
+# Lag and rolling-mean windows (in rows) used as features by every model
+LAGS = [1, 7, 14, 30]
+ROLLING_WINDOWS = [7, 30]
+
+FEATURE_COLUMNS = [f'lag_{lag}' for lag in LAGS] + [f'rolling_{window}_mean' for window in ROLLING_WINDOWS]
+
+# Bumped whenever stored features change meaning, so cached feature frames are not reused
+FEATURE_VERSION = 2
+
+# Quantities kept per series: enough to extend every lag and rolling window by one row
+TAIL_LENGTH = max(LAGS + ROLLING_WINDOWS)
+
+class FeatureStore:
+    """
+    Persisted lag/rolling features for SalesHistory rows.
+    Appending the next day of a series (or correcting its latest day) is O(1)
+    from the stored tail; anything else marks the series stale and it is
+    rebuilt the next time its features are read.
+    """
+    @staticmethod
+    def record_sale(sale, created):
+        """Extend the stored features of sale's series, or mark it stale"""
+        sale_date = SalesHistory._meta.get_field('date').to_python(sale.date)
+        quantity = float(sale.quantity_sold)
+        
+        with transaction.atomic():
+            state, state_created = SeriesFeatureState.objects.select_for_update().get_or_create(
+                product_id=sale.product_id,
+                warehouse_id=sale.warehouse_id
+            )
+            if state.is_stale:
+                # New states start stale; only a series' very first row can be indexed directly
+                first_row = state_created and not SalesHistory.objects.filter(
+                    product_id=sale.product_id,
+                    warehouse_id=sale.warehouse_id
+                ).exclude(pk=sale.pk).exists()
+                if not first_row:
+                    return
+            
+            tail = state.tail
+            sums = state.rolling_sums
+            
+            if created and (state.last_date is None or sale_date > state.last_date):
+                values = {f'lag_{lag}': tail[-lag] if len(tail) >= lag else None for lag in LAGS}
+                for window in ROLLING_WINDOWS:
+                    # The mean covers the days before this one; then the window moves on
+                    values[f'rolling_{window}_mean'] = (
+                        sums.get(str(window), 0.0) / window if state.row_count >= window else None
+                    )
+                    leaving = tail[-window] if len(tail) >= window else 0.0
+                    sums[str(window)] = sums.get(str(window), 0.0) + quantity - leaving
+                tail.append(quantity)
+                state.row_count += 1
+                state.last_date = sale_date
+            elif not created and sale_date == state.last_date and tail and (
+                previous := SalesFeature.objects.filter(sales_id=sale.pk).values(*FEATURE_COLUMNS).first()
+            ):
+                # Correction of the latest day leaves its own features alone and only moves the rolling sums
+                delta = quantity - tail[-1]
+                tail[-1] = quantity
+                for window in ROLLING_WINDOWS:
+                    sums[str(window)] = sums.get(str(window), 0.0) + delta
+                values = previous
+            else:
+                # Back-dated rows shift the features of every later row
+                state.is_stale = True
+                state.save(update_fields=['is_stale', 'updated_at'])
+                return
+            
+            SalesFeature.objects.update_or_create(sales_id=sale.pk, defaults=values)
+            
+            state.tail = tail[-TAIL_LENGTH:]
+            state.rolling_sums = sums
+            state.is_stale = False
+            state.save()
+    
+    @staticmethod
+    def mark_stale(product_id=None, warehouse_id=None, pairs=None):
+        """Flag series for rebuild after writes that bypass model signals"""
+        states = SeriesFeatureState.objects.all()
+        if pairs is not None:
+            # One UPDATE per warehouse rather than one per series
+            by_warehouse = defaultdict(set)
+            for product_id, warehouse_id in pairs:
+                by_warehouse[warehouse_id].add(product_id)
+            for warehouse_id, product_ids in by_warehouse.items():
+                states.filter(warehouse_id=warehouse_id, product_id__in=product_ids).update(is_stale=True)
+            return
+        if product_id is not None:
+            states = states.filter(product_id=product_id)
+        if warehouse_id is not None:
+            states = states.filter(warehouse_id=warehouse_id)
+        states.update(is_stale=True)
+    
+    @staticmethod
+    def rebuild(product_id, warehouse_id):
+        """Recompute every stored feature of one series"""
+        rows = list(SalesHistory.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id
+        ).order_by('date').values_list('id', 'date', 'quantity_sold'))
+        
+        ids = [row[0] for row in rows]
+        quantities = pd.Series([row[2] for row in rows], dtype=float)
+        
+        columns = {}
+        for lag in LAGS:
+            columns[f'lag_{lag}'] = quantities.shift(lag).to_numpy()
+        # Rolling means cover the days before each row, as they do when forecasting
+        for window in ROLLING_WINDOWS:
+            columns[f'rolling_{window}_mean'] = quantities.shift(1).rolling(window).mean().to_numpy()
+        
+        features = []
+        for i, sales_id in enumerate(ids):
+            values = {
+                column: None if np.isnan(columns[column][i]) else float(columns[column][i])
+                for column in FEATURE_COLUMNS
+            }
+            features.append(SalesFeature(sales_id=sales_id, **values))
+        
+        tail = quantities.iloc[-TAIL_LENGTH:].tolist()
+        with transaction.atomic():
+            SalesFeature.objects.filter(
+                sales__product_id=product_id,
+                sales__warehouse_id=warehouse_id
+            ).delete()
+            SalesFeature.objects.bulk_create(features, batch_size=1000)
+            
+            SeriesFeatureState.objects.update_or_create(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                defaults={
+                    'last_date': rows[-1][1] if rows else None,
+                    'row_count': len(rows),
+                    'tail': tail,
+                    'rolling_sums': {
+                        str(window): float(sum(tail[-window:])) for window in ROLLING_WINDOWS
+                    },
+                    'is_stale': False
+                }
+            )
+        
+        logger.info(f"Rebuilt {len(rows)} feature rows for product {product_id} at warehouse {warehouse_id}")
+    
+    @staticmethod
+    def ensure_fresh(product_id, warehouse_id):
+        """Rebuild a series whose stored state is stale or out of step with its sales"""
+        state = SeriesFeatureState.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id
+        ).values('is_stale', 'last_date', 'row_count').first()
+        
+        # Bulk inserts skip signals, so also compare against the table itself
+        summary = SalesHistory.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id
+        ).aggregate(last_date=Max('date'), rows=Count('id'))
+        
+        if (
+            state is None or state['is_stale']
+            or state['last_date'] != summary['last_date']
+            or state['row_count'] != summary['rows']
+        ):
+            FeatureStore.rebuild(product_id, warehouse_id)
+    
+    @staticmethod
+    def feature_frame(product_id, warehouse_id, start_date, end_date):
+        """Sales rows in a date range with their stored lag/rolling features"""
+        FeatureStore.ensure_fresh(product_id, warehouse_id)
+        
+        rows = SalesHistory.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id,
+            date__gte=start_date,
+            date__lte=end_date
+        ).order_by('date').values(
+            'date', 'quantity_sold', 'promotion_flag', 'weather_condition', 'special_event',
+            *[f'features__{column}' for column in FEATURE_COLUMNS]
+        )
+        
+        df = pd.DataFrame(list(rows))
+        df.rename(columns={f'features__{column}': column for column in FEATURE_COLUMNS}, inplace=True)
+        return df
@@ -0,0 +1,88 @@
+import logging
+import math
+import os
+import time
+from concurrent.futures import as_completed
+from django.conf import settings
+from supply_chain.parallel import django_process_pool
+from .forecasting import DemandForecaster
+
+logger = logging.getLogger(__name__)
+
+def forecast_series_chunk(chunk_index, series, method='random_forest', periods=30, n_jobs=1):
+    """Forecast a chunk of (product_id, warehouse_id) pairs and report its timing"""
+    started = time.monotonic()
+    succeeded = 0
+    failed = 0
+    
+    for product_id, warehouse_id in series:
+        try:
+            forecaster = DemandForecaster(product_id, warehouse_id, n_jobs=n_jobs)
+            forecaster.generate_forecast(method=method, periods=periods)
+            succeeded += 1
+        except Exception as e:
+            failed += 1
+            logger.error(
+                f"Failed to generate forecast for product {product_id} at warehouse {warehouse_id}: {str(e)}"
+            )
+    
+    return {
+        'chunk': chunk_index,
+        'series': len(series),
+        'succeeded': succeeded,
+        'failed': failed,
+        'seconds': round(time.monotonic() - started, 2),
+    }
+
+class ForecastExecutor:
+    """
+    Spread per-series forecasts over a bounded pool of worker processes.
+    Each model's n_jobs is pinned so workers x threads never exceeds the cores.
+    """
+    def __init__(self, max_workers=None, chunk_size=None, cores=None):
+        self.cores = cores or os.cpu_count() or 1
+        self.max_workers = max_workers or getattr(settings, 'FORECAST_MAX_WORKERS', None) or self.cores
+        self.max_workers = max(1, min(self.max_workers, self.cores))
+        self.n_jobs = max(1, self.cores // self.max_workers)
+        self.chunk_size = chunk_size
+    
+    def make_chunks(self, series):
+        """Split series into chunks, a few per worker so stragglers even out"""
+        series = [tuple(pair) for pair in series]
+        chunk_size = self.chunk_size or max(1, math.ceil(len(series) / (self.max_workers * 4)))
+        return [series[i:i + chunk_size] for i in range(0, len(series), chunk_size)]
+    
+    def run(self, series, method='random_forest', periods=30):
+        """Forecast all series; returns totals plus per-chunk timings"""
+        started = time.monotonic()
+        chunks = self.make_chunks(series)
+        reports = []
+        
+        if chunks:
+            with django_process_pool(min(self.max_workers, len(chunks))) as pool:
+                futures = [
+                    pool.submit(forecast_series_chunk, index, chunk, method, periods, self.n_jobs)
+                    for index, chunk in enumerate(chunks)
+                ]
+                for future in as_completed(futures):
+                    report = future.result()
+                    logger.info(
+                        f"Forecast chunk {report['chunk']}: {report['succeeded']}/{report['series']} "
+                        f"series in {report['seconds']}s"
+                    )
+                    reports.append(report)
+        
+        reports.sort(key=lambda r: r['chunk'])
+        return summarize_chunk_reports(reports, time.monotonic() - started, self.max_workers, self.n_jobs)
+
+def summarize_chunk_reports(reports, wall_seconds=None, workers=None, n_jobs=None):
+    """Aggregate per-chunk reports into one summary"""
+    return {
+        'series': sum(r['series'] for r in reports),
+        'succeeded': sum(r['succeeded'] for r in reports),
+        'failed': sum(r['failed'] for r in reports),
+        'workers': workers,
+        'model_n_jobs': n_jobs,
+        'wall_seconds': round(wall_seconds, 2) if wall_seconds is not None else None,
+        'chunks': reports,
+    }
@@ -1,31 +1,59 @@
 import pandas as pd
 import numpy as np
 from django.db import models
-from django.db.models import Q, Sum, F, ExpressionWrapper, DecimalField
+from django.db.models import Q, Sum, F, ExpressionWrapper, DecimalField, Max, Count
 from django.utils import timezone
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.model_selection import TimeSeriesSplit, cross_val_score
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from statsmodels.tsa.arima.model import ARIMA
-from prophet import Prophet
-import holidays
 from django.conf import settings
-import joblib
-import os
+import time
 from datetime import datetime, timedelta
-import json
 import matplotlib
 matplotlib.use('Agg')
 from ..models import SalesHistory, DemandForecast, Product, Warehouse, Inventory
+from .feature_cache import get_feature_cache
+from .model_registry import get_model_registry
+from .calendars import holiday_flags, warehouse_holiday_flags, warehouse_regions
+from .feature_store import FeatureStore, FEATURE_COLUMNS, FEATURE_VERSION
+from .recursive_forecasting import RecursiveForecaster
+from .fast_forecasting import HEAVY, classify_series, demand_window, fast_forecast, series_demand
+from .prophet_forecasting import ProphetForecaster
+
+def add_calendar_features(df, warehouse=None):
+    """
+    Add time and holiday features for a frame indexed by date.
+    warehouse is a warehouse id, or one id per row, selecting the holiday calendar.
+    """
+    df['day_of_week'] = df.index.dayofweek
+    df['day_of_month'] = df.index.day
+    df['month'] = df.index.month
+    df['year'] = df.index.year
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+    df['is_month_start'] = df.index.is_month_start.astype(int)
+    df['is_month_end'] = df.index.is_month_end.astype(int)
+    
+    # Add holiday information
+    if warehouse is None:
+        df['is_holiday'] = holiday_flags(df.index)
+    else:
+        df['is_holiday'] = warehouse_holiday_flags(df.index, warehouse)
+    
+    return df
+
+def interval_values(dates, lower, upper, level):
+    """DemandForecast.confidence_interval payload: daily lower/upper bounds at a coverage level"""
+    return {
+        'level': level,
+        'lower': {str(date.date()): round(float(value), 2) for date, value in zip(dates, lower)},
+        'upper': {str(date.date()): round(float(value), 2) for date, value in zip(dates, upper)},
+    }
 
 class DemandForecaster:
-    def __init__(self, product_id, warehouse_id):
+    def __init__(self, product_id, warehouse_id, n_jobs=-1, use_cache=True):
         self.product_id = product_id
         self.warehouse_id = warehouse_id
-        self.model_dir = os.path.join(settings.MODEL_ROOT, 'forecasting')
-        os.makedirs(self.model_dir, exist_ok=True)
-        self.model_path = os.path.join(self.model_dir, f"model_{product_id}_{warehouse_id}.pkl")
-        self.scaler_path = os.path.join(self.model_dir, f"scaler_{product_id}_{warehouse_id}.pkl")
+        self.n_jobs = n_jobs  # threads per model fit; pin when running several forecasters at once
+        self.use_cache = use_cache
         
     def prepare_data(self, lookback_days=730):
         """Prepare training data with features"""
@@ -39,35 +67,34 @@ class DemandForecaster:
             date__lte=end_date
         ).order_by('date')
         
-        if not sales_data:
+        # Cheap fingerprint of the window decides whether cached features are current
+        summary = sales_data.aggregate(last_date=Max('date'), rows=Count('id'), total=Sum('quantity_sold'))
+        if not summary['rows']:
             raise ValueError("No sales data available for forecasting")
+        
+        # The warehouse's calendar is part of the key, so a region change rebuilds the holiday flags
+        cache_key = (
+            self.product_id, self.warehouse_id, lookback_days,
+            str(start_date), str(summary['last_date']), summary['rows'], summary['total'],
+            warehouse_regions([self.warehouse_id])[self.warehouse_id], FEATURE_VERSION
+        )
+        if self.use_cache:
+            df = get_feature_cache().get(cache_key)
+            if df is not None:
+                return df
             
-        df = pd.DataFrame(list(sales_data.values(
-            'date', 'quantity_sold', 'promotion_flag', 'weather_condition', 'special_event'
-        )))
+        # Lag and rolling features come precomputed from the feature store
+        df = FeatureStore.feature_frame(self.product_id, self.warehouse_id, start_date, end_date)
+        stored_features = df[FEATURE_COLUMNS]
+        df = df.drop(columns=FEATURE_COLUMNS)
         df['date'] = pd.to_datetime(df['date'])
         df.set_index('date', inplace=True)
         
-        # Add time features
-        df['day_of_week'] = df.index.dayofweek
-        df['day_of_month'] = df.index.day
-        df['month'] = df.index.month
-        df['year'] = df.index.year
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        df['is_month_start'] = df.index.is_month_start.astype(int)
-        df['is_month_end'] = df.index.is_month_end.astype(int)
-        
-        # Add holiday information
-        country_holidays = holidays.CountryHoliday('US')  # Adjust for your country
-        df['is_holiday'] = df.index.to_series().apply(lambda x: x in country_holidays).astype(int)
+        # Add time and holiday features
+        add_calendar_features(df, self.warehouse_id)
         
-        # Add lag features
-        for lag in [1, 7, 14, 30]:
-            df[f'lag_{lag}'] = df['quantity_sold'].shift(lag)
-        
-        # Add rolling features
-        df['rolling_7_mean'] = df['quantity_sold'].rolling(7).mean()
-        df['rolling_30_mean'] = df['quantity_sold'].rolling(30).mean()
+        for column in FEATURE_COLUMNS:
+            df[column] = stored_features[column].to_numpy(dtype=float)
         
         # Handle categorical features
         df = pd.get_dummies(df, columns=['weather_condition', 'special_event'], dummy_na=True)
@@ -76,23 +103,39 @@ class DemandForecaster:
         df.fillna(method='ffill', inplace=True)
         df.fillna(0, inplace=True)
         
+        if self.use_cache:
+            get_feature_cache().set(cache_key, df)
+        
         return df
     
-    def train_model(self, method='random_forest'):
-        """Train and evaluate forecasting model"""
-        df = self.prepare_data()
+    def train_model(self, method='random_forest', df=None, cross_validate=True):
+        """
+        Train and evaluate forecasting model.
+        Without cross_validate the 5-fold CV is skipped and the previous
+        version's CV error is carried forward as the accuracy baseline.
+        """
+        if df is None:
+            df = self.prepare_data()
+        
+        if method == 'prophet':
+            # Prophet has no CV here; refit warm-started from the current version
+            prophet = ProphetForecaster(self.product_id, self.warehouse_id)
+            current = prophet.registry.latest(self.product_id, self.warehouse_id, method)
+            prophet.fit(df, prophet.registry.load(current) if current else None)
+            version = prophet.registry.latest(self.product_id, self.warehouse_id, method)
+            return {'model': method, 'version': version.version, 'avg_mae': None, 'std_mae': None}
+        
         X = df.drop('quantity_sold', axis=1)
         y = df['quantity_sold']
         
-        # Time-series cross-validation
-        tscv = TimeSeriesSplit(n_splits=5)
-        
         if method == 'random_forest':
+            # Out-of-bag predictions give honest residuals for the prediction intervals
             model = RandomForestRegressor(
                 n_estimators=200,
                 max_depth=10,
                 random_state=42,
-                n_jobs=-1
+                n_jobs=self.n_jobs,
+                oob_score=True
             )
         elif method == 'gradient_boost':
             model = GradientBoostingRegressor(
@@ -103,58 +146,99 @@ class DemandForecaster:
         else:
             raise ValueError("Unsupported model type")
         
-        # Cross-validation
-        scores = cross_val_score(
-            model, X, y, cv=tscv, 
-            scoring='neg_mean_absolute_error'
-        )
-        mae_scores = -scores
+        registry = get_model_registry()
+        if cross_validate:
+            # Time-series cross-validation
+            tscv = TimeSeriesSplit(n_splits=5)
+            scores = cross_val_score(
+                model, X, y, cv=tscv, 
+                scoring='neg_mean_absolute_error'
+            )
+            mae_scores = -scores
+            avg_mae, std_mae = float(mae_scores.mean()), float(mae_scores.std())
+        else:
+            previous = registry.latest(self.product_id, self.warehouse_id, method)
+            previous_metrics = (previous.metrics or {}) if previous else {}
+            avg_mae, std_mae = previous_metrics.get('avg_mae'), previous_metrics.get('std_mae')
         
         # Train final model
+        started = time.monotonic()
         model.fit(X, y)
+        fit_seconds = time.monotonic() - started
+        
+        # Recent demand level, the reference point for drift checks
+        recent = y.iloc[-90:]
+        
+        # Models without out-of-bag predictions store no residuals, and their
+        # forecasts no intervals (planning then falls back to sales variance)
+        residuals = None
+        if getattr(model, 'oob_prediction_', None) is not None:
+            residuals = np.round(RecursiveForecaster.residual_sample(y, model.oob_prediction_), 3).tolist()
         
-        # Save model
-        joblib.dump(model, self.model_path)
+        # Save model as the series' next version
+        version = registry.register(
+            self.product_id, self.warehouse_id, method, model,
+            training_df=df,
+            metrics={
+                'avg_mae': avg_mae,
+                'std_mae': std_mae,
+                'cross_validated': cross_validate,
+                'fit_seconds': round(fit_seconds, 3),
+                'demand_mean': float(recent.mean()),
+                'demand_std': float(recent.std(ddof=0)),
+                'residuals': residuals,
+            },
+            feature_schema=X.columns
+        )
         
         return {
             'model': method,
-            'avg_mae': mae_scores.mean(),
-            'std_mae': mae_scores.std(),
+            'version': version.version,
+            'avg_mae': avg_mae,
+            'std_mae': std_mae,
             'feature_importances': dict(zip(X.columns, model.feature_importances_))
         }
     
-    def forecast_prophet(self, periods=30):
+    def forecast_prophet(self, periods=30, df=None):
         """Forecast using Facebook's Prophet"""
-        df = self.prepare_data()
-        prophet_df = df.reset_index()[['date', 'quantity_sold']].rename(
-            columns={'date': 'ds', 'quantity_sold': 'y'}
-        )
-        
-        model = Prophet(
-            yearly_seasonality=True,
-            weekly_seasonality=True,
-            daily_seasonality=False,
-            changepoint_prior_scale=0.05
-        )
-        model.fit(prophet_df)
-        
-        future = model.make_future_dataframe(periods=periods)
-        forecast = model.predict(future)
-        
-        # Extract forecasted values
-        forecast_df = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(periods)
-        forecast_df.set_index('ds', inplace=True)
-        
+        if df is None:
+            df = self.prepare_data()
+        forecast_df = ProphetForecaster(self.product_id, self.warehouse_id).forecast(df, periods)
         return forecast_df['yhat']
     
-    def generate_forecast(self, method='random_forest', periods=30):
-        """Generate forecast using specified method"""
-        if method in ['random_forest', 'gradient_boost']:
-            if not os.path.exists(self.model_path):
-                self.train_model(method)
+    def generate_forecast(self, method='random_forest', periods=30, heavy_method='random_forest'):
+        """
+        Generate forecast using specified method.
+        'tiered' picks a cheap statistical method for low-volume or intermittent
+        series and heavy_method for the rest.
+        """
+        interval_level = getattr(settings, 'FORECAST_INTERVAL_WIDTH', 0.8)
+        confidence_interval = None
+        
+        if method == 'tiered':
+            df = self.prepare_data()
+            # Same window and layout as the nightly TieredForecaster run
+            start_date, end_date = demand_window()
+            demand, starts = series_demand(df.index.date, df['quantity_sold'].to_numpy(dtype=float), start_date, end_date)
+            tier = classify_series(demand, starts)[0]
+            if tier == HEAVY:
+                return self.generate_forecast(heavy_method, periods)
             
-            model = joblib.load(self.model_path)
+            method = tier
+            forecast_values = fast_forecast(demand, starts, np.array([tier], dtype=object), periods)[0]
+            forecast_series = pd.Series(
+                np.round(forecast_values, 2),
+                index=pd.date_range(start=end_date + timedelta(days=1), periods=periods)
+            )
+        elif method in ['random_forest', 'gradient_boost']:
             df = self.prepare_data()
+            registry = get_model_registry()
+            version = registry.latest(self.product_id, self.warehouse_id, method)
+            if version is None:
+                self.train_model(method, df=df)
+                version = registry.latest(self.product_id, self.warehouse_id, method)
+            
+            model = registry.load(version)
             
             # Create future dataframe
             last_date = df.index[-1]
@@ -165,28 +249,12 @@ class DemandForecaster:
             
             future_df = pd.DataFrame(index=future_dates)
             
-            # Add time features
-            future_df['day_of_week'] = future_df.index.dayofweek
-            future_df['day_of_month'] = future_df.index.day
-            future_df['month'] = future_df.index.month
-            future_df['year'] = future_df.index.year
-            future_df['is_weekend'] = future_df['day_of_week'].isin([5, 6]).astype(int)
-            future_df['is_month_start'] = future_df.index.is_month_start.astype(int)
-            future_df['is_month_end'] = future_df.index.is_month_end.astype(int)
-            
-            # Add holiday information
-            country_holidays = holidays.CountryHoliday('US')
-            future_df['is_holiday'] = future_df.index.to_series().apply(
-                lambda x: x in country_holidays
-            ).astype(int)
+            # Add time and holiday features
+            add_calendar_features(future_df, self.warehouse_id)
             
-            # Add lag features using last known values
-            for lag in [1, 7, 14, 30]:
-                future_df[f'lag_{lag}'] = df['quantity_sold'].iloc[-lag]
-            
-            # Add rolling features
-            future_df['rolling_7_mean'] = df['quantity_sold'].rolling(7).mean().iloc[-1]
-            future_df['rolling_30_mean'] = df['quantity_sold'].rolling(30).mean().iloc[-1]
+            # Lag and rolling features are filled step by step from the predictions
+            for column in FEATURE_COLUMNS:
+                future_df[column] = 0.0
             
             # Add other features with last known values
             for col in df.columns:
@@ -199,22 +267,34 @@ class DemandForecaster:
                     else:
                         future_df[col] = df[col].iloc[-1]
             
-            # Ensure all columns match training data
-            missing_cols = set(df.columns) - set(future_df.columns)
-            for col in missing_cols:
-                future_df[col] = 0
-            
-            future_df = future_df[df.drop('quantity_sold', axis=1).columns]
+            # Match the columns the model was trained on (new categories may have appeared since)
+            future_df = future_df.reindex(columns=version.feature_schema, fill_value=0)
             
             # Generate forecast
-            forecast_values = model.predict(future_df)
+            engine = RecursiveForecaster(version.feature_schema)
+            residuals = (version.metrics or {}).get('residuals')
+            forecast_values, lower, upper = engine.forecast(
+                model,
+                future_df.to_numpy(dtype=float)[np.newaxis],
+                engine.history_buffer(df['quantity_sold'].to_numpy()),
+                interval=interval_level,
+                residuals=engine.residual_matrix([residuals]) if residuals else None
+            )
             forecast_series = pd.Series(
-                [max(0, round(x, 2)) for x in forecast_values],
+                [max(0, round(x, 2)) for x in forecast_values[0]],
                 index=future_dates
             )
+            if lower is not None:
+                confidence_interval = interval_values(future_dates, lower[0], upper[0], interval_level)
             
         elif method == 'prophet':
-            forecast_series = self.forecast_prophet(periods)
+            forecast_df = ProphetForecaster(self.product_id, self.warehouse_id).forecast(
+                self.prepare_data(), periods
+            ).clip(lower=0)
+            forecast_series = forecast_df['yhat'].round(2)
+            confidence_interval = interval_values(
+                forecast_df.index, forecast_df['yhat_lower'], forecast_df['yhat_upper'], interval_level
+            )
         else:
             raise ValueError("Invalid forecasting method")
         
@@ -223,16 +303,19 @@ class DemandForecaster:
             str(date.date()): value for date, value in forecast_series.items()
         }
         
-        forecast = DemandForecast(
+        # Replaces any forecast already made today (e.g. by the nightly batch run)
+        forecast, _ = DemandForecast.objects.update_or_create(
             product_id=self.product_id,
             warehouse_id=self.warehouse_id,
             forecast_date=datetime.now().date(),
             period='daily',
-            forecast_start=forecast_series.index[0].date(),
-            forecast_end=forecast_series.index[-1].date(),
-            forecast_values=forecast_dict,
-            algorithm_used=method
+            defaults={
+                'forecast_start': forecast_series.index[0].date(),
+                'forecast_end': forecast_series.index[-1].date(),
+                'forecast_values': forecast_dict,
+                'confidence_interval': confidence_interval,
+                'algorithm_used': method
+            }
         )
-        forecast.save()
         
         return forecast
\ No newline at end of file
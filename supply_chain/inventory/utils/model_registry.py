@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+import joblib
+from prophet.serialize import model_to_json, model_from_json
+from django.conf import settings
+from django.db import transaction
+from ..models import ForecastModelVersion
+
+logger = logging.getLogger(__name__)
+
+# Prophet models are stored in Prophet's own JSON format; everything else via joblib
+JSON_ALGORITHMS = {'prophet'}
+
+class ModelRegistry:
+    """
+    Versioned storage of trained forecasting models with a per-process LRU of
+    loaded models, bounded by an approximate memory budget (on-disk size).
+    With mmap_mode set, numpy arrays inside saved models are memory-mapped so
+    worker processes share their pages.
+    """
+    def __init__(self, memory_budget_mb=None, mmap_mode=None, keep_versions=None):
+        if memory_budget_mb is None:
+            memory_budget_mb = getattr(settings, 'FORECAST_MODEL_CACHE_MB', 512)
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.mmap_mode = mmap_mode or getattr(settings, 'FORECAST_MODEL_MMAP_MODE', None)
+        self.keep_versions = keep_versions or getattr(settings, 'FORECAST_MODEL_VERSIONS_KEPT', 3)
+        self.model_dir = os.path.join(settings.MODEL_ROOT, 'forecasting')
+        self._models = OrderedDict()  # version id -> (model, size)
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+    
+    def latest(self, product_id, warehouse_id, algorithm):
+        """Active model version for a series, or None if none was trained"""
+        return ForecastModelVersion.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id,
+            algorithm=algorithm,
+            is_active=True
+        ).order_by('-version').first()
+    
+    def register(self, product_id, warehouse_id, algorithm, model, training_df=None, metrics=None, feature_schema=None):
+        """Save a trained model as the next active version of its series"""
+        os.makedirs(self.model_dir, exist_ok=True)
+        
+        path = None
+        try:
+            with transaction.atomic():
+                previous = ForecastModelVersion.objects.select_for_update().filter(
+                    product_id=product_id,
+                    warehouse_id=warehouse_id,
+                    algorithm=algorithm
+                ).order_by('-version')
+                version_number = (previous.values_list('version', flat=True).first() or 0) + 1
+                
+                extension = 'json' if algorithm in JSON_ALGORITHMS else 'pkl'
+                path = os.path.join(
+                    self.model_dir, f"model_{product_id}_{warehouse_id}_{algorithm}_v{version_number}.{extension}"
+                )
+                if algorithm in JSON_ALGORITHMS:
+                    with open(path, 'w') as f:
+                        f.write(model_to_json(model))
+                else:
+                    # Uncompressed so arrays can be memory-mapped on load
+                    joblib.dump(model, path)
+                
+                previous.filter(is_active=True).update(is_active=False)
+                version = ForecastModelVersion.objects.create(
+                    product_id=product_id,
+                    warehouse_id=warehouse_id,
+                    algorithm=algorithm,
+                    version=version_number,
+                    path=path,
+                    data_start=training_df.index[0].date() if training_df is not None and len(training_df) else None,
+                    data_end=training_df.index[-1].date() if training_df is not None and len(training_df) else None,
+                    training_rows=len(training_df) if training_df is not None else 0,
+                    metrics=metrics,
+                    feature_schema=list(feature_schema) if feature_schema is not None else [],
+                    size_bytes=os.path.getsize(path)
+                )
+        except BaseException:
+            # The version row was rolled back, so its file would be left orphaned
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+            raise
+        
+        self._remember(version.pk, model, version.size_bytes)
+        self._prune(product_id, warehouse_id, algorithm)
+        return version
+    
+    def load(self, version):
+        """Loaded model for a version, deserialized at most once per process"""
+        with self._lock:
+            if version.pk in self._models:
+                self._models.move_to_end(version.pk)
+                return self._models[version.pk][0]
+        
+        if version.algorithm in JSON_ALGORITHMS:
+            with open(version.path) as f:
+                model = model_from_json(f.read())
+        else:
+            model = joblib.load(version.path, mmap_mode=self.mmap_mode)
+        self._remember(version.pk, model, version.size_bytes or os.path.getsize(version.path))
+        return model
+    
+    def _remember(self, key, model, size):
+        with self._lock:
+            if key in self._models:
+                self._cached_bytes -= self._models.pop(key)[1]
+            self._models[key] = (model, size)
+            self._cached_bytes += size
+            
+            # Always keep the newest model even if it alone exceeds the budget
+            while self._cached_bytes > self.memory_budget and len(self._models) > 1:
+                _, (_, evicted_size) = self._models.popitem(last=False)
+                self._cached_bytes -= evicted_size
+    
+    def _prune(self, product_id, warehouse_id, algorithm):
+        """Delete versions beyond the retention limit"""
+        stale = ForecastModelVersion.objects.filter(
+            product_id=product_id,
+            warehouse_id=warehouse_id,
+            algorithm=algorithm
+        ).order_by('-version')[self.keep_versions:]
+        
+        for version in stale:
+            try:
+                os.remove(version.path)
+            except OSError:
+                pass
+            with self._lock:
+                if version.pk in self._models:
+                    self._cached_bytes -= self._models.pop(version.pk)[1]
+            version.delete()
+    
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._cached_bytes = 0
+
+_model_registry = None
+
+def get_model_registry():
+    """Per-process model registry"""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry()
+    return _model_registry
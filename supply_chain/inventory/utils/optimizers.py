@@ -1,29 +1,195 @@
+import math
+from datetime import date, timedelta
+from itertools import product as cartesian_product
+from statistics import NormalDist
+import numpy as np
+from django.conf import settings
 from django.db import transaction
-from inventory.models import Inventory, Product, Warehouse
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from inventory.models import Inventory, Product, Warehouse, SalesHistory, DemandForecast
+from .stock_summary import StockSummary, writes_stock_levels
+
+# Forecasts younger than this drive a row's reorder point (see ForecastInventoryPlanner)
+FORECAST_MAX_AGE_DAYS = 7
+
+def forecast_planned_series(as_of=None, max_age_days=FORECAST_MAX_AGE_DAYS):
+    """
+    (product_id, warehouse_id) pairs with a recent daily forecast. Their
+    reorder point, safety stock and EOQ are owned by ForecastInventoryPlanner;
+    the sales-history heuristics only set rows outside this set.
+    """
+    as_of = as_of or date.today()
+    return set(DemandForecast.objects.filter(
+        period='daily',
+        forecast_date__gte=as_of - timedelta(days=max_age_days)
+    ).values_list('product_id', 'warehouse_id').distinct())
+
+def sales_statistics(since, until=None):
+    """{(product_id, warehouse_id): (total, sum of squares, days with sales)} from one grouped query"""
+    sales = SalesHistory.objects.filter(date__gte=since)
+    if until is not None:
+        sales = sales.filter(date__lte=until)
+    rows = sales.values('product_id', 'warehouse_id').annotate(
+        total=Sum('quantity_sold'),
+        total_squared=Sum(F('quantity_sold') * F('quantity_sold')),
+        days=Count('id')
+    ).values_list('product_id', 'warehouse_id', 'total', 'total_squared', 'days')
+    return {(p, w): (total, total_squared, days) for p, w, total, total_squared, days in rows}
+
+def bulk_update_in_chunks(objects, fields, batch_size=2000):
+    """bulk_update with one short transaction per chunk instead of one long lock"""
+    # bulk_update skips save(), so stock flags and summaries are refreshed here
+    track_stock = writes_stock_levels(fields)
+    touched = set()
+    for start in range(0, len(objects), batch_size):
+        chunk = objects[start:start + batch_size]
+        with transaction.atomic():
+            Inventory.objects.bulk_update(chunk, fields)
+        if track_stock:
+            rows = Inventory.objects.filter(id__in=[obj.id for obj in chunk])
+            StockSummary.refresh_flags(rows)
+            touched.update(rows.values_list('product_id', 'warehouse_id'))
+    if touched:
+        StockSummary.rebuild({p for p, _ in touched}, {w for _, w in touched})
 
 class InventoryOptimizer:
     @staticmethod
-    def optimize_inventory_levels():
+    def create_missing_inventory(batch_size=2000):
+        """Add default Inventory rows for product/warehouse pairs that have none"""
+        existing = set(Inventory.objects.values_list('product_id', 'warehouse_id'))
+        missing = [
+            Inventory(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                quantity_on_hand=0,
+                reorder_point=10,  # Default value
+                safety_stock=5     # Default value
+            )
+            for product_id, warehouse_id in cartesian_product(
+                Product.objects.values_list('id', flat=True),
+                Warehouse.objects.values_list('id', flat=True)
+            )
+            if (product_id, warehouse_id) not in existing
+        ]
+        for inventory in missing:
+            inventory.refresh_stock_flags()
+        Inventory.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+        if missing:
+            StockSummary.rebuild(
+                {inventory.product_id for inventory in missing},
+                {inventory.warehouse_id for inventory in missing}
+            )
+        return len(missing)
+
+    @staticmethod
+    def optimize_inventory_levels(service_level=None, lookback_days=90, batch_size=2000):
         """
         Optimize inventory levels across all warehouses
-        Sets reorder points and safety stock levels
+        Sets reorder points, safety stock (z x daily demand sigma x sqrt(lead time))
+        and EOQ from the last lookback_days of sales, computed as arrays over every row.
+        Rows with a recent forecast are left to ForecastInventoryPlanner.
         """
-        with transaction.atomic():
-            for product in Product.objects.all():
-                for warehouse in Warehouse.objects.all():
-                    inventory, created = Inventory.objects.get_or_create(
-                        product=product,
-                        warehouse=warehouse,
-                        defaults={
-                            'quantity_on_hand': 0,
-                            'reorder_point': 10,  # Default value
-                            'safety_stock': 5     # Default value
-                        }
-                    )
-                    
-                    if not created:
-                        # Calculate optimal levels based on sales history
-                        # This is a simplified version - you should implement your own logic
-                        inventory.reorder_point = max(10, inventory.quantity_on_hand // 2)
-                        inventory.safety_stock = max(5, inventory.reorder_point // 2)
-                        inventory.save()
\ No newline at end of file
+        if service_level is None:
+            service_level = getattr(settings, 'INVENTORY_SERVICE_LEVEL', 0.95)
+        ordering_cost = getattr(settings, 'INVENTORY_ORDERING_COST', 50.0)
+        holding_cost_rate = getattr(settings, 'INVENTORY_HOLDING_COST_RATE', 0.25)
+
+        created = InventoryOptimizer.create_missing_inventory(batch_size)
+
+        rows = list(Inventory.objects.values_list(
+            'id', 'product_id', 'warehouse_id', 'lead_time_days',
+            'reorder_point', 'safety_stock', 'economic_order_quantity', 'product__unit_cost'
+        ))
+        if not rows:
+            return {'created': created, 'evaluated': 0, 'updated': 0}
+
+        stats = sales_statistics(date.today() - timedelta(days=lookback_days))
+        no_sales = (0, 0, 0)
+        totals = np.array([stats.get((r[1], r[2]), no_sales)[:2] for r in rows], dtype=float)
+        planned = forecast_planned_series()
+        has_sales = np.array([(r[1], r[2]) in stats and (r[1], r[2]) not in planned for r in rows])
+        lead_times = np.array([r[3] for r in rows], dtype=float)
+        unit_costs = np.array([float(r[7] or 0) for r in rows])
+
+        # Days without a sales row count as zero demand
+        mean_daily = totals[:, 0] / lookback_days
+        variance = np.maximum(totals[:, 1] / lookback_days - mean_daily ** 2, 0)
+
+        z = NormalDist().inv_cdf(service_level)
+        safety_stock = np.ceil(z * np.sqrt(variance) * np.sqrt(lead_times))
+        reorder_point = np.ceil(mean_daily * lead_times) + safety_stock
+
+        holding_cost = unit_costs * holding_cost_rate
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eoq = np.sqrt(2 * mean_daily * 365 * ordering_cost / holding_cost)
+        eoq_valid = (mean_daily > 0) & (holding_cost > 0)
+
+        # Rows without recent sales have nothing to optimize from and keep their levels,
+        # as do rows whose levels come from their forecast
+        now = timezone.now()
+        changed = []
+        for i in np.flatnonzero(has_sales):
+            row = rows[i]
+            new_eoq = max(1, math.ceil(eoq[i])) if eoq_valid[i] else None
+            if (row[4], row[5], row[6]) != (int(reorder_point[i]), int(safety_stock[i]), new_eoq):
+                changed.append(Inventory(
+                    id=row[0],
+                    reorder_point=int(reorder_point[i]),
+                    safety_stock=int(safety_stock[i]),
+                    economic_order_quantity=new_eoq,
+                    last_updated=now
+                ))
+
+        bulk_update_in_chunks(
+            changed, ['reorder_point', 'safety_stock', 'economic_order_quantity', 'last_updated'], batch_size
+        )
+        return {'created': created, 'evaluated': len(rows), 'updated': len(changed)}
+
+    @staticmethod
+    def update_reorder_points(dry_run=False, batch_size=2000):
+        """
+        Reorder point = 90-day average demand over lead time plus a week of
+        safety stock, for rows not counted in the last week. Rows with a
+        recent forecast are left to ForecastInventoryPlanner.
+        """
+        today = date.today()
+        now = timezone.now()
+
+        # Get products that need reorder point updates
+        planned = forecast_planned_series(today)
+        inventories = [
+            row for row in Inventory.objects.filter(
+                last_count_date__lte=today - timedelta(days=7)
+            ).values_list('id', 'product_id', 'warehouse_id', 'lead_time_days', 'reorder_point')
+            if (row[1], row[2]) not in planned
+        ]
+
+        # Recent sales (last 3 months) for every series in one grouped query
+        sales_totals = {
+            key: total for key, (total, _, _) in sales_statistics(today - timedelta(days=90)).items()
+        }
+
+        changed = []
+        for inventory_id, product_id, warehouse_id, lead_time_days, reorder_point in inventories:
+            avg_daily_sales = (sales_totals.get((product_id, warehouse_id)) or 0) / 90
+
+            # Calculate new reorder point (lead time demand + safety stock)
+            lead_time_demand = avg_daily_sales * lead_time_days
+            safety_stock = avg_daily_sales * 7  # 1 week safety stock
+            new_reorder_point = round(lead_time_demand + safety_stock)
+
+            if new_reorder_point != reorder_point:
+                changed.append(Inventory(
+                    id=inventory_id,
+                    reorder_point=new_reorder_point,
+                    safety_stock=round(safety_stock),
+                    last_count_date=today,
+                    last_updated=now  # auto_now is not applied by bulk updates
+                ))
+
+        if not dry_run:
+            bulk_update_in_chunks(
+                changed, ['reorder_point', 'safety_stock', 'last_count_date', 'last_updated'], batch_size
+            )
+        return {'evaluated': len(inventories), 'updated': len(changed), 'dry_run': dry_run}
@@ -0,0 +1,147 @@
+import math
+from datetime import date, timedelta
+from statistics import NormalDist
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from ..models import Inventory, DemandForecast
+from .optimizers import FORECAST_MAX_AGE_DAYS, bulk_update_in_chunks, sales_statistics
+
+class ForecastInventoryPlanner:
+    """
+    Set reorder points, safety stock and EOQ from the latest demand forecast of
+    each series. Lead-time demand is the forecast summed over the lead time;
+    its spread comes from the stored prediction intervals (simulated from
+    out-of-sample residuals), or from recent sales variance for forecasts
+    without intervals.
+
+    This planner owns those fields for every row with a recent forecast.
+    InventoryOptimizer.optimize_inventory_levels and update_reorder_points
+    only set rows without one.
+    """
+    def __init__(self, service_level=None, max_forecast_age_days=FORECAST_MAX_AGE_DAYS, lookback_days=90, batch_size=2000):
+        if service_level is None:
+            service_level = getattr(settings, 'INVENTORY_SERVICE_LEVEL', 0.95)
+        self.service_level = service_level
+        self.max_forecast_age_days = max_forecast_age_days
+        self.lookback_days = lookback_days
+        self.batch_size = batch_size
+        self.ordering_cost = getattr(settings, 'INVENTORY_ORDERING_COST', 50.0)
+        self.holding_cost_rate = getattr(settings, 'INVENTORY_HOLDING_COST_RATE', 0.25)
+
+    def latest_forecasts(self, as_of):
+        """{(product_id, warehouse_id): (forecast_start, values, confidence_interval)} for recent daily forecasts"""
+        latest = {}
+        for product_id, warehouse_id, start, values, interval in DemandForecast.objects.filter(
+            period='daily',
+            forecast_date__gte=as_of - timedelta(days=self.max_forecast_age_days)
+        ).order_by('forecast_date').values_list(
+            'product_id', 'warehouse_id', 'forecast_start', 'forecast_values', 'confidence_interval'
+        ):
+            latest[(product_id, warehouse_id)] = (start, values, interval)
+        return latest
+
+    def demand_matrices(self, keys, forecasts, as_of):
+        """(n, horizon) daily means and variances aligned to as_of; NaN where a forecast has no value"""
+        horizon = max(len(values) for _, values, _ in forecasts.values())
+        means = np.full((len(keys), horizon), np.nan)
+        variances = np.full((len(keys), horizon), np.nan)
+
+        for row, key in enumerate(keys):
+            start, values, interval = forecasts[key]
+            offset = (start - as_of).days
+            daily = np.fromiter(values.values(), dtype=float)
+            first, last = max(offset, 0), min(offset + len(daily), horizon)
+            if first >= last:
+                continue
+            means[row, first:last] = daily[first - offset:last - offset]
+
+            if interval and interval.get('lower') and interval.get('upper'):
+                # Central interval of a normal: width = 2 z sigma
+                z = NormalDist().inv_cdf(0.5 + interval['level'] / 2)
+                width = (
+                    np.fromiter(interval['upper'].values(), dtype=float)
+                    - np.fromiter(interval['lower'].values(), dtype=float)
+                )
+                variances[row, first:last] = (width[first - offset:last - offset] / (2 * z)) ** 2
+        return means, variances
+
+    @staticmethod
+    def lead_time_totals(daily, lead_times):
+        """Sum of daily values over each row's lead time, extending past the horizon at the row's mean"""
+        known = ~np.isnan(daily)
+        cumulative = np.zeros((len(daily), daily.shape[1] + 1))
+        cumulative[:, 1:] = np.cumsum(np.where(known, daily, 0), axis=1)
+        counts = np.zeros_like(cumulative)
+        counts[:, 1:] = np.cumsum(known, axis=1)
+
+        covered = np.minimum(lead_times, daily.shape[1]).astype(int)
+        rows = np.arange(len(daily))
+        with np.errstate(invalid='ignore'):
+            daily_mean = np.nan_to_num(np.nanmean(np.where(known, daily, np.nan), axis=1))
+        return cumulative[rows, covered] + (lead_times - counts[rows, covered]) * daily_mean, daily_mean
+
+    def plan(self, dry_run=False):
+        """Plan every inventory row that has a recent forecast"""
+        as_of = date.today()
+        forecasts = self.latest_forecasts(as_of)
+        rows = [
+            row for row in Inventory.objects.values_list(
+                'id', 'product_id', 'warehouse_id', 'lead_time_days',
+                'reorder_point', 'safety_stock', 'economic_order_quantity', 'product__unit_cost'
+            )
+            if (row[1], row[2]) in forecasts
+        ]
+        if not rows:
+            return {'planned': 0, 'updated': 0, 'dry_run': dry_run}
+
+        keys = [(row[1], row[2]) for row in rows]
+        lead_times = np.array([row[3] for row in rows], dtype=float)
+        unit_costs = np.array([float(row[7] or 0) for row in rows])
+        means, variances = self.demand_matrices(keys, forecasts, as_of)
+
+        # Forecasts without intervals fall back to the variance of recent sales
+        stats = sales_statistics(as_of - timedelta(days=self.lookback_days))
+        history = np.array([stats.get(key, (0, 0, 0))[:2] for key in keys], dtype=float)
+        history_mean = history[:, 0] / self.lookback_days
+        history_variance = np.maximum(history[:, 1] / self.lookback_days - history_mean ** 2, 0)
+        no_interval = np.isnan(variances).all(axis=1)
+        variances[no_interval] = history_variance[no_interval, np.newaxis]
+        variances[np.isnan(means)] = np.nan
+
+        lead_time_demand, daily_demand = self.lead_time_totals(means, lead_times)
+        lead_time_variance, _ = self.lead_time_totals(variances, lead_times)
+
+        z = NormalDist().inv_cdf(self.service_level)
+        safety_stock = np.ceil(z * np.sqrt(np.maximum(lead_time_variance, 0)))
+        reorder_point = np.ceil(lead_time_demand) + safety_stock
+
+        holding_cost = unit_costs * self.holding_cost_rate
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eoq = np.sqrt(2 * daily_demand * 365 * self.ordering_cost / holding_cost)
+        eoq_valid = (daily_demand > 0) & (holding_cost > 0)
+
+        now = timezone.now()
+        changed = []
+        for i, row in enumerate(rows):
+            new_eoq = max(1, math.ceil(eoq[i])) if eoq_valid[i] else None
+            if (row[4], row[5], row[6]) != (int(reorder_point[i]), int(safety_stock[i]), new_eoq):
+                changed.append(Inventory(
+                    id=row[0],
+                    reorder_point=int(reorder_point[i]),
+                    safety_stock=int(safety_stock[i]),
+                    economic_order_quantity=new_eoq,
+                    last_updated=now
+                ))
+
+        if not dry_run:
+            bulk_update_in_chunks(
+                changed, ['reorder_point', 'safety_stock', 'economic_order_quantity', 'last_updated'],
+                self.batch_size
+            )
+        return {
+            'planned': len(rows),
+            'updated': len(changed),
+            'with_intervals': int((~no_interval).sum()),
+            'dry_run': dry_run,
+        }
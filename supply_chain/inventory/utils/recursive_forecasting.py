@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .feature_store import LAGS, ROLLING_WINDOWS, TAIL_LENGTH
+
+# Out-of-sample errors kept per series for simulating forecast paths
+RESIDUAL_SAMPLE_SIZE = 180
+
+class RecursiveForecaster:
+    """
+    Multi-step forecasts that feed each day's prediction back into the lag
+    and rolling-mean features of the following days.
+    Works on a batch of series at once: every step is one predict call over
+    all series, reading and writing preallocated NumPy buffers.
+    Prediction intervals come from sample paths driven by each series'
+    out-of-sample residuals.
+    """
+    def __init__(self, feature_columns):
+        self.feature_columns = list(feature_columns)
+        positions = {column: index for index, column in enumerate(self.feature_columns)}
+        self.lag_positions = {
+            lag: positions[f'lag_{lag}'] for lag in LAGS if f'lag_{lag}' in positions
+        }
+        self.rolling_positions = {
+            window: positions[f'rolling_{window}_mean']
+            for window in ROLLING_WINDOWS if f'rolling_{window}_mean' in positions
+        }
+
+    @staticmethod
+    def history_buffer(quantities, length=TAIL_LENGTH):
+        """Right-aligned (1, length) buffer of the latest known quantities, zero-padded"""
+        quantities = np.asarray(quantities, dtype=float)[-length:]
+        buffer = np.zeros((1, length))
+        if len(quantities):
+            buffer[0, -len(quantities):] = quantities
+        return buffer
+
+    def _predict(self, model, X):
+        # Models fitted on DataFrames expect their column names back
+        if hasattr(model, 'feature_names_in_'):
+            X = pd.DataFrame(X, columns=self.feature_columns, copy=False)
+        return model.predict(X)
+
+    @staticmethod
+    def residual_sample(actual, predicted, size=RESIDUAL_SAMPLE_SIZE):
+        """Latest finite out-of-sample errors (actual - predicted), at most size of them"""
+        errors = np.asarray(actual, dtype=float) - np.asarray(predicted, dtype=float)
+        return errors[np.isfinite(errors)][-size:]
+
+    @staticmethod
+    def residual_matrix(samples):
+        """(n_series, k) NaN-padded matrix of per-series residual samples, values first"""
+        samples = [np.asarray(sample, dtype=float) for sample in samples]
+        matrix = np.full((len(samples), max([len(sample) for sample in samples] + [0])), np.nan)
+        for row, sample in enumerate(samples):
+            matrix[row, :len(sample)] = sample
+        return matrix
+
+    def _recurse(self, model, base_features, history, noise=None):
+        """One recursive pass; noise(step) adds simulated errors to what is fed forward"""
+        num_series, periods, _ = base_features.shape
+
+        # Known history followed by room for every prediction
+        buffer = np.zeros((num_series, TAIL_LENGTH + periods))
+        buffer[:, :TAIL_LENGTH] = np.asarray(history, dtype=float)[:, -TAIL_LENGTH:]
+        step_features = np.empty(base_features.shape[::2])
+        predictions = np.empty((num_series, periods))
+
+        # Rolling means are over the days before the one being predicted
+        rolling_sums = {
+            window: buffer[:, TAIL_LENGTH - window:TAIL_LENGTH].sum(axis=1)
+            for window in self.rolling_positions
+        }
+
+        for step in range(periods):
+            position = TAIL_LENGTH + step
+            step_features[:] = base_features[:, step, :]
+            for lag, column in self.lag_positions.items():
+                step_features[:, column] = buffer[:, position - lag]
+            for window, column in self.rolling_positions.items():
+                step_features[:, column] = rolling_sums[window] / window
+
+            predicted = np.maximum(self._predict(model, step_features), 0)
+            if noise is not None:
+                predicted = np.maximum(predicted + noise(step), 0)
+            predictions[:, step] = predicted
+            buffer[:, position] = predicted
+
+            for window in self.rolling_positions:
+                rolling_sums[window] += predicted - buffer[:, position - window]
+
+        return predictions
+
+    def forecast(self, model, base_features, history, interval=None, residuals=None, paths=None, seed=0):
+        """
+        base_features: (n_series, periods, n_features) with every non-recursive column filled
+        history: (n_series, TAIL_LENGTH) latest known quantities, oldest first
+        Returns (n_series, periods) non-negative predictions. With an interval
+        level (e.g. 0.8) also returns lower and upper bounds, or None for both
+        without residuals. residuals: (n_series, k) out-of-sample errors per
+        series (see residual_matrix).
+
+        The bounds are quantiles over simulated sample paths: each day's
+        prediction plus an error drawn from the series' own residuals is fed
+        into the lag and rolling features of the following days, so the
+        uncertainty of early days carries into later ones.
+        """
+        base_features = np.asarray(base_features, dtype=float)
+        predictions = self._recurse(model, base_features, history)
+        if interval is None:
+            return predictions
+        if residuals is None:
+            return predictions, None, None
+
+        num_series, periods, _ = base_features.shape
+        paths = paths or getattr(settings, 'FORECAST_INTERVAL_PATHS', 50)
+        residuals = np.asarray(residuals, dtype=float).reshape(num_series, -1)
+        counts = (~np.isnan(residuals)).sum(axis=1)
+        rows = np.repeat(np.arange(num_series), paths)
+        rng = np.random.default_rng(seed)
+
+        def noise(step):
+            # Bootstrap one residual per path from its own series; none known means no noise
+            if not residuals.shape[1]:
+                return np.zeros(len(rows))
+            picks = (rng.random(len(rows)) * np.maximum(counts[rows], 1)).astype(int)
+            return np.nan_to_num(residuals[rows, picks])
+
+        simulated = self._recurse(
+            model, np.repeat(base_features, paths, axis=0), np.repeat(np.asarray(history, dtype=float), paths, axis=0), noise
+        ).reshape(num_series, paths, periods)
+        lower, upper = np.quantile(simulated, [(1 - interval) / 2, (1 + interval) / 2], axis=1)
+        return predictions, lower, upper
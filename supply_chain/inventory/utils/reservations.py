@@ -0,0 +1,121 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from ..models import Inventory
+from .sharding import InventorySharding
+from .stock_summary import StockSummary
+
+# (on_hand change, allocated change, field that must cover the quantity) per unit moved
+RESERVE = (-1, 1, 'quantity_on_hand')
+RELEASE = (1, -1, 'quantity_allocated')
+COMMIT = (0, -1, 'quantity_allocated')
+
+class StockReservation:
+    """
+    Stock movements as single conditional UPDATEs. Instead of fetching the row
+    under a lock, the WHERE clause checks there is enough stock and the
+    affected row count says whether the movement happened. The same UPDATE
+    sets the stock flags, and one INSERT queues the summaries, so the row
+    lock is held for two statements.
+
+    reserve: on hand -> allocated (order placed)
+    release: allocated -> on hand (order cancelled)
+    commit:  allocated -> gone (order shipped)
+
+    Sharded rows (see InventorySharding) are moved through their shards.
+    """
+    @staticmethod
+    def _move(product_id, warehouse_id, quantity, movement):
+        """One conditional UPDATE; True if the row had enough stock"""
+        if quantity <= 0:
+            # A negative quantity would pass the stock check and move stock backwards
+            raise ValueError("quantity must be positive")
+
+        # Rows known to be sharded skip straight to their shards
+        if InventorySharding.is_sharded(product_id, warehouse_id):
+            return StockReservation._move_sharded(product_id, warehouse_id, quantity, movement)
+
+        on_hand, allocated, required_field = movement
+        changes = {}
+        if on_hand:
+            # Flags from the levels after the move, in the same statement; assigned
+            # first so every database compares against the row as it was
+            delta = on_hand * quantity
+            changes['is_low_stock'] = Case(
+                When(quantity_on_hand__lt=F('reorder_point') - delta, then=Value(True)), default=Value(False)
+            )
+            changes['is_excess_stock'] = Case(
+                When(quantity_on_hand__gt=F('safety_stock') * 3 - delta, then=Value(True)), default=Value(False)
+            )
+            changes['quantity_on_hand'] = F('quantity_on_hand') + delta
+        if allocated:
+            changes['quantity_allocated'] = F('quantity_allocated') + allocated * quantity
+        changes['last_updated'] = timezone.now()
+
+        with transaction.atomic():
+            moved = Inventory.objects.filter(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                shard_count=1,
+                **{f'{required_field}__gte': quantity}
+            ).update(**changes)
+            if moved:
+                # Summaries are only queued, so the movement locks no other row
+                StockSummary.mark_changed([(product_id, warehouse_id)])
+                return True
+
+        # Hot rows keep their stock in shards (sharded since this process last looked)
+        if not Inventory.objects.filter(
+            product_id=product_id, warehouse_id=warehouse_id, shard_count__gt=1
+        ).exists():
+            return False
+        return StockReservation._move_sharded(product_id, warehouse_id, quantity, movement)
+
+    @staticmethod
+    def _move_sharded(product_id, warehouse_id, quantity, movement):
+        if movement == RESERVE:
+            return InventorySharding.reserve(product_id, warehouse_id, quantity)
+        return InventorySharding.move_locked(product_id, warehouse_id, quantity, *movement)
+
+    @staticmethod
+    def _move_lines(lines, movement):
+        """All lines or none, in one transaction"""
+        totals = defaultdict(int)
+        for product_id, warehouse_id, quantity in lines:
+            if quantity <= 0:
+                raise ValueError("quantity must be positive")
+            totals[(product_id, warehouse_id)] += quantity
+
+        with transaction.atomic():
+            # A fixed row order keeps concurrent multi-line movements from deadlocking
+            for (product_id, warehouse_id), quantity in sorted(totals.items()):
+                if not StockReservation._move(product_id, warehouse_id, quantity, movement):
+                    transaction.set_rollback(True)
+                    return False
+        return True
+
+    @staticmethod
+    def reserve(product_id, warehouse_id, quantity):
+        return StockReservation._move(product_id, warehouse_id, quantity, RESERVE)
+
+    @staticmethod
+    def release(product_id, warehouse_id, quantity):
+        return StockReservation._move(product_id, warehouse_id, quantity, RELEASE)
+
+    @staticmethod
+    def commit(product_id, warehouse_id, quantity):
+        return StockReservation._move(product_id, warehouse_id, quantity, COMMIT)
+
+    @staticmethod
+    def reserve_lines(lines):
+        """lines: iterable of (product_id, warehouse_id, quantity)"""
+        return StockReservation._move_lines(lines, RESERVE)
+
+    @staticmethod
+    def release_lines(lines):
+        return StockReservation._move_lines(lines, RELEASE)
+
+    @staticmethod
+    def commit_lines(lines):
+        return StockReservation._move_lines(lines, COMMIT)
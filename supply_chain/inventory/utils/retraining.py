@@ -0,0 +1,211 @@
+import heapq
+import logging
+import time
+from datetime import date, timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from ..models import SalesHistory, DemandForecast, ForecastModelVersion
+from .forecasting import DemandForecaster
+
+logger = logging.getLogger(__name__)
+
+# Used until a series has a measured fit time
+DEFAULT_FIT_SECONDS = 5.0
+
+def evaluate_forecast_accuracy(as_of=None, lookback_days=60, batch_size=500):
+    """Fill accuracy_metrics of recent forecasts from the actuals of their elapsed days"""
+    as_of = as_of or date.today()
+    forecasts = list(DemandForecast.objects.filter(
+        forecast_date__gte=as_of - timedelta(days=lookback_days),
+        forecast_start__lt=as_of
+    ))
+    if not forecasts:
+        return 0
+
+    # One query for the actuals of every series involved
+    actuals = {}
+    for product_id, warehouse_id, sale_date, quantity in SalesHistory.objects.filter(
+        product_id__in={f.product_id for f in forecasts},
+        warehouse_id__in={f.warehouse_id for f in forecasts},
+        date__gte=min(f.forecast_start for f in forecasts),
+        date__lt=as_of
+    ).values_list('product_id', 'warehouse_id', 'date', 'quantity_sold'):
+        actuals[(product_id, warehouse_id, str(sale_date))] = quantity
+
+    evaluated = []
+    for forecast in forecasts:
+        pairs = [
+            (float(value), actuals[(forecast.product_id, forecast.warehouse_id, day)])
+            for day, value in forecast.forecast_values.items()
+            if (forecast.product_id, forecast.warehouse_id, day) in actuals
+        ]
+        if not pairs:
+            continue
+
+        predicted, actual = np.array(pairs, dtype=float).T
+        errors = np.abs(predicted - actual)
+        nonzero = actual > 0
+        forecast.accuracy_metrics = {
+            'mae': round(float(errors.mean()), 4),
+            'mape': round(float((errors[nonzero] / actual[nonzero]).mean()), 4) if nonzero.any() else None,
+            'days_evaluated': len(pairs),
+            'evaluated_on': str(as_of),
+        }
+        evaluated.append(forecast)
+
+    DemandForecast.objects.bulk_update(evaluated, ['accuracy_metrics'], batch_size=batch_size)
+    return len(evaluated)
+
+class RetrainingPolicy:
+    """
+    Decide which series' models to retrain from three signals:
+    live forecast error against the model's CV error, drift of recent demand
+    from the level it was trained on, and sales rows added since training.
+    Candidates are retrained highest priority first within a compute budget.
+    """
+    def __init__(self, budget_seconds=None, min_new_rows=None, drift_threshold=None,
+                 error_ratio_threshold=None, max_age_days=None, cross_validate=None):
+        self.budget_seconds = budget_seconds if budget_seconds is not None else getattr(settings, 'FORECAST_RETRAIN_BUDGET_SECONDS', 3600)
+        self.min_new_rows = min_new_rows if min_new_rows is not None else getattr(settings, 'FORECAST_RETRAIN_MIN_NEW_ROWS', 30)
+        self.drift_threshold = drift_threshold if drift_threshold is not None else getattr(settings, 'FORECAST_RETRAIN_DRIFT', 0.25)
+        self.error_ratio_threshold = error_ratio_threshold if error_ratio_threshold is not None else getattr(settings, 'FORECAST_RETRAIN_ERROR_RATIO', 1.25)
+        self.max_age_days = max_age_days if max_age_days is not None else getattr(settings, 'FORECAST_RETRAIN_MAX_AGE_DAYS', 90)
+        if cross_validate is None:
+            cross_validate = getattr(settings, 'FORECAST_RETRAIN_CROSS_VALIDATE', False)
+        self.cross_validate = cross_validate
+
+    def series_signals(self, as_of=None):
+        """Retraining signals for every active model version"""
+        as_of = as_of or date.today()
+
+        new_rows = SalesHistory.objects.filter(
+            product_id=OuterRef('product_id'),
+            warehouse_id=OuterRef('warehouse_id'),
+            date__gt=OuterRef('data_end')
+        ).values('product_id').annotate(rows=Count('id')).values('rows')
+
+        versions = ForecastModelVersion.objects.filter(is_active=True).annotate(
+            new_rows=Coalesce(Subquery(new_rows), 0)
+        )
+
+        recent_means = {
+            (row['product_id'], row['warehouse_id']): row['recent_mean']
+            for row in SalesHistory.objects.filter(
+                date__gte=as_of - timedelta(days=28)
+            ).values('product_id', 'warehouse_id').annotate(recent_mean=Avg('quantity_sold'))
+        }
+
+        # Most recent evaluated forecast per series and algorithm
+        live_errors = {}
+        for row in DemandForecast.objects.filter(
+            accuracy_metrics__isnull=False,
+            forecast_date__gte=as_of - timedelta(days=60)
+        ).order_by('-forecast_date').values('product_id', 'warehouse_id', 'algorithm_used', 'accuracy_metrics'):
+            key = (row['product_id'], row['warehouse_id'], row['algorithm_used'])
+            live_errors.setdefault(key, row['accuracy_metrics'].get('mae'))
+
+        signals = []
+        for version in versions:
+            metrics = version.metrics or {}
+            key = (version.product_id, version.warehouse_id)
+
+            baseline_mean = metrics.get('demand_mean')
+            recent_mean = recent_means.get(key)
+            drift = None
+            if baseline_mean is not None and recent_mean is not None:
+                drift = abs(float(recent_mean) - baseline_mean) / max(baseline_mean, 1.0)
+
+            live_mae = live_errors.get(key + (version.algorithm,))
+            cv_mae = metrics.get('avg_mae')
+            error_ratio = None
+            if live_mae is not None and cv_mae:
+                error_ratio = live_mae / cv_mae
+
+            signals.append({
+                'version': version,
+                'new_rows': version.new_rows,
+                'drift': drift,
+                'error_ratio': error_ratio,
+                'age_days': (as_of - version.trained_at.date()).days,
+                'cost_seconds': metrics.get('fit_seconds') or DEFAULT_FIT_SECONDS,
+            })
+        return signals
+
+    def priority(self, signal):
+        """Score above zero when any threshold is crossed; accuracy loss weighs most"""
+        score = 0.0
+        if signal['error_ratio'] is not None and signal['error_ratio'] >= self.error_ratio_threshold:
+            score += 2 * signal['error_ratio'] / self.error_ratio_threshold
+        if signal['drift'] is not None and signal['drift'] >= self.drift_threshold:
+            score += signal['drift'] / self.drift_threshold
+        if signal['new_rows'] >= self.min_new_rows:
+            score += 0.5 * signal['new_rows'] / self.min_new_rows
+        if signal['age_days'] >= self.max_age_days:
+            score += 0.5
+        return score
+
+    def plan(self, signals=None):
+        """Highest-priority candidates whose estimated cost fits the budget"""
+        if signals is None:
+            signals = self.series_signals()
+
+        queue = []
+        for index, signal in enumerate(signals):
+            score = self.priority(signal)
+            if score > 0:
+                heapq.heappush(queue, (-score, index, signal))
+
+        planned = []
+        remaining = self.budget_seconds
+        while queue:
+            score, _, signal = heapq.heappop(queue)
+            if signal['cost_seconds'] > remaining:
+                continue
+            remaining -= signal['cost_seconds']
+            planned.append(dict(signal, priority=round(-score, 3)))
+        return planned
+
+    def run(self, dry_run=False):
+        """Retrain planned series until the budget is spent"""
+        planned = self.plan()
+        started = time.monotonic()
+        retrained = []
+        failed = 0
+
+        for signal in planned if not dry_run else []:
+            if time.monotonic() - started >= self.budget_seconds:
+                logger.info("Retraining budget exhausted")
+                break
+            version = signal['version']
+            try:
+                forecaster = DemandForecaster(version.product_id, version.warehouse_id)
+                forecaster.train_model(version.algorithm, cross_validate=self.cross_validate)
+                retrained.append((version.product_id, version.warehouse_id, version.algorithm))
+            except Exception as e:
+                failed += 1
+                logger.error(
+                    f"Failed to retrain {version.algorithm} for product {version.product_id} "
+                    f"at warehouse {version.warehouse_id}: {str(e)}"
+                )
+
+        return {
+            'candidates': len(planned),
+            'retrained': len(retrained),
+            'failed': failed,
+            'dry_run': dry_run,
+            'seconds': round(time.monotonic() - started, 2),
+            'plan': [
+                {
+                    'product_id': s['version'].product_id,
+                    'warehouse_id': s['version'].warehouse_id,
+                    'algorithm': s['version'].algorithm,
+                    'priority': s['priority'],
+                    'new_rows': s['new_rows'],
+                    'drift': s['drift'],
+                    'error_ratio': s['error_ratio'],
+                }
+                for s in planned
+            ],
+        }
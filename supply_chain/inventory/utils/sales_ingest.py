@@ -0,0 +1,290 @@
+import csv
+import json
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+import pandas as pd
+from django.conf import settings
+from django.db import connection, models
+from ..models import Product, Warehouse, SalesHistory
+from .feature_store import FeatureStore
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+UPDATE_FIELDS = ['quantity_sold', 'revenue', 'promotion_flag', 'weather_condition', 'special_event']
+
+def parse_int(value):
+    if isinstance(value, bool):
+        raise ValueError("expected an integer")
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("expected an integer")
+    return int(value)
+
+def parse_non_negative_int(value):
+    value = parse_int(value)
+    if value < 0:
+        raise ValueError("must not be negative")
+    return value
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def parse_revenue(value):
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError("expected a number")
+    if not value.is_finite() or abs(value) >= Decimal('1e10'):
+        raise ValueError("out of range")
+    return round(value, 2)
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 't', 'yes', 'y'):
+        return True
+    if text in ('', '0', 'false', 'f', 'no', 'n'):
+        return False
+    raise ValueError("expected a boolean")
+
+def parse_text(max_length):
+    def parse(value):
+        value = str(value)
+        if len(value) > max_length:
+            raise ValueError(f"longer than {max_length} characters")
+        return value or None
+    return parse
+
+# field: (parser, required, default)
+SALES_SCHEMA = {
+    'product_id': (parse_int, True, None),
+    'warehouse_id': (parse_int, True, None),
+    'date': (parse_date, True, None),
+    'quantity_sold': (parse_non_negative_int, True, None),
+    'revenue': (parse_revenue, False, Decimal('0')),
+    'promotion_flag': (parse_bool, False, False),
+    'weather_condition': (parse_text(50), False, None),
+    'special_event': (parse_text(100), False, None),
+}
+
+def validate_sales_row(row):
+    """(cleaned values, None) or (None, {field: error}) for one incoming record"""
+    if not isinstance(row, dict):
+        return None, {'row': "expected an object"}
+    cleaned = {}
+    errors = {}
+    for field, (parse, required, default) in SALES_SCHEMA.items():
+        value = row.get(field)
+        if value is None or value == '':
+            if required:
+                errors[field] = "required"
+            else:
+                cleaned[field] = default
+            continue
+        try:
+            cleaned[field] = parse(value)
+        except (TypeError, ValueError) as e:
+            errors[field] = str(e)
+    return (None, errors) if errors else (cleaned, None)
+
+class ParseError:
+    """Placeholder for a record that could not be decoded"""
+    def __init__(self, message):
+        self.message = message
+
+def json_rows(body):
+    """Records of a JSON array, or of an object holding one under 'records'"""
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('records')
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of records")
+    return data
+
+def ndjson_rows(lines):
+    """One record per non-empty line; unparseable lines come through as errors"""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ParseError(str(e))
+
+def csv_rows(lines):
+    """Records of a CSV stream with a header row"""
+    return csv.DictReader(line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+
+def csv_chunks(path, chunk_size, skip_rows=0):
+    """DataFrames of at most chunk_size rows from a CSV file, after the first skip_rows rows"""
+    # Values stay text so they go through the same parsers as the API
+    return pd.read_csv(path, chunksize=chunk_size, dtype=str, skiprows=lambda line: 0 < line <= skip_rows)
+
+def parquet_chunks(path, chunk_size, skip_rows=0):
+    """DataFrames of at most chunk_size rows from a Parquet file, after the first skip_rows rows"""
+    if pq is None:
+        raise ValueError("reading Parquet files requires pyarrow")
+    parquet_file = pq.ParquetFile(path)
+    # Row groups wholly before the checkpoint are never read
+    row_groups = []
+    for index in range(parquet_file.num_row_groups):
+        num_rows = parquet_file.metadata.row_group(index).num_rows
+        if skip_rows >= num_rows and not row_groups:
+            skip_rows -= num_rows
+        else:
+            row_groups.append(index)
+    if not row_groups:
+        return
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=row_groups):
+        if skip_rows:
+            if skip_rows >= batch.num_rows:
+                skip_rows -= batch.num_rows
+                continue
+            batch = batch.slice(skip_rows)
+            skip_rows = 0
+        yield batch.to_pandas()
+
+def frame_records(frame, resolvers=()):
+    """
+    Records of a DataFrame chunk. resolvers: (id field, code column, {code: id}, label)
+    replacing a code column with the id it maps to; unknown codes become errors.
+    """
+    frame = frame.astype(object).where(frame.notna(), None)
+    for record in frame.to_dict('records'):
+        unknown = []
+        for id_field, column, codes, label in resolvers:
+            code = record.pop(column, None)
+            if code is None:
+                continue
+            record[id_field] = codes.get(str(code).strip())
+            if record[id_field] is None:
+                unknown.append(f"unknown {label} {code}")
+        yield ParseError('; '.join(unknown)) if unknown else record
+
+def secondary_indexes(model):
+    """Non-unique single-table indexes of a model as Index objects (unique ones back ON CONFLICT)"""
+    columns = {field.column: field.name for field in model._meta.local_fields}
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return [
+        models.Index(fields=[columns[column] for column in info['columns']], name=name)
+        for name, info in constraints.items()
+        if info['index'] and not info['unique'] and not info['primary_key']
+        and info['columns'] and all(column in columns for column in info['columns'])
+    ]
+
+@contextmanager
+def deferred_indexes(model):
+    """Drop a model's secondary indexes for a bulk load and build them again once it ends"""
+    indexes = secondary_indexes(model)
+    with connection.schema_editor() as schema_editor:
+        for index in indexes:
+            schema_editor.remove_index(model, index)
+    try:
+        yield indexes
+    finally:
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                schema_editor.add_index(model, index)
+
+class SalesIngestor:
+    """
+    Validates incoming sales records and upserts them in chunks with one
+    INSERT ... ON CONFLICT per chunk. Rows are streamed, so memory stays
+    bounded by the batch size whatever the input length. bulk_create skips
+    model signals, so the stored features of every touched series are
+    marked stale instead of being extended row by row.
+    """
+    def __init__(self, batch_size=None, max_errors=None, first_index=0):
+        self.batch_size = batch_size or getattr(settings, 'SALES_INGEST_BATCH_SIZE', 5000)
+        self.max_errors = max_errors if max_errors is not None else getattr(settings, 'SALES_INGEST_MAX_ERRORS', 1000)
+        # Index of the first record, for loads resumed part way through a file
+        self.received = first_index
+        self.upserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, index, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'index': index, 'errors': errors})
+
+    def ingest(self, rows):
+        """
+        Validate and upsert an iterable of records; returns the report.
+        If reading rows fails part way, the records read before it are still
+        written, so report() covers exactly the first `received` records.
+        """
+        chunk = []
+        try:
+            for row in rows:
+                index = self.received
+                self.received += 1
+                if isinstance(row, ParseError):
+                    self.add_error(index, {'row': row.message})
+                    continue
+                cleaned, errors = validate_sales_row(row)
+                if errors:
+                    self.add_error(index, errors)
+                    continue
+                chunk.append((index, cleaned))
+                if len(chunk) >= self.batch_size:
+                    pending, chunk = chunk, []
+                    self.write_chunk(pending)
+        finally:
+            if chunk:
+                self.write_chunk(chunk)
+        return self.report()
+
+    def write_chunk(self, chunk):
+        """Check foreign keys for the whole chunk at once, then upsert it"""
+        product_ids = set(Product.objects.filter(
+            id__in={cleaned['product_id'] for _, cleaned in chunk}
+        ).values_list('id', flat=True))
+        warehouse_ids = set(Warehouse.objects.filter(
+            id__in={cleaned['warehouse_id'] for _, cleaned in chunk}
+        ).values_list('id', flat=True))
+
+        # A later record for the same day replaces an earlier one, as with
+        # sequential updates (and ON CONFLICT cannot touch a row twice)
+        records = {}
+        for index, cleaned in chunk:
+            errors = {}
+            if cleaned['product_id'] not in product_ids:
+                errors['product_id'] = "unknown product"
+            if cleaned['warehouse_id'] not in warehouse_ids:
+                errors['warehouse_id'] = "unknown warehouse"
+            if errors:
+                self.add_error(index, errors)
+                continue
+            records[(cleaned['product_id'], cleaned['warehouse_id'], cleaned['date'])] = cleaned
+
+        if not records:
+            return
+        SalesHistory.objects.bulk_create(
+            [SalesHistory(**cleaned) for cleaned in records.values()],
+            update_conflicts=True,
+            unique_fields=['product', 'warehouse', 'date'],
+            update_fields=UPDATE_FIELDS
+        )
+        FeatureStore.mark_stale(pairs={(p, w) for p, w, _ in records})
+        self.upserted += len(records)
+
+    def report(self):
+        return {
+            'received': self.received,
+            'upserted': self.upserted,
+            'error_count': self.error_count,
+            # Foreign key errors are found a chunk later than parse errors
+            'errors': sorted(self.errors, key=lambda error: error['index']),
+        }
@@ -0,0 +1,204 @@
+import random
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from ..models import Inventory, InventoryShard
+from .stock_summary import StockSummary
+
+# Sharded (product_id, warehouse_id) pairs, reloaded every SHARDED_PAIRS_CACHE_SECONDS
+_sharded_pairs = set()
+_sharded_pairs_loaded_at = 0.0
+_sharded_pairs_lock = threading.Lock()
+
+class InventorySharding:
+    """
+    Sharded stock counters for hot product/warehouse pairs. A sharded
+    Inventory row keeps its allocated stock while its on-hand stock is spread
+    over shard_count InventoryShard rows, so concurrent reservations can each
+    take a different shard. The rebalancer folds the shards back and spreads
+    the stock evenly again.
+
+    Locks are always taken Inventory row first, then its shards by id.
+    Shard movements only queue the row's summaries; its flags, which depend
+    on every shard, are settled when StockSummary.apply_changes drains them.
+    """
+    @staticmethod
+    def is_sharded(product_id, warehouse_id):
+        """
+        Whether the pair was sharded when this process last looked. Stale for
+        up to SHARDED_PAIRS_CACHE_SECONDS, which only costs a missed fast path.
+        """
+        global _sharded_pairs_loaded_at
+        ttl = getattr(settings, 'SHARDED_PAIRS_CACHE_SECONDS', 60)
+        with _sharded_pairs_lock:
+            if time.monotonic() - _sharded_pairs_loaded_at > ttl:
+                _sharded_pairs.clear()
+                _sharded_pairs.update(
+                    Inventory.objects.filter(shard_count__gt=1).values_list('product_id', 'warehouse_id')
+                )
+                _sharded_pairs_loaded_at = time.monotonic()
+            return (int(product_id), int(warehouse_id)) in _sharded_pairs
+
+    @staticmethod
+    def clear_sharded_pairs():
+        global _sharded_pairs_loaded_at
+        with _sharded_pairs_lock:
+            _sharded_pairs.clear()
+            _sharded_pairs_loaded_at = 0.0
+
+    @staticmethod
+    def shard_inventory(inventory_id, shard_count):
+        """Turn sharding on (shard_count > 1), resize it, or off (shard_count = 1)"""
+        with transaction.atomic():
+            Inventory.objects.filter(id=inventory_id).update(shard_count=max(1, shard_count))
+            InventorySharding.rebalance_row(inventory_id)
+        InventorySharding.clear_sharded_pairs()
+
+    @staticmethod
+    def rebalance(inventory_ids=None):
+        """Rebalance every sharded row (or the given ones); returns how many were rebalanced"""
+        rows = Inventory.objects.filter(shard_count__gt=1)
+        if inventory_ids is not None:
+            rows = rows.filter(id__in=inventory_ids)
+        inventory_ids = list(rows.values_list('id', flat=True))
+        for inventory_id in inventory_ids:
+            InventorySharding.rebalance_row(inventory_id)
+        return len(inventory_ids)
+
+    @staticmethod
+    def rebalance_row(inventory_id):
+        """Fold one row's shards and spread its on-hand stock evenly over shard_count shards"""
+        with transaction.atomic():
+            inventory = Inventory.objects.select_for_update().get(id=inventory_id)
+            shards = list(InventoryShard.objects.select_for_update().filter(inventory=inventory).order_by('id'))
+            on_hand = inventory.quantity_on_hand + sum(shard.quantity_on_hand for shard in shards)
+            allocated = inventory.quantity_allocated + sum(shard.quantity_allocated for shard in shards)
+
+            count = inventory.shard_count
+            if count > 1:
+                # The first on_hand % count shards take one unit of the remainder each
+                InventoryShard.objects.bulk_create(
+                    [
+                        InventoryShard(
+                            inventory=inventory,
+                            shard=index,
+                            quantity_on_hand=on_hand // count + (1 if index < on_hand % count else 0),
+                            quantity_allocated=0
+                        )
+                        for index in range(count)
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['inventory', 'shard'],
+                    update_fields=['quantity_on_hand', 'quantity_allocated']
+                )
+                InventoryShard.objects.filter(inventory=inventory, shard__gte=count).delete()
+                base_on_hand = 0
+            else:
+                InventoryShard.objects.filter(inventory=inventory).delete()
+                base_on_hand = on_hand
+            Inventory.objects.filter(id=inventory_id).update(
+                quantity_on_hand=base_on_hand, quantity_allocated=allocated
+            )
+            # Totals are unchanged, but shard movements may have left the flags stale,
+            # and a row back to one counter has its flags follow its own columns again
+            StockSummary.refresh_flags(Inventory.objects.filter(id=inventory_id))
+            StockSummary.mark_changed([(inventory.product_id, inventory.warehouse_id)])
+
+    @staticmethod
+    def fold_locked(inventories, needed):
+        """
+        Move shard stock of already locked Inventory objects back onto them,
+        in the database and in memory, until each row holds the on-hand units
+        needed ({inventory_id: quantity}) or its shards are empty. Shards are
+        drained in id order, so callers can allocate from the row alone.
+        Totals do not change.
+        """
+        short = {
+            inventory.id: inventory for inventory in inventories
+            if inventory.shard_count > 1 and inventory.quantity_on_hand < needed.get(inventory.id, 0)
+        }
+        if not short:
+            return
+        shards = InventoryShard.objects.select_for_update().filter(
+            inventory_id__in=short, quantity_on_hand__gt=0
+        ).order_by('id')
+        for shard in shards:
+            inventory = short[shard.inventory_id]
+            taken = min(shard.quantity_on_hand, needed[inventory.id] - inventory.quantity_on_hand)
+            if taken <= 0:
+                continue
+            InventoryShard.objects.filter(id=shard.id).update(quantity_on_hand=shard.quantity_on_hand - taken)
+            inventory.quantity_on_hand += taken
+            snapshot = getattr(inventory, '_stock_snapshot', None)
+            if snapshot is not None:
+                inventory._stock_snapshot = (snapshot[0] + taken,) + snapshot[1:]
+        for inventory in short.values():
+            Inventory.objects.filter(id=inventory.id).update(quantity_on_hand=inventory.quantity_on_hand)
+
+    @staticmethod
+    def reserve(product_id, warehouse_id, quantity):
+        """Reserve from one shard picked at random, falling back to a locked multi-shard take"""
+        # On its own the shard update is the only lock taken, so the row stays
+        # free. Inside a caller's transaction (e.g. a multi-line reservation)
+        # other locks may follow, so the row is locked before its shards.
+        in_transaction = transaction.get_connection().in_atomic_block
+        with transaction.atomic():
+            if in_transaction:
+                list(Inventory.objects.select_for_update().filter(
+                    product_id=product_id, warehouse_id=warehouse_id
+                ).values_list('id', flat=True))
+            shards = list(InventoryShard.objects.filter(
+                inventory__product_id=product_id, inventory__warehouse_id=warehouse_id
+            ).values_list('id', 'quantity_on_hand'))
+            # Shards that looked big enough go first, in random order to spread the load
+            random.shuffle(shards)
+            shards.sort(key=lambda shard: shard[1] < quantity)
+
+            for shard_id, _ in shards:
+                moved = InventoryShard.objects.filter(id=shard_id, quantity_on_hand__gte=quantity).update(
+                    quantity_on_hand=F('quantity_on_hand') - quantity,
+                    quantity_allocated=F('quantity_allocated') + quantity
+                )
+                if moved:
+                    StockSummary.mark_changed([(product_id, warehouse_id)])
+                    return True
+        return InventorySharding.move_locked(product_id, warehouse_id, quantity, -1, 1, 'quantity_on_hand')
+
+    @staticmethod
+    def move_locked(product_id, warehouse_id, quantity, on_hand, allocated, required_field):
+        """
+        Move quantity units (on_hand and allocated are the per-unit changes)
+        taking from the row and then its shards, under lock. False if they
+        hold fewer than quantity units of required_field between them.
+        """
+        with transaction.atomic():
+            inventory = Inventory.objects.select_for_update().filter(
+                product_id=product_id, warehouse_id=warehouse_id
+            ).first()
+            if inventory is None:
+                return False
+            sources = [inventory] + list(
+                InventoryShard.objects.select_for_update().filter(inventory=inventory).order_by('id')
+            )
+            if sum(getattr(source, required_field) for source in sources) < quantity:
+                return False
+
+            remaining = quantity
+            for source in sources:
+                taken = min(remaining, getattr(source, required_field))
+                if not taken:
+                    continue
+                source.quantity_on_hand += on_hand * taken
+                source.quantity_allocated += allocated * taken
+                type(source).objects.filter(id=source.id).update(
+                    quantity_on_hand=source.quantity_on_hand,
+                    quantity_allocated=source.quantity_allocated
+                )
+                remaining -= taken
+                if not remaining:
+                    break
+            StockSummary.mark_changed([(product_id, warehouse_id)])
+            return True
+
@@ -0,0 +1,191 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from ..models import (
+    Inventory, InventoryShard, Product, Warehouse, ProductStockSummary, WarehouseStockSummary,
+    StockSummaryChange, STOCK_LEVEL_FIELDS
+)
+
+# Summary columns in the order of Inventory.stock_levels(), then the row count
+SUMMARY_FIELDS = (
+    'quantity_on_hand', 'quantity_allocated', 'quantity_on_order',
+    'low_stock_count', 'excess_stock_count', 'location_count'
+)
+
+class StockSummary:
+    """
+    Per-product and per-warehouse stock totals and low/excess-stock counts.
+    Inventory writes only append the pairs they touched to the
+    StockSummaryChange outbox; apply_changes recomputes the summaries of
+    those products and warehouses, so they trail Inventory by one drain.
+    """
+    @staticmethod
+    def mark_changed(pairs):
+        """Queue (product_id, warehouse_id) pairs for the next apply_changes, in one INSERT"""
+        StockSummaryChange.objects.bulk_create([
+            StockSummaryChange(product_id=product_id, warehouse_id=warehouse_id)
+            for product_id, warehouse_id in set(pairs)
+        ])
+
+    @staticmethod
+    def apply_changes(limit=50000, chunk_size=1000):
+        """
+        Drain up to limit queued changes, oldest first: settle the flags of
+        sharded rows, then recompute the summaries of every product and
+        warehouse involved. Returns the number of changes applied.
+        """
+        with transaction.atomic():
+            # Locked, so a second drain waits and then recomputes from newer data
+            changes = list(
+                StockSummaryChange.objects.select_for_update().order_by('id')
+                .values_list('id', 'product_id', 'warehouse_id')[:limit]
+            )
+            if not changes:
+                return 0
+            product_ids = sorted({product_id for _, product_id, _ in changes})
+            warehouse_ids = sorted({warehouse_id for _, _, warehouse_id in changes})
+
+            for start in range(0, len(product_ids), chunk_size):
+                # Shard movements leave flags to be settled here; only rows whose flags are off are written
+                StockSummary.refresh_flags(Inventory.objects.filter(
+                    product_id__in=product_ids[start:start + chunk_size],
+                    warehouse_id__in=warehouse_ids
+                ))
+                StockSummary.rebuild(product_ids[start:start + chunk_size], [])
+            for start in range(0, len(warehouse_ids), chunk_size):
+                StockSummary.rebuild([], warehouse_ids[start:start + chunk_size])
+
+            # Only the changes read above; ones committed meanwhile wait for the next drain
+            change_ids = [change_id for change_id, _, _ in changes]
+            for start in range(0, len(change_ids), chunk_size):
+                StockSummaryChange.objects.filter(id__in=change_ids[start:start + chunk_size]).delete()
+        return len(changes)
+
+    @staticmethod
+    def record_save(inventory, created):
+        """Queue the summaries of one saved Inventory row if its levels changed"""
+        previous = getattr(inventory, '_stock_snapshot', None)
+        current = inventory.stock_levels()
+        inventory._stock_snapshot = current
+        # A row loaded with some levels deferred has no snapshot, so it always counts as changed
+        if created or previous != current:
+            StockSummary.mark_changed([(inventory.product_id, inventory.warehouse_id)])
+
+    @staticmethod
+    def record_delete(inventory):
+        """Queue the summaries of a deleted Inventory row"""
+        StockSummary.mark_changed([(inventory.product_id, inventory.warehouse_id)])
+
+    @staticmethod
+    def refresh_flags(queryset=None):
+        """Set is_low_stock/is_excess_stock on rows whose levels were written in bulk"""
+        queryset = Inventory.objects.all() if queryset is None else queryset
+        sharded_changes = StockSummary.refresh_sharded_flags(queryset)
+
+        unsharded = queryset.filter(shard_count__lte=1)
+        low = Q(quantity_on_hand__lt=F('reorder_point'))
+        excess = Q(quantity_on_hand__gt=F('safety_stock') * 3)
+        # Only rows whose flag actually changes are written
+        return sum([
+            unsharded.filter(low, is_low_stock=False).update(is_low_stock=True),
+            unsharded.filter(~low, is_low_stock=True).update(is_low_stock=False),
+            unsharded.filter(excess, is_excess_stock=False).update(is_excess_stock=True),
+            unsharded.filter(~excess, is_excess_stock=True).update(is_excess_stock=False),
+        ]) + sum(abs(low) + abs(excess) for low, excess in sharded_changes.values())
+
+    @staticmethod
+    def refresh_sharded_flags(queryset):
+        """
+        Flags of sharded rows, which depend on stock spread over their shards.
+        Returns {(product_id, warehouse_id): (low_stock change, excess_stock change)}
+        counting only the flips this call made.
+        """
+        rows = list(queryset.filter(shard_count__gt=1).values_list(
+            'id', 'product_id', 'warehouse_id', 'quantity_on_hand',
+            'reorder_point', 'safety_stock', 'is_low_stock', 'is_excess_stock'
+        ))
+        if not rows:
+            return {}
+        shard_stock = dict(
+            InventoryShard.objects.filter(inventory_id__in=[row[0] for row in rows])
+            .values('inventory_id').annotate(total=Sum('quantity_on_hand'))
+            .values_list('inventory_id', 'total')
+        )
+
+        changes = {}
+        for inventory_id, product_id, warehouse_id, on_hand, reorder_point, safety_stock, low, excess in rows:
+            on_hand += shard_stock.get(inventory_id) or 0
+            low_change = excess_change = 0
+            if (on_hand < reorder_point) != low:
+                flipped = Inventory.objects.filter(id=inventory_id, is_low_stock=low).update(is_low_stock=not low)
+                low_change = flipped * (-1 if low else 1)
+            if (on_hand > safety_stock * 3) != excess:
+                flipped = Inventory.objects.filter(id=inventory_id, is_excess_stock=excess).update(is_excess_stock=not excess)
+                excess_change = flipped * (-1 if excess else 1)
+            changes[(product_id, warehouse_id)] = (low_change, excess_change)
+        return changes
+
+    @staticmethod
+    def summary_rows(group_field, ids=None):
+        """{id: totals in SUMMARY_FIELDS order} from one grouped query over Inventory"""
+        inventory = Inventory.objects.all()
+        if ids is not None:
+            inventory = inventory.filter(**{f'{group_field}__in': ids})
+        rows = inventory.values(group_field).annotate(
+            total_on_hand=Sum('quantity_on_hand'),
+            total_allocated=Sum('quantity_allocated'),
+            total_on_order=Sum('quantity_on_order'),
+            low_stock_count=Count('id', filter=Q(is_low_stock=True)),
+            excess_stock_count=Count('id', filter=Q(is_excess_stock=True)),
+            location_count=Count('id')
+        ).values_list(
+            group_field, 'total_on_hand', 'total_allocated', 'total_on_order',
+            'low_stock_count', 'excess_stock_count', 'location_count'
+        )
+        totals = {row[0]: [value or 0 for value in row[1:]] for row in rows}
+
+        # Stock held in shards counts towards its Inventory row
+        shards = InventoryShard.objects.all()
+        if ids is not None:
+            shards = shards.filter(**{f'inventory__{group_field}__in': ids})
+        for pk, on_hand, allocated in shards.values(f'inventory__{group_field}').annotate(
+            total_on_hand=Sum('quantity_on_hand'), total_allocated=Sum('quantity_allocated')
+        ).values_list(f'inventory__{group_field}', 'total_on_hand', 'total_allocated'):
+            totals[pk][0] += on_hand or 0
+            totals[pk][1] += allocated or 0
+        return totals
+
+    @staticmethod
+    def rebuild(product_ids=None, warehouse_ids=None, batch_size=2000):
+        """
+        Recompute summaries from Inventory. None rebuilds every product (or
+        warehouse); an empty list skips that side.
+        """
+        now = timezone.now()
+        for model, key, ids, all_ids in (
+            (ProductStockSummary, 'product_id', product_ids, Product.objects.values_list('id', flat=True)),
+            (WarehouseStockSummary, 'warehouse_id', warehouse_ids, Warehouse.objects.values_list('id', flat=True)),
+        ):
+            if ids is not None and not ids:
+                continue
+            if ids is not None:
+                # Changes can outlive the product or warehouse they were queued for
+                ids = list(all_ids.filter(id__in=ids))
+            totals = StockSummary.summary_rows(key, ids)
+            empty = [0] * len(SUMMARY_FIELDS)
+            # Ones without Inventory rows get a zero summary
+            summaries = [
+                model(updated_at=now, **{key: pk}, **dict(zip(SUMMARY_FIELDS, totals.get(pk, empty))))
+                for pk in (all_ids if ids is None else ids)
+            ]
+            model.objects.bulk_create(
+                summaries,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=[key.removesuffix('_id')],
+                update_fields=list(SUMMARY_FIELDS) + ['updated_at']
+            )
+
+def writes_stock_levels(fields):
+    """Whether a bulk write of these Inventory fields can change the summaries or flags"""
+    return bool(set(fields) & (set(STOCK_LEVEL_FIELDS) | {'reorder_point', 'safety_stock'}))
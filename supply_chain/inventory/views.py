@@ -6,10 +6,12 @@ from django.utils.decorators import method_decorator
 from django.db.models import Sum, F, Q
 from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.http import require_POST
-from .models import Product, Warehouse, Inventory, SalesHistory, DemandForecast
+from .models import Product, Warehouse, Inventory, SalesHistory, DemandForecast, WarehouseStockSummary, shard_stock
 from .utils.forecasting import DemandForecaster
 from .utils.optimizers import InventoryOptimizer
+from .utils.sales_ingest import SalesIngestor, json_rows, ndjson_rows, csv_rows
 from django.views.generic import ListView, DetailView
+import csv
 import json
 from datetime import datetime, timedelta
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -20,22 +22,29 @@ class InventoryDashboardView(LoginRequiredMixin, View):
     template_name = 'inventory/dashboard.html'
     
     def get(self, request):
-        # Get low stock items (below reorder point)
+        # Get low stock items (below reorder point), from the indexed flag
         low_stock = Inventory.objects.filter(
-            quantity_on_hand__lt=F('reorder_point')
+            is_low_stock=True
         ).select_related('product', 'warehouse')
         
         # Get excess stock items (more than 3 months supply)
         excess_stock = Inventory.objects.filter(
-            quantity_on_hand__gt=F('safety_stock')*3
+            is_excess_stock=True
         ).select_related('product', 'warehouse')
         
+        # Counts from the per-warehouse summaries rather than the inventory table
+        stock_counts = WarehouseStockSummary.objects.aggregate(
+            low=Sum('low_stock_count'), excess=Sum('excess_stock_count')
+        )
+        
         # Get recent sales
         recent_sales = SalesHistory.objects.order_by('-date')[:10]
         
         context = {
             'low_stock': low_stock,
             'excess_stock': excess_stock,
+            'low_stock_count': stock_counts['low'] or 0,
+            'excess_stock_count': stock_counts['excess'] or 0,
             'recent_sales': recent_sales,
         }
         
@@ -109,11 +118,12 @@ class ProductForecastView(LoginRequiredMixin, View):
 class InventoryOptimizationView(LoginRequiredMixin, View):
     def post(self, request):
         optimizer = InventoryOptimizer()
-        optimizer.optimize_inventory_levels()
+        summary = optimizer.optimize_inventory_levels()
         
         return JsonResponse({
             'status': 'success',
-            'message': 'Inventory optimization completed'
+            'message': 'Inventory optimization completed',
+            'summary': summary
         })
 
 class ProductListView(LoginRequiredMixin, ListView):
@@ -123,7 +133,7 @@ class ProductListView(LoginRequiredMixin, ListView):
     paginate_by = 20
     
     def get_queryset(self):
-        queryset = super().get_queryset().select_related()
+        queryset = super().get_queryset().select_related('stock_summary')
         search_query = self.request.GET.get('search')
         
         if search_query:
@@ -133,8 +143,9 @@ class ProductListView(LoginRequiredMixin, ListView):
                 Q(category__icontains=search_query)
             )
         
+        # Maintained per-product total instead of a join and GROUP BY over Inventory
         return queryset.annotate(
-            total_inventory=Sum('inventory__quantity_on_hand')
+            total_inventory=F('stock_summary__quantity_on_hand')
         ).order_by('name')
 
 class ProductDetailView(LoginRequiredMixin, DetailView):
@@ -211,8 +222,8 @@ class InventoryLevelsView(LoginRequiredMixin, View):
         ).values(
             'product__name', 'warehouse__name'
         ).annotate(
-            on_hand=Sum('quantity_on_hand'),
-            allocated=Sum('quantity_allocated'),
+            on_hand=Sum(F('quantity_on_hand') + shard_stock()),
+            allocated=Sum(F('quantity_allocated') + shard_stock('quantity_allocated')),
             reorder_point=Sum('reorder_point')
         ).order_by('product__name')
         
@@ -265,4 +276,31 @@ class SalesDataAPIView(View):
             })
             
         except Exception as e:
-            return JsonResponse({'error': str(e)}, status=400)
\ No newline at end of file
+            return JsonResponse({'error': str(e)}, status=400)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SalesBulkAPIView(View):
+    """
+    Batch sales upload: a JSON array (or {"records": [...]}), NDJSON
+    (application/x-ndjson) or CSV with a header row (text/csv). Records are
+    upserted in chunks; invalid ones are reported by their position.
+    NDJSON and CSV bodies are streamed, JSON ones are read whole (and so
+    limited by DATA_UPLOAD_MAX_MEMORY_SIZE). A body that breaks off part way
+    gets a 400 with the report of the records stored before the break.
+    """
+    def post(self, request):
+        content_type = request.content_type or 'application/json'
+        ingestor = SalesIngestor()
+        try:
+            if content_type in ('application/x-ndjson', 'application/jsonl', 'application/ndjson'):
+                rows = ndjson_rows(request)
+            elif content_type in ('text/csv', 'application/csv'):
+                rows = csv_rows(request)
+            else:
+                rows = json_rows(request.body)
+            report = ingestor.ingest(rows)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            # Earlier chunks are already stored, so the client learns where to resume
+            return JsonResponse(dict(ingestor.report(), status='error', error=str(e)), status=400)
+        
+        return JsonResponse(dict(report, status='success' if not report['error_count'] else 'partial'))
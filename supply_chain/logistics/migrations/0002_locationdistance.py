@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin_key', models.CharField(max_length=64)),
+                ('destination_key', models.CharField(max_length=64)),
+                ('method', models.CharField(max_length=50)),
+                ('distance', models.FloatField(help_text='Straight-line distance in kilometers')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['destination_key'], name='logistics_l_destina_7e0533_idx')],
+                'unique_together': {('origin_key', 'destination_key', 'method')},
+            },
+        ),
+    ]
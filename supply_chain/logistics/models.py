@@ -3,9 +3,7 @@ from django.db import models
 from inventory.models import Warehouse, Product
 from django.core.validators import MinValueValidator
 from django.db.models import Q, Sum, F
-from django.db import transaction
-from inventory.models import Inventory, Warehouse  
-from geopy.distance import geodesic 
+from logistics.utils.distance_matrix import DistanceMatrixEngine
 import datetime
 from django.utils import timezone
 
@@ -99,36 +97,17 @@ class Order(models.Model):
     
     def fulfill_order(self):
         """Attempt to fulfill the order from available inventory"""
+        from logistics.utils.fulfillment import FulfillmentEngine, FULFILLED
+        
         if self.status != 'pending':
             return False
-            
-        with transaction.atomic():
-            # Check all items are available
-            for item in self.items.all():
-                inventory = Inventory.objects.filter(
-                    product=item.product,
-                    warehouse=self.warehouse,
-                    quantity_on_hand__gte=item.quantity
-                ).first()
-                
-                if not inventory:
-                    return False
-            
-            # Allocate inventory
-            for item in self.items.all():
-                inventory = Inventory.objects.select_for_update().get(
-                    product=item.product,
-                    warehouse=self.warehouse
-                )
-                inventory.quantity_on_hand -= item.quantity
-                inventory.quantity_allocated += item.quantity
-                inventory.save()
-                item.allocated_inventory = inventory
-                item.save()
-            
-            self.status = 'processing'
-            self.save()
-            return True
+        
+        # Same locking and all-or-nothing allocation as batch fulfillment
+        result = FulfillmentEngine().fulfill([self.id])[self.id]
+        if result['status'] != FULFILLED:
+            return False
+        self.status = 'processing'
+        return True
     
     def calculate_shipping_cost(self):
         """Calculate shipping cost based on weight and distance"""
@@ -204,20 +183,12 @@ class DeliveryRoute(models.Model):
     
     def calculate_optimal_distance(self):
         """Calculate optimal distance using straight-line distances"""
-        locations = [self.warehouse] + [ro.order.customer for ro in self.routeorder_set.order_by('sequence')]
-        total_distance = 0
-        
-        for i in range(len(locations) - 1):
-            loc1 = (locations[i].latitude, locations[i].longitude)
-            loc2 = (locations[i+1].latitude, locations[i+1].longitude)
-            total_distance += geodesic(loc1, loc2).kilometers
-        
-        # Add return to warehouse
-        loc1 = (locations[-1].latitude, locations[-1].longitude)
-        loc2 = (self.warehouse.latitude, self.warehouse.longitude)
-        total_distance += geodesic(loc1, loc2).kilometers
+        route_orders = self.routeorder_set.select_related('order__customer').order_by('sequence')
+        locations = [self.warehouse] + [ro.order.customer for ro in route_orders]
+        coordinates = [(loc.latitude, loc.longitude) for loc in locations]
         
-        return total_distance
+        # Closed loop, including the return to warehouse
+        return DistanceMatrixEngine().route_length(coordinates, closed=True)
 
 class RouteOrder(models.Model):
     route = models.ForeignKey(DeliveryRoute, on_delete=models.CASCADE)
@@ -256,4 +227,18 @@ class TrafficPattern(models.Model):
         unique_together = ('location', 'day_of_week', 'time_slot')
 
     def __str__(self):
-        return f"Traffic at {self.location} on {self.get_day_of_week_display()} {self.time_slot}"
\ No newline at end of file
+        return f"Traffic at {self.location} on {self.get_day_of_week_display()} {self.time_slot}"
+
+class LocationDistance(models.Model):
+    """Cached straight-line distance between two locations, stored once per pair"""
+    origin_key = models.CharField(max_length=64)
+    destination_key = models.CharField(max_length=64)
+    method = models.CharField(max_length=50)
+    distance = models.FloatField(help_text="Straight-line distance in kilometers")
+
+    class Meta:
+        unique_together = ('origin_key', 'destination_key', 'method')
+        indexes = [models.Index(fields=['destination_key'])]
+
+    def __str__(self):
+        return f"{self.origin_key} -> {self.destination_key}: {self.distance:.2f} km"
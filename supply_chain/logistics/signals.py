@@ -0,0 +1,22 @@
+from django.db.models.signals import pre_save, post_delete
+from django.dispatch import receiver
+from inventory.models import Warehouse
+from logistics.models import Customer
+from logistics.utils.distance_cache import DistanceMatrixCache
+
+
+@receiver(pre_save, sender=Customer)
+@receiver(pre_save, sender=Warehouse)
+def invalidate_moved_location(sender, instance, **kwargs):
+    """Drop cached distances when a location's coordinates change"""
+    if instance.pk is None:
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+    if previous and previous != (instance.latitude, instance.longitude):
+        DistanceMatrixCache.invalidate(instance)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_deleted_location(sender, instance, **kwargs):
+    DistanceMatrixCache.invalidate(instance)
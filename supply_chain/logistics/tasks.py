@@ -1,45 +1,95 @@
-from celery import shared_task
+from celery import shared_task, chord
+from django.conf import settings
 from django.db.models import Q
 from logistics.models import DeliveryRoute, Order
-from logistics.utils.route_optimization import RouteOptimizer
+from logistics.utils.route_optimization import optimize_warehouse
+from logistics.utils.fulfillment import FulfillmentEngine, FULFILLED
 from datetime import date, timedelta, datetime
 from inventory.models import Warehouse 
+from supply_chain.parallel import django_process_pool
+from itertools import repeat
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def optimize_daily_routes():
-    """Optimize delivery routes for today's orders"""
+def optimize_warehouse_routes(warehouse_id, planned_date):
+    """Celery subtask: optimize one warehouse (planned_date as ISO string)"""
+    return optimize_warehouse(warehouse_id, date.fromisoformat(planned_date))
+
+@shared_task
+def summarize_route_optimizations(results):
+    """Aggregate per-warehouse summaries (chunked results arrive as nested lists)"""
+    flattened = []
+    for result in results:
+        if isinstance(result, list):
+            flattened.extend(result)
+        else:
+            flattened.append(result)
+    
+    summary = {
+        'warehouses': len(flattened),
+        'optimized': sum(1 for r in flattened if r['status'] == 'optimized'),
+        'failed': sum(1 for r in flattened if r['status'] == 'failed'),
+        'skipped': sum(1 for r in flattened if r['status'] == 'skipped'),
+        'slowest_seconds': max((r['seconds'] for r in flattened), default=0),
+        'results': flattened,
+    }
+    logger.info(
+        f"Optimized routes for {summary['optimized']} of {summary['warehouses']} warehouses "
+        f"({summary['failed']} failed)"
+    )
+    return summary
+
+@shared_task
+def optimize_daily_routes(inline=False, max_concurrency=None):
+    """
+    Optimize delivery routes for today's orders, one solve per warehouse.
+    By default warehouses fan out as Celery chunks feeding a summary chord;
+    inline=True solves them in a local process pool instead (for use outside
+    a Celery worker, whose daemon processes cannot start their own pool).
+    At most max_concurrency solves run at the same time.
+    """
     today = date.today()
-    warehouses = Warehouse.objects.filter(
+    warehouse_ids = list(Warehouse.objects.filter(
         deliveryroute__planned_date=today
-    ).distinct()
+    ).distinct().values_list('id', flat=True))
     
-    optimized_routes = 0
+    if max_concurrency is None:
+        max_concurrency = getattr(settings, 'ROUTE_OPTIMIZATION_CONCURRENCY', 4)
+    max_concurrency = max(1, min(max_concurrency, len(warehouse_ids) or 1))
     
-    for warehouse in warehouses:
-        try:
-            optimizer = RouteOptimizer(
-                warehouse.id,
-                today,
-                vehicle_type='van',
-                time_windows=True
-            )
-            result = optimizer.optimize_route()
-            
-            if result:
-                optimizer.save_optimized_route(result)
-                optimized_routes += 1
-                logger.info(
-                    f"Optimized route for warehouse {warehouse.code}"
-                )
-        except Exception as e:
-            logger.error(
-                f"Failed to optimize route for warehouse {warehouse.code}: {str(e)}"
-            )
+    if not warehouse_ids:
+        return summarize_route_optimizations([])
+    
+    if inline:
+        with django_process_pool(max_concurrency) as pool:
+            results = list(pool.map(optimize_warehouse, warehouse_ids, repeat(today)))
+        return summarize_route_optimizations(results)
     
-    return f"Optimized routes for {optimized_routes} warehouses"
+    # Splitting into max_concurrency chunks bounds how many solves run at once
+    chunk_size = math.ceil(len(warehouse_ids) / max_concurrency)
+    header = optimize_warehouse_routes.chunks(
+        [(warehouse_id, today.isoformat()) for warehouse_id in warehouse_ids],
+        chunk_size
+    ).group()
+    chord(header)(summarize_route_optimizations.s())
+    
+    num_chunks = math.ceil(len(warehouse_ids) / chunk_size)
+    return f"Dispatched route optimization for {len(warehouse_ids)} warehouses in {num_chunks} chunks"
+
+@shared_task
+def fulfill_pending_orders(warehouse_id=None, batch_size=500):
+    """Allocate inventory to every pending order, one locked batch at a time"""
+    results = FulfillmentEngine(batch_size=batch_size).fulfill_pending(warehouse_id)
+    fulfilled = sum(1 for r in results.values() if r['status'] == FULFILLED)
+    logger.info(f"Fulfilled {fulfilled} of {len(results)} pending orders")
+    return {
+        'orders': len(results),
+        'fulfilled': fulfilled,
+        'unfulfilled': [r for r in results.values() if r['status'] != FULFILLED],
+    }
 
 @shared_task
 def update_delivery_statuses():
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import tempfile
+from datetime import date
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from inventory.models import Inventory, InventoryShard
+from inventory.tests import StockSummaryAssertions, create_product, create_warehouse
+from inventory.utils.sharding import InventorySharding
+from logistics.models import Customer, DeliveryRoute, Driver, LocationDistance, Order, OrderItem, RouteOrder, Vehicle
+from logistics.utils.distance_cache import DistanceMatrixCache
+from logistics.utils.distance_matrix import DistanceMatrixEngine
+from logistics.utils.fulfillment import FulfillmentEngine, FULFILLED, INSUFFICIENT_STOCK
+from logistics.utils.route_optimization import FleetRouteOptimizer, optimize_warehouse
 
-# Create your tests here.
+
+def create_customer(name, latitude=0, longitude=0, delivery_window=None):
+    return Customer.objects.create(
+        name=name, email=f'{name.lower()}@example.com', phone='', address='',
+        latitude=latitude, longitude=longitude, preferred_delivery_window=delivery_window
+    )
+
+
+def create_order(customer, warehouse, items, status='pending', expected_delivery_date=None):
+    """items: (product, quantity) pairs"""
+    order = Order.objects.create(
+        order_number=f'ORD-{Order.objects.count() + 1}', customer=customer, warehouse=warehouse,
+        status=status, total_amount=0, shipping_cost=0, expected_delivery_date=expected_delivery_date
+    )
+    for product, quantity in items:
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=1)
+    return order
+
+
+def create_vehicle(registration, warehouse, capacity_weight=1000, capacity_volume=10, cost_per_km=None):
+    return Vehicle.objects.create(
+        registration=registration, type='van', capacity_weight=capacity_weight, capacity_volume=capacity_volume,
+        current_location=warehouse, status='available', operational_cost_per_km=cost_per_km
+    )
+
+
+def create_driver(name, warehouse):
+    return Driver.objects.create(
+        name=name, license_number=name, contact_number='', vehicle_types='van',
+        home_base=warehouse, status='available', rating=5
+    )
+
+
+class DistanceMatrixEngineTests(SimpleTestCase):
+    # (origin, destination, WGS-84 geodesic km, great-circle km at the mean Earth radius)
+    REFERENCE = [
+        ((40.7128, -74.0060), (34.0522, -118.2437), 3944.4222, 3935.7517),
+        ((51.5074, -0.1278), (48.8566, 2.3522), 343.9231, 343.5565),
+        ((40.7128, -74.0060), (40.7580, -73.9855), 5.3097, 5.3145),
+        ((-33.8688, 151.2093), (35.6762, 139.6503), 7792.1748, 7825.8294),
+    ]
+
+    def pairwise(self, method):
+        origins = [origin for origin, _, _, _ in self.REFERENCE]
+        destinations = [destination for _, destination, _, _ in self.REFERENCE]
+        return DistanceMatrixEngine(method).pairwise(origins, destinations)
+
+    def test_matches_reference_distances(self):
+        geodesic = [reference[2] for reference in self.REFERENCE]
+        great_circle = [reference[3] for reference in self.REFERENCE]
+        # Within 10 m of the geodesic; haversine matches the great circle to the metre
+        np.testing.assert_allclose(self.pairwise('ellipsoidal'), geodesic, atol=0.01)
+        np.testing.assert_allclose(self.pairwise('haversine'), great_circle, atol=0.001)
+
+    def test_matrix_and_route_length(self):
+        engine = DistanceMatrixEngine('ellipsoidal')
+        coordinates = [(40.7128, -74.0060), (40.7580, -73.9855), (34.0522, -118.2437)]
+        matrix = engine.matrix(coordinates)
+
+        self.assertEqual(matrix.shape, (3, 3))
+        np.testing.assert_array_equal(matrix, matrix.T)
+        np.testing.assert_array_equal(np.diag(matrix), 0)
+        self.assertAlmostEqual(float(matrix[0, 2]), 3944.4222, delta=0.01)
+        self.assertAlmostEqual(
+            engine.route_length(coordinates), float(matrix[0, 1] + matrix[1, 2] + matrix[2, 0]), delta=0.01
+        )
+        self.assertEqual(engine.route_length(coordinates[:1]), 0.0)
+        with self.assertRaises(ValueError):
+            DistanceMatrixEngine('manhattan')
+
+
+class DistanceMatrixCacheTests(TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1', 40.7128, -74.0060)
+        self.customers = [create_customer(f'C{i}', 40.7 + 0.01 * i, -74.0) for i in range(3)]
+        self.computed = []
+
+    def cache(self):
+        def counting(lat1, lon1, lat2, lon2):
+            self.computed.append(len(lat1))
+            return DistanceMatrixEngine('haversine').distance_func(lat1, lon1, lat2, lon2)
+        return DistanceMatrixCache(DistanceMatrixEngine(counting))
+
+    def test_pairs_are_stored_once_and_reused(self):
+        locations = [self.warehouse] + self.customers
+        first = self.cache().matrix(locations)
+        self.assertEqual((self.computed, LocationDistance.objects.count()), ([6], 6))
+        np.testing.assert_allclose(first, DistanceMatrixEngine('haversine').matrix(
+            [(location.latitude, location.longitude) for location in locations]
+        ), rtol=1e-6)
+
+        # Reordered and with one new stop, only the new stop's pairs are computed
+        extra = create_customer('C9', 40.8, -74.1)
+        second = self.cache().matrix([extra] + locations[::-1])
+        self.assertEqual(self.computed, [6, 4])
+        self.assertEqual(LocationDistance.objects.count(), 10)
+        np.testing.assert_array_equal(second[1:, 1:], first[::-1, ::-1])
+
+    def test_moved_location_is_recomputed(self):
+        self.cache().matrix([self.warehouse] + self.customers)
+        customer = self.customers[0]
+        customer.latitude = 41.0
+        customer.save()
+
+        # Saving new coordinates drops the location's pairs
+        self.assertEqual(LocationDistance.objects.count(), 3)
+        matrix = self.cache().matrix([self.warehouse] + self.customers)
+        self.assertEqual(self.computed, [6, 3])
+        self.assertGreater(matrix[0, 1], 30)
+
+
+class FulfillmentTests(StockSummaryAssertions, TestCase):
+    def setUp(self):
+        self.warehouse = create_warehouse('WH-1')
+        self.products = [create_product(f'SKU-{i}') for i in range(2)]
+        self.stock = [
+            Inventory.objects.create(
+                product=product, warehouse=self.warehouse, quantity_on_hand=10, reorder_point=4, safety_stock=2
+            )
+            for product in self.products
+        ]
+        self.customer = create_customer('Customer')
+
+    def create_order(self, *quantities):
+        return create_order(self.customer, self.warehouse, [
+            (product, quantity) for product, quantity in zip(self.products, quantities) if quantity
+        ])
+
+    def levels(self):
+        return [
+            Inventory.objects.values_list('quantity_on_hand', 'quantity_allocated').get(pk=inventory.pk)
+            for inventory in self.stock
+        ]
+
+    def test_order_is_allocated_all_or_nothing(self):
+        short = self.create_order(5, 11)
+        full = self.create_order(7, 3)
+
+        results = FulfillmentEngine().fulfill([short.id, full.id])
+
+        self.assertEqual(results[short.id]['status'], INSUFFICIENT_STOCK)
+        self.assertEqual(results[short.id]['short_items'], [
+            {'product_id': self.products[1].id, 'requested': 11, 'available': 10}
+        ])
+        self.assertEqual(results[full.id]['status'], FULFILLED)
+        self.assertEqual(self.levels(), [(3, 7), (7, 3)])
+        self.assertEqual(Order.objects.get(pk=short.pk).status, 'pending')
+        self.assertFalse(OrderItem.objects.filter(order=short, allocated_inventory__isnull=False).exists())
+        self.assertEqual(
+            set(OrderItem.objects.filter(order=full).values_list('allocated_inventory', flat=True)),
+            {inventory.id for inventory in self.stock}
+        )
+        self.assertTrue(Inventory.objects.get(pk=self.stock[0].pk).is_low_stock)
+        self.assertSummariesConsistent()
+
+    def test_repeated_order_ids_are_allocated_once(self):
+        order = self.create_order(4, 0)
+
+        results = FulfillmentEngine(batch_size=1).fulfill([order.id, order.id])
+        self.assertEqual(results[order.id]['status'], FULFILLED)
+        self.assertEqual(self.levels()[0], (6, 4))
+
+        results = FulfillmentEngine().fulfill_batch([order.id, order.id])
+        self.assertNotEqual(results[order.id]['status'], FULFILLED)
+        self.assertEqual(self.levels()[0], (6, 4))
+        self.assertSummariesConsistent()
+
+    def test_sharded_stock_is_folded_as_needed(self):
+        InventorySharding.shard_inventory(self.stock[0].id, 4)
+        InventorySharding.clear_sharded_pairs()
+        orders = [self.create_order(4, 0), self.create_order(3, 0)]
+
+        results = FulfillmentEngine().fulfill([order.id for order in orders])
+
+        self.assertEqual([results[order.id]['status'] for order in orders], [FULFILLED, FULFILLED])
+        # Shards are drained in id order and only as far as the batch needs
+        self.assertEqual(
+            list(InventoryShard.objects.filter(inventory=self.stock[0]).order_by('shard').values_list(
+                'quantity_on_hand', flat=True
+            )),
+            [0, 0, 1, 2]
+        )
+        self.assertEqual(self.levels()[0], (0, 7))
+        self.assertEqual(Inventory.objects.get(pk=self.stock[0].pk).total_on_hand(), 3)
+        self.assertSummariesConsistent()
+
+    def test_short_sharded_stock_reports_every_shard(self):
+        InventorySharding.shard_inventory(self.stock[0].id, 4)
+        InventorySharding.clear_sharded_pairs()
+        order = self.create_order(11, 0)
+
+        results = FulfillmentEngine().fulfill([order.id])
+
+        self.assertEqual(results[order.id]['status'], INSUFFICIENT_STOCK)
+        self.assertEqual(results[order.id]['short_items'][0]['available'], 10)
+        self.assertEqual(Inventory.objects.get(pk=self.stock[0].pk).total_on_hand(), 10)
+        self.assertSummariesConsistent()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ROUTE_SOLVER_TIME_LIMIT_SECONDS=1)
+class FleetRouteOptimizerTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        product = create_product('SKU-1')
+        self.warehouses = [
+            create_warehouse('NYC', 40.7128, -74.0060),
+            create_warehouse('EWR', 40.7357, -74.1724),
+        ]
+        self.orders = []
+        for warehouse in self.warehouses:
+            for i in range(2):
+                create_vehicle(f'VAN-{warehouse.code}-{i}', warehouse, capacity_weight=3)
+                create_driver(f'Driver {warehouse.code} {i}', warehouse)
+            # Five 1 kg orders per warehouse need both of its 3 kg vans
+            self.orders += [
+                create_order(
+                    create_customer(f'{warehouse.code}{i}', warehouse.latitude + 0.005 * i, warehouse.longitude),
+                    warehouse, [(product, 1)], status='processing', expected_delivery_date=self.today
+                )
+                for i in range(1, 6)
+            ]
+
+    def test_every_stop_is_routed_from_its_warehouse(self):
+        optimizer = FleetRouteOptimizer([warehouse.id for warehouse in self.warehouses], self.today)
+        results = optimizer.optimize_routes()
+
+        self.assertEqual(optimizer.dropped_orders, [])
+        self.assertEqual(len(results), 4)
+        routed = [order.id for result in results for order in result['orders']]
+        self.assertEqual(sorted(routed), sorted(order.id for order in self.orders))
+        for result in results:
+            self.assertLessEqual(len(result['orders']), 3)
+            self.assertEqual(result['vehicle'].current_location_id, result['warehouse'].id)
+            self.assertEqual(result['driver'].home_base_id, result['warehouse'].id)
+            self.assertEqual({order.warehouse_id for order in result['orders']}, {result['warehouse'].id})
+            self.assertEqual(result['route_locations'][0], result['warehouse'])
+            self.assertEqual(result['route_locations'][-1], result['warehouse'])
+
+        routes = optimizer.save_optimized_routes(results)
+        self.assertEqual(len({route.route_id for route in routes}), 4)
+        self.assertEqual(DeliveryRoute.objects.count(), 4)
+        self.assertEqual(RouteOrder.objects.count(), 10)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'shipped'})
+
+    def test_orders_over_capacity_are_dropped(self):
+        Vehicle.objects.filter(current_location=self.warehouses[1]).update(status='maintenance')
+        optimizer = FleetRouteOptimizer([warehouse.id for warehouse in self.warehouses], self.today)
+        results = optimizer.optimize_routes()
+
+        # Another warehouse's van never serves the stranded orders
+        self.assertEqual({result['warehouse'].id for result in results}, {self.warehouses[0].id})
+        self.assertEqual(
+            sorted(order.id for order in optimizer.dropped_orders),
+            sorted(order.id for order in self.orders if order.warehouse_id == self.warehouses[1].id)
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ROUTE_SOLVER_TIME_LIMIT_SECONDS=1)
+class RouteOptimizationTaskTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        product = create_product('SKU-1')
+        self.warehouses = [
+            create_warehouse('NYC', 40.7128, -74.0060),
+            create_warehouse('LA', 34.0522, -118.2437),
+        ]
+        self.orders = {}
+        for warehouse in self.warehouses:
+            create_vehicle(f'VAN-{warehouse.code}', warehouse)
+            create_driver(f'Driver {warehouse.code}', warehouse)
+            self.orders[warehouse.id] = [
+                create_order(
+                    create_customer(f'{warehouse.code}{i}', warehouse.latitude + 0.01 * i, warehouse.longitude + 0.01),
+                    warehouse, [(product, 1)], status='processing', expected_delivery_date=self.today
+                )
+                for i in range(1, 3)
+            ]
+
+    def test_each_warehouse_saves_its_route(self):
+        # Both solves finish within the same second, as they do in the fan-out
+        results = [optimize_warehouse(warehouse.id, self.today) for warehouse in self.warehouses]
+
+        self.assertEqual([result['status'] for result in results], ['optimized', 'optimized'], results)
+        self.assertEqual(len({result['route_id'] for result in results}), 2)
+        for warehouse in self.warehouses:
+            route_orders = RouteOrder.objects.filter(route__warehouse=warehouse).order_by('sequence')
+            self.assertEqual(
+                sorted(route_order.order_id for route_order in route_orders),
+                sorted(order.id for order in self.orders[warehouse.id])
+            )
+            self.assertEqual([route_order.sequence for route_order in route_orders], [1, 2])
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'shipped'})
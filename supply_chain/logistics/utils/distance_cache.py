@@ -0,0 +1,91 @@
+import hashlib
+import numpy as np
+from django.db.models import Q
+from logistics.models import LocationDistance
+from logistics.utils.distance_matrix import DistanceMatrixEngine
+
+
+def location_key(location):
+    """Cache key for a Warehouse or Customer: model, id and a hash of its coordinates"""
+    coordinates = f"{location.latitude:.6f},{location.longitude:.6f}"
+    coordinate_hash = hashlib.sha1(coordinates.encode()).hexdigest()[:12]
+    return f"{location._meta.model_name}:{location.pk}:{coordinate_hash}"
+
+
+class DistanceMatrixCache:
+    """
+    Persistent pairwise distance store in front of DistanceMatrixEngine.
+    Pairs are read back in tiles of sorted keys and only missing pairs are computed.
+    """
+    TILE_SIZE = 500
+
+    def __init__(self, engine=None):
+        self.engine = engine or DistanceMatrixEngine()
+        method = self.engine.method
+        self.method = method if isinstance(method, str) else method.__name__
+
+    def matrix(self, locations):
+        """Symmetric float32 distance matrix (km) for the given locations"""
+        keys = [location_key(loc) for loc in locations]
+        coordinates = np.array(
+            [(loc.latitude, loc.longitude) for loc in locations], dtype=np.float64
+        ).reshape(-1, 2)
+        num_locations = len(keys)
+
+        distance_matrix = np.full((num_locations, num_locations), np.nan, dtype=np.float32)
+        np.fill_diagonal(distance_matrix, 0)
+        positions = {key: i for i, key in enumerate(keys)}
+
+        # Pairs are stored with origin_key < destination_key, so tiling the
+        # sorted keys and reading tile pairs (a, b) with a <= b covers every pair
+        sorted_keys = sorted(positions)
+        tiles = [
+            sorted_keys[i:i + self.TILE_SIZE]
+            for i in range(0, len(sorted_keys), self.TILE_SIZE)
+        ]
+        for a, origin_tile in enumerate(tiles):
+            for destination_tile in tiles[a:]:
+                cached = LocationDistance.objects.filter(
+                    method=self.method,
+                    origin_key__in=origin_tile,
+                    destination_key__in=destination_tile
+                ).values_list('origin_key', 'destination_key', 'distance')
+                for origin_key, destination_key, distance in cached:
+                    i, j = positions[origin_key], positions[destination_key]
+                    distance_matrix[i, j] = distance_matrix[j, i] = distance
+
+        # Compute and store whatever is still missing
+        rows, cols = np.nonzero(np.isnan(np.triu(distance_matrix)))
+        if len(rows):
+            distances = self.engine.pairwise(coordinates[rows], coordinates[cols])
+            distance_matrix[rows, cols] = distances
+            distance_matrix[cols, rows] = distances
+
+            new_entries = {}
+            for i, j, distance in zip(rows.tolist(), cols.tolist(), distances.tolist()):
+                origin_key, destination_key = sorted((keys[i], keys[j]))
+                if origin_key != destination_key:
+                    new_entries[(origin_key, destination_key)] = distance
+            LocationDistance.objects.bulk_create(
+                [
+                    LocationDistance(
+                        origin_key=origin_key,
+                        destination_key=destination_key,
+                        method=self.method,
+                        distance=distance
+                    )
+                    for (origin_key, destination_key), distance in new_entries.items()
+                ],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+
+        return distance_matrix
+
+    @staticmethod
+    def invalidate(location):
+        """Drop every cached pair involving a location, whatever its coordinates were"""
+        prefix = f"{location._meta.model_name}:{location.pk}:"
+        return LocationDistance.objects.filter(
+            Q(origin_key__startswith=prefix) | Q(destination_key__startswith=prefix)
+        ).delete()[0]
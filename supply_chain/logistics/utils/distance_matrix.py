@@ -0,0 +1,104 @@
+import numpy as np
+from django.conf import settings
+
+# Mean Earth radius in km (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+
+
+def haversine_distances(lat1, lon1, lat2, lon2):
+    """Great-circle distances in km between paired arrays of coordinates (degrees)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def ellipsoidal_distances(lat1, lon1, lat2, lon2):
+    """
+    Distances in km on the WGS-84 ellipsoid using Lambert's formula.
+    Non-iterative, so it vectorizes cleanly; accurate to ~10m at city scales.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+
+    # Reduced latitudes
+    beta1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    beta2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+
+    # Central angle between the reduced points
+    a = (
+        np.sin((beta2 - beta1) / 2) ** 2
+        + np.cos(beta1) * np.cos(beta2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    p = (beta1 + beta2) / 2
+    q = (beta2 - beta1) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / np.cos(sigma / 2) ** 2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / np.sin(sigma / 2) ** 2
+        distances = WGS84_A_KM * (sigma - WGS84_F / 2 * (x + y))
+
+    # Coincident points divide by zero above
+    return np.where(sigma > 0, distances, 0.0)
+
+
+DISTANCE_METHODS = {
+    'haversine': haversine_distances,
+    'ellipsoidal': ellipsoidal_distances,
+}
+
+
+class DistanceMatrixEngine:
+    """Batched distance computations between (latitude, longitude) points"""
+
+    def __init__(self, method=None):
+        if method is None:
+            method = getattr(settings, 'ROUTE_DISTANCE_METHOD', 'haversine')
+        if callable(method):
+            self.distance_func = method
+        elif method in DISTANCE_METHODS:
+            self.distance_func = DISTANCE_METHODS[method]
+        else:
+            raise ValueError(f"Unsupported distance method: {method}")
+        self.method = method
+
+    @staticmethod
+    def _as_coordinates(coordinates):
+        coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        return coords[:, 0], coords[:, 1]
+
+    def pairwise(self, origins, destinations):
+        """Distances between origins[i] and destinations[i] as a float32 array"""
+        lat1, lon1 = self._as_coordinates(origins)
+        lat2, lon2 = self._as_coordinates(destinations)
+        return self.distance_func(lat1, lon1, lat2, lon2).astype(np.float32)
+
+    def matrix(self, coordinates):
+        """Full symmetric n x n distance matrix as a float32 array"""
+        lats, lons = self._as_coordinates(coordinates)
+        num_locations = len(lats)
+        distance_matrix = np.zeros((num_locations, num_locations), dtype=np.float32)
+        if num_locations < 2:
+            return distance_matrix
+
+        # Only the upper triangle is computed, then mirrored
+        rows, cols = np.triu_indices(num_locations, k=1)
+        distances = self.distance_func(lats[rows], lons[rows], lats[cols], lons[cols])
+        distance_matrix[rows, cols] = distances
+        distance_matrix[cols, rows] = distances
+        return distance_matrix
+
+    def route_length(self, coordinates, closed=True):
+        """Total length of a path visiting coordinates in order"""
+        coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        if len(coords) < 2:
+            return 0.0
+        if closed:
+            coords = np.vstack([coords, coords[:1]])
+        legs = self.distance_func(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+        return float(legs.sum())
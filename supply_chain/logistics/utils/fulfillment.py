@@ -0,0 +1,173 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+from inventory.models import Inventory
+from inventory.utils.sharding import InventorySharding
+from inventory.utils.stock_summary import StockSummary
+from logistics.models import Order, OrderItem
+
+FULFILLED = 'fulfilled'
+INSUFFICIENT_STOCK = 'insufficient_stock'
+NOT_PENDING = 'not_pending'
+NO_WAREHOUSE = 'no_warehouse'
+
+
+class FulfillmentEngine:
+    """
+    Fulfills pending orders in batches. Each batch locks its orders and every
+    Inventory row they draw from with one ordered SELECT ... FOR UPDATE
+    (always in id order, so concurrent batches cannot deadlock), then the
+    shards it needs stock from, allocates in memory and writes everything
+    back with bulk updates.
+    """
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+
+    def fulfill(self, order_ids):
+        """{order_id: result} for every order id, processed in batches"""
+        # A repeated id would be allocated twice, or reported not pending by a later batch
+        order_ids = list(dict.fromkeys(order_ids))
+        results = {}
+        for start in range(0, len(order_ids), self.batch_size):
+            results.update(self.fulfill_batch(order_ids[start:start + self.batch_size]))
+        return results
+
+    def fulfill_pending(self, warehouse_id=None):
+        """Fulfill every pending order, oldest first"""
+        pending = Order.objects.filter(status='pending')
+        if warehouse_id is not None:
+            pending = pending.filter(warehouse_id=warehouse_id)
+        return self.fulfill(pending.order_by('order_date', 'id').values_list('id', flat=True))
+
+    @staticmethod
+    def lock_inventory(pairs):
+        """{(product_id, warehouse_id): Inventory} for the given pairs, locked in id order"""
+        if not pairs:
+            return {}
+        by_warehouse = defaultdict(set)
+        for product_id, warehouse_id in pairs:
+            by_warehouse[warehouse_id].add(product_id)
+        condition = reduce(or_, (
+            Q(warehouse_id=warehouse_id, product_id__in=product_ids)
+            for warehouse_id, product_ids in by_warehouse.items()
+        ))
+        return {
+            (inventory.product_id, inventory.warehouse_id): inventory
+            for inventory in Inventory.objects.select_for_update().filter(condition).order_by('id')
+        }
+
+    def fulfill_batch(self, order_ids):
+        """Allocate one batch inside a single transaction"""
+        order_ids = list(dict.fromkeys(order_ids))
+        results = {order_id: {'order_id': order_id, 'status': NOT_PENDING} for order_id in order_ids}
+
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update()
+                .filter(id__in=order_ids, status='pending')
+                .order_by('id')
+                .values_list('id', 'warehouse_id')
+            )
+            warehouses = dict(orders)
+
+            # Requested quantity per order and product (an order may repeat a product)
+            items = defaultdict(list)
+            requested = defaultdict(lambda: defaultdict(int))
+            for item_id, order_id, product_id, quantity in OrderItem.objects.filter(
+                order_id__in=warehouses
+            ).values_list('id', 'order_id', 'product_id', 'quantity'):
+                items[order_id].append((item_id, product_id))
+                requested[order_id][product_id] += quantity
+
+            stock = self.lock_inventory({
+                (product_id, warehouses[order_id])
+                for order_id, quantities in requested.items() if warehouses[order_id] is not None
+                for product_id in quantities
+            })
+            # Enough stock of sharded rows for the whole batch is gathered back onto
+            # the row it is allocated from
+            needed = defaultdict(int)
+            for order_id, quantities in requested.items():
+                for product_id, quantity in quantities.items():
+                    if (product_id, warehouses[order_id]) in stock:
+                        needed[stock[(product_id, warehouses[order_id])].id] += quantity
+            InventorySharding.fold_locked(stock.values(), needed)
+
+            # Orders are served in the order given, each one all or nothing
+            allocated_orders = []
+            allocated_items = defaultdict(list)
+            allocated = defaultdict(int)
+            for order_id in order_ids:
+                if order_id not in warehouses:
+                    continue
+                warehouse_id = warehouses[order_id]
+                if warehouse_id is None:
+                    results[order_id]['status'] = NO_WAREHOUSE
+                    continue
+
+                short = [
+                    {
+                        'product_id': product_id,
+                        'requested': quantity,
+                        'available': stock[(product_id, warehouse_id)].quantity_on_hand
+                        if (product_id, warehouse_id) in stock else 0
+                    }
+                    for product_id, quantity in requested[order_id].items()
+                    if (product_id, warehouse_id) not in stock
+                    or stock[(product_id, warehouse_id)].quantity_on_hand < quantity
+                ]
+                if short:
+                    results[order_id].update(status=INSUFFICIENT_STOCK, short_items=short)
+                    continue
+
+                for product_id, quantity in requested[order_id].items():
+                    inventory = stock[(product_id, warehouse_id)]
+                    inventory.quantity_on_hand -= quantity
+                    inventory.quantity_allocated += quantity
+                    allocated[inventory.id] += quantity
+                allocated_items[warehouse_id].extend(item_id for item_id, _ in items[order_id])
+                allocated_orders.append(order_id)
+                results[order_id]['status'] = FULFILLED
+
+            if allocated:
+                self.write_allocations(stock, allocated, allocated_items)
+            if allocated_orders:
+                Order.objects.filter(id__in=allocated_orders).update(status='processing')
+
+        return results
+
+    @staticmethod
+    def write_allocations(stock, allocated, allocated_items):
+        """
+        Write a batch's allocations: rows taking the same quantity share one
+        F() update, and order items are linked with one update per warehouse.
+        """
+        now = timezone.now()
+        by_quantity = defaultdict(list)
+        for inventory_id, quantity in allocated.items():
+            by_quantity[quantity].append(inventory_id)
+        for quantity, inventory_ids in by_quantity.items():
+            Inventory.objects.filter(id__in=inventory_ids).update(
+                quantity_on_hand=F('quantity_on_hand') - quantity,
+                quantity_allocated=F('quantity_allocated') + quantity,
+                last_updated=now
+            )
+        # Queryset updates skip save(); the rows are already locked here, and
+        # summaries are only queued, so no other row is locked
+        allocated_rows = Inventory.objects.filter(id__in=allocated)
+        StockSummary.refresh_flags(allocated_rows)
+        StockSummary.mark_changed(
+            (inventory.product_id, inventory.warehouse_id) for inventory in stock.values() if inventory.id in allocated
+        )
+
+        for warehouse_id, item_ids in allocated_items.items():
+            OrderItem.objects.filter(id__in=item_ids).update(
+                allocated_inventory=Subquery(
+                    Inventory.objects.filter(
+                        product_id=OuterRef('product_id'), warehouse_id=warehouse_id
+                    ).values('id')[:1]
+                )
+            )
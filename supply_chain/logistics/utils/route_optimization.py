@@ -1,33 +1,63 @@
 import numpy as np
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
-from geopy.distance import geodesic
 import polyline
 import folium
 from datetime import datetime, timedelta
+import logging
 import os
+import time
 from django.conf import settings
+from django.db import transaction
 import json
 from inventory.models import Warehouse
 from logistics.models import Order, Vehicle, Driver, DeliveryRoute, RouteOrder
+from logistics.utils.distance_matrix import DistanceMatrixEngine
+from logistics.utils.distance_cache import DistanceMatrixCache
+
+logger = logging.getLogger(__name__)
+
+# Multiplier from straight-line to road distance (typically 1.2-1.5)
+ROAD_DISTANCE_FACTOR = 1.3
+
+# Planning horizon: one 8-hour shift starting at 8am, in minutes
+SHIFT_START_MINUTES = 8 * 60
+SHIFT_LENGTH_MINUTES = 8 * 60
+
+# Capacity dimensions need integers: weight in 100 g units, volume in litres
+WEIGHT_SCALE = 10
+VOLUME_SCALE = 1000
+
+# Fleet mode: cost per km for vehicles without operational_cost_per_km, and the
+# penalty for leaving an order unrouted (high enough to only drop when infeasible)
+DEFAULT_COST_PER_KM = 1.0
+DROPPED_ORDER_PENALTY = 10_000_000
 
 class RouteOptimizer:
-    def __init__(self, warehouse_id, date, vehicle_type='van', time_windows=True):
+    def __init__(self, warehouse_id, date, vehicle_type='van', time_windows=True,
+                 distance_method=None, cache_distances=None):
         self.warehouse = Warehouse.objects.get(pk=warehouse_id)
         self.date = date
         self.vehicle_type = vehicle_type
         self.time_windows = time_windows
+        self._setup_distance_engine(distance_method, cache_distances)
         self.orders = self._get_orders()
         self.customers = self._get_customers()
         self.vehicle = self._get_vehicle()
         self.driver = self._get_driver()
         
+    def _setup_distance_engine(self, distance_method, cache_distances):
+        self.distance_engine = DistanceMatrixEngine(distance_method)
+        if cache_distances is None:
+            cache_distances = getattr(settings, 'ROUTE_DISTANCE_CACHE', True)
+        self.distance_cache = DistanceMatrixCache(self.distance_engine) if cache_distances else None
+        
     def _get_orders(self):
         return Order.objects.filter(
             warehouse_id=self.warehouse.id,
             status__in=['processing', 'packed'],
             expected_delivery_date=self.date
-        ).prefetch_related('items', 'customer')
+        ).select_related('customer').prefetch_related('items__product')
     
     def _get_customers(self):
         return {order.customer for order in self.orders}
@@ -46,24 +76,21 @@ class RouteOptimizer:
             vehicle_types__contains=self.vehicle_type
         ).first()
     
-    def create_distance_matrix(self):
+    def create_distance_matrix(self, locations=None):
         """Create distance matrix with realistic road distances (simplified)"""
-        locations = [self.warehouse] + list(self.customers)
-        num_locations = len(locations)
-        distance_matrix = np.zeros((num_locations, num_locations))
+        if locations is None:
+            locations = [self.warehouse] + list(self.customers)
+        
+        # Persisted pairs are reused; only new location pairs are computed
+        if self.distance_cache:
+            straight_distances = self.distance_cache.matrix(locations)
+        else:
+            coordinates = [(loc.latitude, loc.longitude) for loc in locations]
+            straight_distances = self.distance_engine.matrix(coordinates)
         
         # Straight-line distances multiplied by a factor to simulate road distances
-        for i in range(num_locations):
-            for j in range(num_locations):
-                if i == j:
-                    distance_matrix[i][j] = 0
-                else:
-                    loc1 = (locations[i].latitude, locations[i].longitude)
-                    loc2 = (locations[j].latitude, locations[j].longitude)
-                    straight_distance = geodesic(loc1, loc2).kilometers
-                    # Multiply by road distance factor (typically 1.2-1.5)
-                    distance_matrix[i][j] = straight_distance * 1.3
-                    
+        distance_matrix = straight_distances * ROAD_DISTANCE_FACTOR
+        
         return distance_matrix, locations
     
     def create_time_matrix(self, distance_matrix):
@@ -97,28 +124,58 @@ class RouteOptimizer:
         time_windows = []
         
         # Warehouse time window (open hours)
-        time_windows.append((0, 8*60))  # 8 hours (e.g., 8am-4pm)
+        time_windows.append((0, SHIFT_LENGTH_MINUTES))  # 8 hours (e.g., 8am-4pm)
         
         # Customer time windows
         for customer in locations[1:]:
-            if customer.preferred_delivery_window:
-                # Parse preferred window (format like "9:00-12:00")
-                start, end = customer.preferred_delivery_window.split('-')
-                start_h, start_m = map(int, start.split(':'))
-                end_h, end_m = map(int, end.split(':'))
-                time_windows.append((
-                    start_h * 60 + start_m,
-                    end_h * 60 + end_m
-                ))
-            else:
-                # Default window (9am-5pm)
-                time_windows.append((9*60, 17*60))
+            time_windows.append(self._customer_time_window(customer))
         
         return time_windows
     
+    def _customer_time_window(self, customer):
+        """Customer delivery window in minutes since the start of the shift"""
+        if not customer.preferred_delivery_window:
+            # Default window (9am-5pm)
+            start, end = 9*60, 17*60
+        else:
+            # Parse preferred window (format like "9:00-12:00")
+            window_start, window_end = customer.preferred_delivery_window.split('-')
+            start_h, start_m = map(int, window_start.split(':'))
+            end_h, end_m = map(int, window_end.split(':'))
+            start, end = start_h * 60 + start_m, end_h * 60 + end_m
+        
+        # Clip to the shift; windows entirely outside it fall back to the whole shift
+        start = max(0, start - SHIFT_START_MINUTES)
+        end = min(SHIFT_LENGTH_MINUTES, end - SHIFT_START_MINUTES)
+        if start > end:
+            return (0, SHIFT_LENGTH_MINUTES)
+        return (start, end)
+    
+    def _order_load(self, order):
+        """Scaled integer (weight, volume) carried for an order"""
+        weight = sum(float(item.product.weight) * item.quantity for item in order.items.all())
+        volume = sum(item.product.dimensions_volume() * item.quantity for item in order.items.all())
+        return int(np.ceil(weight * WEIGHT_SCALE)), int(np.ceil(volume * VOLUME_SCALE))
+    
+    def create_demand_arrays(self, node_orders):
+        """
+        Integer weight and volume demand per node, computed once before solving
+        so the solver reads plain arrays instead of walking orders and items
+        """
+        loads = np.zeros((len(node_orders), 2), dtype=np.int64)
+        for node, orders in enumerate(node_orders):
+            for order in orders:
+                loads[node] += self._order_load(order)
+        return loads[:, 0].tolist(), loads[:, 1].tolist()
+    
+    @staticmethod
+    def create_transit_matrix(matrix, scale=1):
+        """Integer node-to-node transit matrix for OR-Tools"""
+        return np.rint(np.asarray(matrix, dtype=np.float64) * scale).astype(np.int64).tolist()
+    
     def optimize_route(self):
         """Optimize delivery route using OR-Tools"""
-        if not self.orders or not self.customers:
+        if not self.orders or not self.customers or not self.vehicle:
             return None
             
         distance_matrix, locations = self.create_distance_matrix()
@@ -136,13 +193,18 @@ class RouteOptimizer:
         # Create routing model
         routing = pywrapcp.RoutingModel(manager)
         
+        # Precompute integer transit and demand arrays so the solver never
+        # calls back into Python
+        time_costs = self.create_transit_matrix(time_matrix)
+        orders_by_customer = {}
+        for order in self.orders:
+            orders_by_customer.setdefault(order.customer_id, []).append(order)
+        weight_demands, volume_demands = self.create_demand_arrays(
+            [[]] + [orders_by_customer.get(customer.id, []) for customer in locations[1:]]
+        )
+        
         # Define cost of each arc (time in this case)
-        def time_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return int(time_matrix[from_node][to_node])
-            
-        transit_callback_index = routing.RegisterTransitCallback(time_callback)
+        transit_callback_index = routing.RegisterTransitMatrix(time_costs)
         routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
         
         # Add time dimension
@@ -150,7 +212,7 @@ class RouteOptimizer:
         routing.AddDimension(
             transit_callback_index,
             30,  # allow waiting time
-            8*60,  # maximum time per vehicle (8 hours)
+            SHIFT_LENGTH_MINUTES,  # maximum time per vehicle (8 hours)
             False,  # Don't force start cumul to zero
             time)
         time_dimension = routing.GetDimensionOrDie(time)
@@ -165,36 +227,20 @@ class RouteOptimizer:
                 time_dimension.CumulVar(index).SetRange(time_window[0], time_window[1])
         
         # Add capacity constraints (weight and volume)
-        def weight_callback(from_index):
-            from_node = manager.IndexToNode(from_index)
-            if from_node == depot:
-                return 0
-            customer = locations[from_node]
-            order = next(o for o in self.orders if o.customer == customer)
-            return sum(item.product.weight * item.quantity for item in order.items.all())
-            
-        weight_callback_index = routing.RegisterUnaryTransitCallback(weight_callback)
+        weight_callback_index = routing.RegisterUnaryTransitVector(weight_demands)
         routing.AddDimensionWithVehicleCapacity(
             weight_callback_index,
             0,  # null capacity slack
-            [self.vehicle.capacity_weight],  # vehicle maximum capacities
+            [int(self.vehicle.capacity_weight * WEIGHT_SCALE)],  # vehicle maximum capacities
             True,  # start cumul to zero
             'Weight')
             
         # Similar for volume capacity
-        def volume_callback(from_index):
-            from_node = manager.IndexToNode(from_index)
-            if from_node == depot:
-                return 0
-            customer = locations[from_node]
-            order = next(o for o in self.orders if o.customer == customer)
-            return sum(item.product.dimensions_volume() * item.quantity for item in order.items.all())
-            
-        volume_callback_index = routing.RegisterUnaryTransitCallback(volume_callback)
+        volume_callback_index = routing.RegisterUnaryTransitVector(volume_demands)
         routing.AddDimensionWithVehicleCapacity(
             volume_callback_index,
             0,  # null capacity slack
-            [self.vehicle.capacity_volume],  # vehicle maximum capacities
+            [int(self.vehicle.capacity_volume * VOLUME_SCALE)],  # vehicle maximum capacities
             True,  # start cumul to zero
             'Volume')
         
@@ -204,7 +250,7 @@ class RouteOptimizer:
             routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
         search_parameters.local_search_metaheuristic = (
             routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
-        search_parameters.time_limit.seconds = 30
+        search_parameters.time_limit.seconds = getattr(settings, 'ROUTE_SOLVER_TIME_LIMIT_SECONDS', 30)
         
         # Solve the problem
         solution = routing.SolveWithParameters(search_parameters)
@@ -239,8 +285,8 @@ class RouteOptimizer:
         
         return {
             'route_locations': route_locations,
-            'route_distance': round(route_distance, 2),
-            'route_time': round(route_time, 2),
+            'route_distance': round(float(route_distance), 2),
+            'route_time': round(float(route_time), 2),
             'route_map': route_map,
             'route_path': route_path,
             'vehicle': self.vehicle,
@@ -248,23 +294,25 @@ class RouteOptimizer:
             'orders': self.orders
         }
     
-    def _create_route_map(self, route_locations):
+    def _create_route_map(self, route_locations, depot=None, name_suffix=''):
         """Create interactive Folium map of the route"""
         if not route_locations:
             return None
+        
+        depot = depot or self.warehouse
             
         # Create map centered on warehouse
         m = folium.Map(
-            location=[self.warehouse.latitude, self.warehouse.longitude],
+            location=[depot.latitude, depot.longitude],
             zoom_start=12,
             tiles='cartodbpositron'
         )
         
         # Add warehouse marker
         folium.Marker(
-            [self.warehouse.latitude, self.warehouse.longitude],
-            popup=f"<b>Warehouse:</b> {self.warehouse.name}<br>"
-                  f"<b>Address:</b> {self.warehouse.address}",
+            [depot.latitude, depot.longitude],
+            popup=f"<b>Warehouse:</b> {depot.name}<br>"
+                  f"<b>Address:</b> {depot.address}",
             icon=folium.Icon(color='green', icon='warehouse', prefix='fa')
         ).add_to(m)
         
@@ -301,7 +349,7 @@ class RouteOptimizer:
         # Save map to HTML file
         map_dir = os.path.join(settings.MEDIA_ROOT, 'routes')
         os.makedirs(map_dir, exist_ok=True)
-        map_filename = f"route_{self.date}_{self.warehouse.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.html"
+        map_filename = f"route_{self.date}_{depot.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{name_suffix}.html"
         map_path = os.path.join(map_dir, map_filename)
         m.save(map_path)
         
@@ -311,41 +359,43 @@ class RouteOptimizer:
         """Save optimized route to database"""
         if not optimization_result:
             return None
-            
-        route = DeliveryRoute(
-            route_id=f"ROUTE-{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            warehouse=self.warehouse,
-            vehicle=self.vehicle,
-            driver=self.driver,
-            planned_date=self.date,
-            status='planned',
-            total_distance=optimization_result['route_distance'],
-            estimated_duration=optimization_result['route_time'],
-            route_path=optimization_result['route_path'],
-            map_url=optimization_result['route_map']
-        )
-        route.save()
         
-        # Add orders to route
+        # Warehouses solved in parallel can finish within the same second
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         customer_order_map = {order.customer_id: order for order in self.orders}
-        
-        for i, location in enumerate(optimization_result['route_locations']):
-            if hasattr(location, 'id') and location.id in customer_order_map:
-                order = customer_order_map[location.id]
-                RouteOrder.objects.create(
+        route_locations = optimization_result['route_locations']
+        
+        with transaction.atomic():
+            route = DeliveryRoute.objects.create(
+                route_id=f"ROUTE-{timestamp}-{self.warehouse.id}",
+                warehouse=self.warehouse,
+                vehicle=self.vehicle,
+                driver=self.driver,
+                planned_date=self.date,
+                status='planned',
+                total_distance=optimization_result['route_distance'],
+                estimated_duration=optimization_result['route_time'],
+                route_path=optimization_result['route_path']
+            )
+            
+            # Add orders to route (the depot is the first and last location)
+            route_orders = [
+                RouteOrder(
                     route=route,
-                    order=order,
+                    order=customer_order_map[location.id],
                     sequence=i,
                     delivery_status='processing',
                     estimated_arrival=self._calculate_estimated_arrival(
-                        optimization_result['route_time'],
-                        i,
-                        len(optimization_result['route_locations'])
+                        optimization_result['route_time'], i, len(route_locations)
                     )
                 )
-                # Update order status
-                order.status = 'shipped'
-                order.save()
+                for i, location in enumerate(route_locations[1:-1], start=1)
+                if location.id in customer_order_map
+            ]
+            RouteOrder.objects.bulk_create(route_orders)
+            
+            # Update order status
+            Order.objects.filter(pk__in=[ro.order.pk for ro in route_orders]).update(status='shipped')
         
         return route
     
@@ -355,8 +405,304 @@ class RouteOptimizer:
         proportion = (stop_number + 1) / total_stops
         estimated_minutes = proportion * total_route_time
         
-        # Create datetime for today at 9am (default start time)
-        arrival_time = datetime.combine(self.date, datetime.min.time()) + timedelta(hours=9)
+        # Routes start at the beginning of the shift, like the time windows
+        arrival_time = datetime.combine(self.date, datetime.min.time()) + timedelta(minutes=SHIFT_START_MINUTES)
         arrival_time += timedelta(minutes=estimated_minutes)
         
-        return arrival_time
\ No newline at end of file
+        return arrival_time
+
+class FleetRouteOptimizer(RouteOptimizer):
+    """
+    Multi-vehicle, multi-depot routing. Every available vehicle at the given
+    warehouses is solved in a single OR-Tools model, each starting and ending at
+    its own warehouse with its own capacities and cost per km.
+    """
+    def __init__(self, warehouse_ids, date, vehicle_type=None, time_windows=True,
+                 distance_method=None, cache_distances=None):
+        if isinstance(warehouse_ids, (int, str)):
+            warehouse_ids = [warehouse_ids]
+        self.warehouses = list(Warehouse.objects.filter(pk__in=warehouse_ids).order_by('id'))
+        if not self.warehouses:
+            raise Warehouse.DoesNotExist("No matching warehouses")
+        self.warehouse = self.warehouses[0]
+        self.date = date
+        self.vehicle_type = vehicle_type
+        self.time_windows = time_windows
+        self._setup_distance_engine(distance_method, cache_distances)
+        self.orders = self._get_orders()
+        self.customers = self._get_customers()
+        self.vehicles = self._get_vehicles()
+        self.drivers = self._get_drivers()
+        self.dropped_orders = []
+    
+    def _get_orders(self):
+        return list(Order.objects.filter(
+            warehouse__in=self.warehouses,
+            status__in=['processing', 'packed'],
+            expected_delivery_date=self.date
+        ).select_related('customer').prefetch_related('items__product').order_by('id'))
+    
+    def _get_vehicles(self):
+        vehicles = Vehicle.objects.filter(
+            current_location__in=self.warehouses,
+            status='available'
+        )
+        if self.vehicle_type:
+            vehicles = vehicles.filter(type=self.vehicle_type)
+        return list(vehicles.order_by('id'))
+    
+    def _get_drivers(self):
+        return list(Driver.objects.filter(
+            home_base__in=self.warehouses,
+            status='available'
+        ).order_by('-rating', 'id'))
+    
+    def _assign_driver(self, vehicle, drivers):
+        """Pop the first free driver based at the vehicle's warehouse and certified for it"""
+        for driver in drivers:
+            certified = [t.strip() for t in driver.vehicle_types.split(',')]
+            if driver.home_base_id == vehicle.current_location_id and vehicle.type in certified:
+                drivers.remove(driver)
+                return driver
+        return None
+    
+    def optimize_routes(self):
+        """Optimize routes for the whole fleet; returns one result per used vehicle"""
+        self.dropped_orders = []
+        if not self.orders or not self.vehicles:
+            return []
+        
+        # Nodes: one per warehouse with vehicles (depots) followed by one per order.
+        # A warehouse without vehicles would otherwise be a stop every solution must visit.
+        depots = [
+            warehouse for warehouse in self.warehouses
+            if any(vehicle.current_location_id == warehouse.id for vehicle in self.vehicles)
+        ]
+        num_depots = len(depots)
+        depot_nodes = {warehouse.id: node for node, warehouse in enumerate(depots)}
+        locations = depots + [order.customer for order in self.orders]
+        num_locations = len(locations)
+        
+        distance_matrix, _ = self.create_distance_matrix(locations)
+        time_matrix = self.create_time_matrix(distance_matrix)
+        
+        num_vehicles = len(self.vehicles)
+        vehicle_depots = [depot_nodes[v.current_location_id] for v in self.vehicles]
+        manager = pywrapcp.RoutingIndexManager(
+            num_locations, num_vehicles, vehicle_depots, vehicle_depots)
+        routing = pywrapcp.RoutingModel(manager)
+        
+        # Precompute integer transit and demand arrays so the solver never
+        # calls back into Python
+        time_costs = self.create_transit_matrix(time_matrix)
+        weight_demands, volume_demands = self.create_demand_arrays(
+            [[] for _ in depots] + [[order] for order in self.orders]
+        )
+        
+        # Travel time drives the schedule for every vehicle
+        time_callback_index = routing.RegisterTransitMatrix(time_costs)
+        routing.AddDimension(
+            time_callback_index,
+            30,  # allow waiting time
+            SHIFT_LENGTH_MINUTES,  # maximum time per vehicle (8 hours)
+            False,  # Don't force start cumul to zero
+            'Time')
+        time_dimension = routing.GetDimensionOrDie('Time')
+        
+        # Arc costs in cents, one matrix per distinct vehicle cost per km
+        cost_callbacks = {}
+        for vehicle_id, vehicle in enumerate(self.vehicles):
+            cost_per_km = vehicle.operational_cost_per_km or DEFAULT_COST_PER_KM
+            if cost_per_km not in cost_callbacks:
+                cost_callbacks[cost_per_km] = routing.RegisterTransitMatrix(
+                    self.create_transit_matrix(distance_matrix, scale=cost_per_km * 100)
+                )
+            routing.SetArcCostEvaluatorOfVehicle(cost_callbacks[cost_per_km], vehicle_id)
+        
+        # Per-vehicle weight and volume capacities
+        routing.AddDimensionWithVehicleCapacity(
+            routing.RegisterUnaryTransitVector(weight_demands),
+            0,  # null capacity slack
+            [int(v.capacity_weight * WEIGHT_SCALE) for v in self.vehicles],
+            True,  # start cumul to zero
+            'Weight')
+        routing.AddDimensionWithVehicleCapacity(
+            routing.RegisterUnaryTransitVector(volume_demands),
+            0,  # null capacity slack
+            [int(v.capacity_volume * VOLUME_SCALE) for v in self.vehicles],
+            True,  # start cumul to zero
+            'Volume')
+        
+        # Orders can only be served from their own warehouse, and may be dropped
+        # (at a heavy penalty) when no vehicle can fit them in
+        depot_vehicles = {}
+        for vehicle_id, depot in enumerate(vehicle_depots):
+            depot_vehicles.setdefault(depot, []).append(vehicle_id)
+        
+        for offset, order in enumerate(self.orders):
+            node = num_depots + offset
+            index = manager.NodeToIndex(node)
+            # -1 keeps the "unperformed" value so the disjunction can still drop it
+            routing.VehicleVar(index).SetValues(
+                [-1] + depot_vehicles.get(depot_nodes.get(order.warehouse_id), []))
+            routing.AddDisjunction([index], DROPPED_ORDER_PENALTY)
+            if self.time_windows:
+                start, end = self._customer_time_window(order.customer)
+                time_dimension.CumulVar(index).SetRange(start, end)
+        
+        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+        search_parameters.first_solution_strategy = (
+            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
+        search_parameters.local_search_metaheuristic = (
+            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
+        search_parameters.time_limit.seconds = getattr(settings, 'ROUTE_SOLVER_TIME_LIMIT_SECONDS', 30)
+        
+        solution = routing.SolveWithParameters(search_parameters)
+        
+        if not solution:
+            return []
+        
+        # Extract one route per vehicle that leaves its depot
+        drivers = list(self.drivers)
+        results = []
+        routed_nodes = set()
+        for vehicle_id, vehicle in enumerate(self.vehicles):
+            index = routing.Start(vehicle_id)
+            if routing.IsEnd(solution.Value(routing.NextVar(index))):
+                continue
+            
+            depot = depots[vehicle_depots[vehicle_id]]
+            route_locations = []
+            route_orders = []
+            arrival_minutes = []
+            route_distance = 0
+            route_time = 0
+            
+            while not routing.IsEnd(index):
+                node_index = manager.IndexToNode(index)
+                route_locations.append(locations[node_index])
+                if node_index >= num_depots:
+                    routed_nodes.add(node_index)
+                    route_orders.append(self.orders[node_index - num_depots])
+                    arrival_minutes.append(solution.Min(time_dimension.CumulVar(index)))
+                previous_index = index
+                index = solution.Value(routing.NextVar(index))
+                from_node = manager.IndexToNode(previous_index)
+                to_node = manager.IndexToNode(index)
+                route_distance += distance_matrix[from_node][to_node]
+                route_time += time_matrix[from_node][to_node]
+            
+            # Add the depot at the end
+            route_locations.append(locations[manager.IndexToNode(index)])
+            
+            coordinates = [(loc.latitude, loc.longitude) for loc in route_locations]
+            results.append({
+                'route_locations': route_locations,
+                'route_distance': round(float(route_distance), 2),
+                'route_time': round(float(route_time), 2),
+                'route_map': self._create_route_map(
+                    route_locations, depot=depot, name_suffix=f"_{vehicle.registration}"
+                ),
+                'route_path': polyline.encode(coordinates),
+                'warehouse': depot,
+                'vehicle': vehicle,
+                'driver': self._assign_driver(vehicle, drivers),
+                'orders': route_orders,
+                'arrival_minutes': arrival_minutes,
+            })
+        
+        self.dropped_orders = [
+            order for offset, order in enumerate(self.orders)
+            if num_depots + offset not in routed_nodes
+        ]
+        
+        return results
+    
+    def optimize_route(self):
+        """Fleet equivalent of the single-vehicle API: the first planned route"""
+        results = self.optimize_routes()
+        return results[0] if results else None
+    
+    def save_optimized_routes(self, results):
+        """Save one DeliveryRoute per used vehicle"""
+        routes = []
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        shift_start = datetime.combine(self.date, datetime.min.time()) + timedelta(minutes=SHIFT_START_MINUTES)
+        
+        with transaction.atomic():
+            for result in results:
+                route = DeliveryRoute.objects.create(
+                    route_id=f"ROUTE-{timestamp}-{result['vehicle'].registration}",
+                    warehouse=result['warehouse'],
+                    vehicle=result['vehicle'],
+                    driver=result['driver'],
+                    planned_date=self.date,
+                    status='planned',
+                    total_distance=result['route_distance'],
+                    estimated_duration=result['route_time'],
+                    route_path=result['route_path']
+                )
+                
+                RouteOrder.objects.bulk_create([
+                    RouteOrder(
+                        route=route,
+                        order=order,
+                        sequence=sequence,
+                        delivery_status='processing',
+                        estimated_arrival=shift_start + timedelta(minutes=minutes)
+                    )
+                    for sequence, (order, minutes) in enumerate(
+                        zip(result['orders'], result['arrival_minutes']), start=1
+                    )
+                ])
+                routes.append(route)
+            
+            # Update order status
+            Order.objects.filter(
+                pk__in=[order.pk for result in results for order in result['orders']]
+            ).update(status='shipped')
+        
+        return routes
+    
+    def save_optimized_route(self, optimization_result):
+        """Save a single fleet route"""
+        if not optimization_result:
+            return None
+        return self.save_optimized_routes([optimization_result])[0]
+
+def optimize_warehouse(warehouse_id, planned_date):
+    """
+    Optimize and save the route for one warehouse, returning a JSON-friendly summary.
+    Plain function so process-pool workers can run it without importing the Celery tasks.
+    """
+    started = time.monotonic()
+    summary = {'warehouse_id': warehouse_id, 'status': 'skipped'}
+    
+    try:
+        optimizer = RouteOptimizer(
+            warehouse_id,
+            planned_date,
+            vehicle_type='van',
+            time_windows=True
+        )
+        result = optimizer.optimize_route()
+        
+        if result:
+            route = optimizer.save_optimized_route(result)
+            summary.update(
+                status='optimized',
+                route_id=route.route_id,
+                distance=result['route_distance'],
+                estimated_time=result['route_time']
+            )
+            logger.info(
+                f"Optimized route for warehouse {optimizer.warehouse.code}"
+            )
+    except Exception as e:
+        logger.error(
+            f"Failed to optimize route for warehouse {warehouse_id}: {str(e)}"
+        )
+        summary.update(status='failed', error=str(e))
+    
+    summary['seconds'] = round(time.monotonic() - started, 2)
+    return summary
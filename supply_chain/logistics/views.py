@@ -9,7 +9,7 @@ from django.db.models import Prefetch
 from django.db.models import Q, Count, Sum, F
 from django.views.generic import ListView, DetailView
 from .models import Vehicle, Driver, Customer, Order, DeliveryRoute, RouteOrder, TrafficPattern
-from .utils.route_optimization import RouteOptimizer
+from .utils.route_optimization import RouteOptimizer, FleetRouteOptimizer
 from .utils.delivery_scheduling import DeliveryScheduler
 from logistics.models import Vehicle, Driver, DeliveryRoute, Order
 from inventory.models import Warehouse
@@ -212,6 +212,9 @@ class RouteOptimizationView(LoginRequiredMixin, View):
         except:
             return JsonResponse({'error': 'Invalid date format'}, status=400)
         
+        if request.POST.get('fleet'):
+            return self._optimize_fleet(request, date)
+        
         optimizer = RouteOptimizer(warehouse_id, date, vehicle_type)
         optimization_result = optimizer.optimize_route()
         
@@ -227,6 +230,39 @@ class RouteOptimizationView(LoginRequiredMixin, View):
             'estimated_time': optimization_result['route_time'],
             'map_url': f"/media/routes/route_{date}_{warehouse_id}.html"
         })
+    
+    def _optimize_fleet(self, request, date):
+        """Plan every available vehicle across one or more warehouses"""
+        warehouse_ids = request.POST.getlist('warehouse_id')
+        vehicle_type = request.POST.get('vehicle_type') or None
+        
+        try:
+            optimizer = FleetRouteOptimizer(warehouse_ids, date, vehicle_type)
+        except Warehouse.DoesNotExist:
+            return JsonResponse({'error': 'Warehouse not found'}, status=404)
+        
+        results = optimizer.optimize_routes()
+        
+        if not results:
+            return JsonResponse({'error': 'No orders to optimize or no available vehicle'}, status=400)
+        
+        routes = optimizer.save_optimized_routes(results)
+        
+        return JsonResponse({
+            'status': 'success',
+            'routes': [
+                {
+                    'route_id': route.route_id,
+                    'vehicle': result['vehicle'].registration,
+                    'stops': len(result['orders']),
+                    'distance': result['route_distance'],
+                    'estimated_time': result['route_time'],
+                    'map_url': result['route_map']
+                }
+                for route, result in zip(routes, results)
+            ],
+            'dropped_orders': [order.order_number for order in optimizer.dropped_orders]
+        })
 
 class DeliveryMapView(LoginRequiredMixin, View):
     template_name = 'logistics/delivery_map.html'
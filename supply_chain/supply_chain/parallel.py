@@ -0,0 +1,22 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.db import connections
+
+
+def _setup_django_worker():
+    django.setup()
+
+
+def django_process_pool(max_workers):
+    """
+    Process pool whose workers can use the ORM.
+    Workers are spawned rather than forked so they never share the parent's
+    database connections or native solver threads.
+    """
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_setup_django_worker
+    )
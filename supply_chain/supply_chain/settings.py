@@ -137,6 +137,46 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MODEL_ROOT = os.path.join(BASE_DIR, 'models')
 os.makedirs(MODEL_ROOT, exist_ok=True)
 
+# Route optimization
+ROUTE_DISTANCE_METHOD = 'haversine'  # or 'ellipsoidal'
+ROUTE_DISTANCE_CACHE = True  # persist pairwise distances between runs
+ROUTE_OPTIMIZATION_CONCURRENCY = 4  # max warehouse solves running at once
+ROUTE_SOLVER_TIME_LIMIT_SECONDS = 30  # guided local search runs until this limit
+
+# Demand forecasting
+FORECAST_MODE = 'batch'  # 'batch' (pooled models), 'parallel' or 'series' (one model per series), 'tiered'
+FORECAST_METHOD = 'random_forest'  # per-series model: 'random_forest', 'gradient_boost' or 'prophet'
+FORECAST_POOL_BY = 'global'  # batch mode: 'global' or 'category'
+FORECAST_MAX_WORKERS = None  # parallel mode process pool size; defaults to the core count
+FORECAST_MODEL_N_JOBS = 1  # threads per model fit inside Celery forecast chunks
+FORECAST_INTERVAL_WIDTH = 0.8  # coverage of the stored daily prediction intervals
+FORECAST_INTERVAL_PATHS = 50  # simulated sample paths per series behind those intervals
+FORECAST_FAST_PATH_MAX_DAILY_DEMAND = 5.0  # regular series selling less than this per day skip the heavy models
+FEATURE_CACHE_SIZE = 256  # prepared feature frames kept in memory per process
+HOLIDAY_COUNTRY_CODE = 'US'  # holiday calendar when a warehouse is not known
+HOLIDAY_REGION_CACHE_SECONDS = 300  # how long a process trusts its cached warehouse calendars
+FORECAST_MODEL_CACHE_MB = 512  # loaded models kept per process, by on-disk size
+FORECAST_MODEL_MMAP_MODE = None  # e.g. 'r' to memory-map model arrays shared across workers
+FORECAST_MODEL_VERSIONS_KEPT = 3
+
+# Model retraining thresholds (see inventory.utils.retraining)
+FORECAST_RETRAIN_BUDGET_SECONDS = 3600  # nightly fit time across all series
+FORECAST_RETRAIN_MIN_NEW_ROWS = 30
+FORECAST_RETRAIN_DRIFT = 0.25  # relative shift of 28-day mean demand
+FORECAST_RETRAIN_ERROR_RATIO = 1.25  # live MAE over cross-validated MAE
+FORECAST_RETRAIN_MAX_AGE_DAYS = 90
+FORECAST_RETRAIN_CROSS_VALIDATE = False
+
+# Inventory policy
+INVENTORY_SERVICE_LEVEL = 0.95  # probability of no stockout during lead time
+INVENTORY_ORDERING_COST = 50.0  # fixed cost per purchase order, for EOQ
+INVENTORY_HOLDING_COST_RATE = 0.25  # yearly holding cost as a share of unit cost
+SHARDED_PAIRS_CACHE_SECONDS = 60  # how long a process trusts its list of sharded inventory rows
+
+# Sales ingestion
+SALES_INGEST_BATCH_SIZE = 5000  # records per INSERT ... ON CONFLICT
+SALES_INGEST_MAX_ERRORS = 1000  # row errors listed in a bulk upload response
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -144,6 +184,13 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # Stock summaries lag Inventory by at most about this interval
+    'apply-stock-summary-changes': {
+        'task': 'inventory.tasks.apply_stock_summary_changes',
+        'schedule': 60.0,
+    },
+}
 
 # Login settings
 LOGIN_URL = '/admin/login/'